@@ -0,0 +1,65 @@
+# benchmarks/bench_first_image.py
+"""
+So sánh cách lấy <img> đầu tiên trong content.rendered của WP API (fallback khi thiếu yoast og_image):
+BeautifulSoup(..., 'html.parser').find('img') (cách cũ) và utils.html_extract.first_image_tag.
+
+Dùng các payload API đã lưu trong benchmarks/fixtures/api/*.json và kiểm tra hai cách cho cùng kết quả.
+
+    python benchmarks/bench_first_image.py --repeat 5
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from utils.html_extract import first_image_tag  # noqa: E402
+
+FIXTURE_DIR = os.path.join(BASE_DIR, 'benchmarks', 'fixtures', 'api')
+
+def bs4_first_src(html):
+    img_tag = BeautifulSoup(html, 'html.parser').find('img')
+    return img_tag.get('src') if img_tag else None
+
+def stream_first_src(html):
+    img_tag = first_image_tag(html)
+    return img_tag.get('src') if img_tag else None
+
+EXTRACTORS = {'bs4': bs4_first_src, 'first_image_tag': stream_first_src}
+
+def measure(extractor, contents, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for html in contents: extractor(html)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--repeat', type=int, default=5, help='số lần chạy mỗi payload')
+    args = arg_parser.parse_args()
+
+    mismatches = 0
+    print(f"{'payload':<32} {'items':>5} {'bs4 ms':>9} {'stream ms':>10} {'speedup':>8}  result")
+    for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, '*.json'))):
+        with open(path, 'r', encoding='utf-8') as f: items = json.load(f)
+        contents = [item.get('content', {}).get('rendered', '') for item in items]
+        expected = [bs4_first_src(html) for html in contents]
+        result = [stream_first_src(html) for html in contents]
+        mismatches += result != expected
+        timings = {name: measure(extractor, contents, args.repeat) for name, extractor in EXTRACTORS.items()}
+        bs4_time, stream_time = timings['bs4'], timings['first_image_tag']
+        print(f"{os.path.basename(path):<32} {len(items):>5} {bs4_time * 1000:>9.1f} {stream_time * 1000:>10.1f}"
+              f" {bs4_time / stream_time:>7.1f}x  {'ok' if result == expected else 'MISMATCH'}")
+    return 1 if mismatches else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
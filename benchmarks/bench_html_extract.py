@@ -0,0 +1,82 @@
+# benchmarks/bench_html_extract.py
+"""
+So sánh các backend trích xuất HTML (utils/html_extract.py) trên các trang sản phẩm đã lưu.
+
+Với mỗi fixture trong benchmarks/fixtures/html/cases.json, script kiểm tra mọi backend cho ra cùng
+kết quả với 'html.parser' (cách cũ) rồi báo cáo thời gian parse mỗi trang và bộ nhớ đỉnh.
+
+    python benchmarks/bench_html_extract.py --repeat 20
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from utils.html_extract import BACKENDS, extract_page  # noqa: E402
+from utils.config_plan import ConfigPlan  # noqa: E402
+
+FIXTURE_DIR = os.path.join(BASE_DIR, 'benchmarks', 'fixtures', 'html')
+
+def load_cases():
+    with open(os.path.join(FIXTURE_DIR, 'cases.json'), 'r', encoding='utf-8') as f: cases = json.load(f)
+    for case in cases:
+        with open(os.path.join(FIXTURE_DIR, case['fixture']), 'rb') as f: case['markup'] = f.read()
+        # Giống main: config được biên dịch một lần thành plan
+        case['url_data'] = ConfigPlan(case['url_data'])
+    return cases
+
+def run_case(case, backend):
+    with contextlib.redirect_stdout(io.StringIO()):
+        image_url, link_tag = extract_page(case['markup'], case['url_data'], link_selector=case.get('link_selector'),
+                                           want_image=case.get('want_image', True), backend=backend)
+    return image_url, (link_tag.get('href') if link_tag else None)
+
+def measure(case, backend, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run_case(case, backend)
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    run_case(case, backend)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--repeat', type=int, default=10, help='số lần chạy mỗi fixture cho mỗi backend')
+    arg_parser.add_argument('--backend', action='append', choices=BACKENDS, help='chỉ chạy các backend này')
+    args = arg_parser.parse_args()
+    backends = args.backend or list(BACKENDS)
+
+    cases, mismatches, totals = load_cases(), 0, {b: [0.0, 0] for b in backends}
+    print(f"{'fixture':<36} {'backend':<12} {'ms/page':>9} {'peak KiB':>10}  result")
+    for case in cases:
+        expected = run_case(case, 'html.parser')
+        for backend in backends:
+            result = run_case(case, backend)
+            median, peak = measure(case, backend, args.repeat)
+            totals[backend][0] += median
+            totals[backend][1] = max(totals[backend][1], peak)
+            status = 'ok' if result == expected else f'MISMATCH {result!r} != {expected!r}'
+            mismatches += result != expected
+            print(f"{case['fixture']:<36} {backend:<12} {median * 1000:>9.2f} {peak / 1024:>10.0f}  {status}")
+
+    print("\n--- Tổng (median mỗi fixture cộng lại, peak lớn nhất) ---")
+    baseline = totals.get('html.parser', [None])[0]
+    for backend, (total, peak) in totals.items():
+        speedup = f"  x{baseline / total:.1f}" if baseline and total else ''
+        print(f"{backend:<12} {total * 1000:>9.2f} ms {peak / 1024:>8.0f} KiB{speedup}")
+    return 1 if mismatches else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
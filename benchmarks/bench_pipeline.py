@@ -0,0 +1,144 @@
+# benchmarks/bench_pipeline.py
+"""
+Benchmark offline toàn bộ pipeline (main.main()) và từng crawler riêng lẻ trên server replay cục bộ
+(benchmarks/replay.py), có độ trễ giả lập. Báo cáo wall time, throughput (sản phẩm/s), số request và peak RSS.
+
+Mỗi lần chạy dùng một bản sao code trong thư mục tạm (config.json, stop_urls.txt, domain/, .cache/ riêng)
+và chạy trong process con để đo RSS độc lập; git push và Telegram bị tắt.
+
+    python benchmarks/bench_pipeline.py --latency 30 --jitter 10 --products 60
+    python benchmarks/bench_pipeline.py --only crawlers --repeat 3
+    python benchmarks/bench_pipeline.py --recordings path/to/recordings --config path/to/config.json
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from replay import SOURCE_TYPES, ReplayServer, build_synthetic_site, load_recordings  # noqa: E402
+
+CRAWLER_MODULES = {
+    'api': 'api_crawler', 'api-attachment': 'api_attachment_crawler', 'prevnext': 'prevnext_crawler',
+    'product-list': 'product_list_crawler', 'sitemap': 'sitemap_crawler',
+}
+
+# --- Process con ---
+def _child(spec):
+    """Chạy một kịch bản trong bản sao code ở thư mục hiện tại và in kết quả dạng JSON."""
+    import contextlib
+    import io
+    sys.path.insert(0, os.getcwd())
+    from replay import install_replay_adapter
+    from utils.http_client import get_session
+    from utils.profiler import reset_profile
+    install_replay_adapter(get_session(), spec['base_url'])
+
+    output = io.StringIO()
+    profile = reset_profile()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        if spec['target'] == 'main':
+            import main
+            main.git_push_changes = lambda: None
+            main.send_telegram_message = lambda message: None
+            main.main()
+            products = 0
+            for name in os.listdir('domain'):
+                with open(os.path.join('domain', name), 'r', encoding='utf-8') as f:
+                    products += sum(1 for line in f if line.strip())
+        else:
+            import importlib
+            crawler = importlib.import_module(f"crawlers.{CRAWLER_MODULES[spec['target']]}")
+            with open('config.json', 'r', encoding='utf-8') as f: configs = json.load(f)
+            products = 0
+            for url_data in configs:
+                if url_data.get('source_type') != spec['target']: continue
+                results, _ = crawler.crawl(url_data, set())
+                products += len(results)
+    wall = time.perf_counter() - start
+    totals = profile.to_dict()['totals']
+    print(json.dumps({
+        'wall': wall, 'products': products, 'requests': totals['requests'], 'bytes': totals['bytes'],
+        'peak_rss_kib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }))
+
+# --- Process cha ---
+def _prepare_workdir(configs):
+    workdir = tempfile.mkdtemp(prefix='imagecrawler-bench-')
+    ignore = shutil.ignore_patterns('__pycache__', '*.pyc')
+    shutil.copy2(os.path.join(BASE_DIR, 'main.py'), workdir)
+    for package in ('utils', 'crawlers'):
+        shutil.copytree(os.path.join(BASE_DIR, package), os.path.join(workdir, package), ignore=ignore)
+    os.makedirs(os.path.join(workdir, 'domain'))
+    with open(os.path.join(workdir, 'config.json'), 'w', encoding='utf-8') as f: json.dump(configs, f, indent=2)
+    with open(os.path.join(workdir, 'stop_urls.txt'), 'w', encoding='utf-8') as f: f.write('{}')
+    return workdir
+
+def run_target(target, configs, server):
+    workdir = _prepare_workdir(configs)
+    try:
+        spec = json.dumps({'target': target, 'base_url': server.base_url})
+        env = dict(os.environ, PYTHONPATH=BENCH_DIR, GITHUB_ACTIONS='', TELEGRAM_BOT_TOKEN='', TELEGRAM_CHAT_ID='')
+        before = server.request_count
+        completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', spec], cwd=workdir,
+                                   env=env, capture_output=True, text=True)
+        if completed.returncode != 0:
+            raise RuntimeError(f"{target} failed:\n{completed.stderr[-2000:]}")
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        result['server_requests'] = server.request_count - before
+        return result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--latency', type=float, default=20, help='độ trễ mỗi request (ms)')
+    arg_parser.add_argument('--jitter', type=float, default=5, help='độ trễ ngẫu nhiên thêm tối đa (ms)')
+    arg_parser.add_argument('--products', type=int, default=60, help='số sản phẩm mỗi domain giả lập')
+    arg_parser.add_argument('--repeat', type=int, default=1, help='số lần chạy mỗi kịch bản (lấy median)')
+    arg_parser.add_argument('--only', choices=('all', 'main', 'crawlers'), default='all')
+    arg_parser.add_argument('--recordings', help='thư mục response đã ghi (manifest.json) thay cho site giả lập')
+    arg_parser.add_argument('--config', help='config.json dùng cùng --recordings')
+    arg_parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+    if args.child: return _child(json.loads(args.child))
+
+    if args.recordings:
+        if not args.config: arg_parser.error('--recordings cần --config')
+        recordings = load_recordings(args.recordings)
+        with open(args.config, 'r', encoding='utf-8') as f: configs = json.load(f)
+    else:
+        recordings, configs = build_synthetic_site(products=args.products)
+
+    targets = []
+    if args.only in ('all', 'crawlers'):
+        types = [t for t in SOURCE_TYPES if any(c.get('source_type') == t for c in configs)]
+        targets += types
+    if args.only in ('all', 'main'): targets.append('main')
+
+    server = ReplayServer(recordings, latency_ms=args.latency, jitter_ms=args.jitter).start()
+    print(f"Replay server {server.base_url}: {len(recordings)} response, latency {args.latency}±{args.jitter} ms")
+    print(f"{'target':<16} {'wall s':>8} {'products':>9} {'prod/s':>8} {'requests':>9} {'peak RSS MiB':>13}")
+    try:
+        for target in targets:
+            runs = [run_target(target, configs, server) for _ in range(args.repeat)]
+            wall = statistics.median(r['wall'] for r in runs)
+            products, requests = runs[0]['products'], runs[0]['server_requests']
+            peak = max(r['peak_rss_kib'] for r in runs) / 1024
+            throughput = products / wall if wall else 0
+            print(f"{target:<16} {wall:>8.2f} {products:>9} {throughput:>8.1f} {requests:>9} {peak:>13.1f}")
+    finally:
+        server.stop()
+
+if __name__ == '__main__':
+    sys.exit(main())
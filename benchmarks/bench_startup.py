@@ -0,0 +1,27 @@
+# benchmarks/bench_startup.py
+"""
+Kiểm tra hồi quy thời gian khởi động: đo cold start của `import main` (process mới, `python -X importtime`)
+nhiều lần, lấy median và thoát với exit code 1 nếu vượt ngân sách (mặc định STARTUP_BUDGET_MS).
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --repeat 10 --budget 300 --top 25
+"""
+import argparse
+import os
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BASE_DIR)
+
+from utils.constants import STARTUP_BUDGET_MS  # noqa: E402
+from utils.startup_profile import report_startup  # noqa: E402
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=7, help='số lần cold start (lấy median)')
+    parser.add_argument('--budget', type=float, default=STARTUP_BUDGET_MS, help='ngân sách (ms)')
+    parser.add_argument('--top', type=int, default=15, help='số module chậm nhất được in ra')
+    parser.add_argument('--module', default='main', help='module được import')
+    args = parser.parse_args()
+    sys.exit(0 if report_startup(args.module, args.repeat, args.top, args.budget) else 1)
@@ -0,0 +1,280 @@
+# benchmarks/replay.py
+"""
+Server HTTP giả lập cho benchmark: trả lại các response đã ghi (WP API JSON, attachment, trang sản phẩm,
+sitemap XML, HEAD ảnh kèm Last-Modified) với độ trễ cấu hình được, không cần mạng.
+
+- ReplayServer: ThreadingHTTPServer chạy trên 127.0.0.1, tra response theo (method, URL gốc).
+- install_replay_adapter: gắn vào requests.Session để mọi request (http/https, mọi host) được gửi tới server,
+  URL gốc nằm trong header X-Replay-Url.
+- load_recordings / save_recordings: đọc/ghi bộ response dạng thư mục (manifest.json + file body).
+- build_synthetic_site: dựng bộ response + config cho từng source_type từ các fixture trong benchmarks/fixtures.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from requests.adapters import HTTPAdapter
+
+REPLAY_HEADER = 'X-Replay-Url'
+# Status của recording giả lập lỗi mạng: server đóng kết nối mà không trả response
+DROP_CONNECTION = 0
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# --- Server ---
+class _ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _respond(self, send_body):
+        server = self.server
+        url = self.headers.get(REPLAY_HEADER) or self.path
+        server.count_request()
+        delay = server.latency + (random.uniform(0, server.jitter) if server.jitter else 0)
+        if delay: time.sleep(delay)
+
+        recording = server.recordings.get((self.command, url))
+        if recording is None and self.command == 'HEAD':
+            # HEAD không được ghi riêng: dùng header của GET cùng URL
+            recording = server.recordings.get(('GET', url))
+        status, headers, body = recording if recording else (404, {}, b'')
+        if status == DROP_CONNECTION:
+            self.close_connection = True
+            return
+
+        range_header = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+        # If-Range không khớp ETag/Last-Modified hiện tại: bỏ qua Range và trả cả file (200)
+        range_valid = not if_range or if_range in (headers.get('ETag'), headers.get('Last-Modified'))
+        if status == 200 and range_header and range_header.startswith('bytes=') and range_valid:
+            start = int(range_header[6:].split('-')[0] or 0)
+            status, body = 206, body[start:]
+        if status == 304 or (status == 200 and self._not_modified(headers)):
+            status, body = 304, b''
+
+        self.send_response(status)
+        for key, value in headers.items(): self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if send_body and body: self.wfile.write(body)
+
+    def _not_modified(self, headers):
+        etag = headers.get('ETag')
+        return bool(etag) and self.headers.get('If-None-Match') == etag
+
+    def do_GET(self): self._respond(True)
+    def do_HEAD(self): self._respond(False)
+    def log_message(self, *args): pass
+
+class ReplayServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, recordings, latency_ms=0, jitter_ms=0):
+        super().__init__(('127.0.0.1', 0), _ReplayHandler)
+        self.recordings = recordings
+        self.latency, self.jitter = latency_ms / 1000, jitter_ms / 1000
+        self.request_count = 0
+        self._count_lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def count_request(self):
+        with self._count_lock: self.request_count += 1
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+# --- Client ---
+class ReplayAdapter(HTTPAdapter):
+    """Chuyển mọi request tới ReplayServer, giữ URL gốc trong header X-Replay-Url."""
+
+    def __init__(self, base_url, **kwargs):
+        self.base_url = base_url
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        request.headers[REPLAY_HEADER] = request.url
+        request.url = f"{self.base_url}{parts.path or '/'}" + (f"?{parts.query}" if parts.query else '')
+        return super().send(request, **kwargs)
+
+def install_replay_adapter(session, base_url, pool_maxsize=32):
+    adapter = ReplayAdapter(base_url, pool_connections=4, pool_maxsize=pool_maxsize)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+# --- Lưu / đọc bộ response ---
+def save_recordings(recordings, directory):
+    """Ghi recordings ra thư mục: manifest.json + mỗi body một file (đặt tên theo sha1 nội dung)."""
+    os.makedirs(os.path.join(directory, 'bodies'), exist_ok=True)
+    manifest = []
+    for (method, url), (status, headers, body) in recordings.items():
+        body_name = hashlib.sha1(body).hexdigest() if body else None
+        if body_name:
+            with open(os.path.join(directory, 'bodies', body_name), 'wb') as f: f.write(body)
+        manifest.append({'method': method, 'url': url, 'status': status, 'headers': headers, 'body': body_name})
+    with open(os.path.join(directory, 'manifest.json'), 'w', encoding='utf-8') as f: json.dump(manifest, f, indent=1)
+
+def load_recordings(directory):
+    with open(os.path.join(directory, 'manifest.json'), 'r', encoding='utf-8') as f: manifest = json.load(f)
+    recordings = {}
+    for entry in manifest:
+        body = b''
+        if entry.get('body'):
+            with open(os.path.join(directory, 'bodies', entry['body']), 'rb') as f: body = f.read()
+        recordings[(entry['method'], entry['url'])] = (entry['status'], entry.get('headers', {}), body)
+    return recordings
+
+# --- Site giả lập dựng từ fixture ---
+def _read_fixture(*parts):
+    with open(os.path.join(FIXTURE_DIR, *parts), 'rb') as f: return f.read()
+
+def _http_date(days_ago):
+    return formatdate(time.time() - days_ago * 86400, usegmt=True)
+
+class _SiteBuilder:
+    def __init__(self, products, seed):
+        self.products = products
+        self.random = random.Random(seed)
+        self.recordings = {}
+        self.configs = []
+        self.product_template = _read_fixture('html', 'orionshirt_product.html').decode('utf-8')
+        self.category_template = _read_fixture('html', 'meredpremium_category.html').decode('utf-8')
+
+    def add(self, url, body, content_type, status=200, headers=None, method='GET'):
+        if isinstance(body, str): body = body.encode('utf-8')
+        all_headers = {'Content-Type': content_type}
+        all_headers.update(headers or {})
+        self.recordings[(method, url)] = (status, all_headers, body)
+
+    def add_image(self, url, recent=True, size=4096):
+        """Ảnh: GET trả bytes, HEAD dùng chung header (Last-Modified mới hoặc cũ để thử check_recency)."""
+        body = hashlib.sha256(url.encode()).digest() * (size // 32)
+        self.add(url, body, 'image/jpeg', headers={'Last-Modified': _http_date(0.1 if recent else 30)})
+
+    def product_page(self, image_url, next_url=None):
+        html = re.sub(r'(<meta property="og:image" content=")[^"]*', lambda m: m.group(1) + image_url,
+                      self.product_template, count=1)
+        if next_url:
+            html = re.sub(r'(<a href=")[^"]*(" rel="previous" class="button icon is-outline circle"><i class="icon-angle-right)',
+                          lambda m: m.group(1) + next_url + m.group(2), html, count=1)
+        else:
+            html = html.replace('<i class="icon-angle-right', '<i class="icon-angle-left')
+        return html
+
+    def slug(self, i):
+        words = ('official', 'vintage', 'retro', 'classic', 'poster', 'hoodie', 'ornament', 'legend', 'graphic')
+        return '-'.join(self.random.choice(words) for _ in range(4)) + f'-{i}'
+
+    # --- Từng source_type ---
+    def api(self, domain='bench-api.test'):
+        items = json.loads(_read_fixture('api', 'capitoneshirt_products.json'))
+        products = []
+        for i in range(self.products):
+            item = dict(items[i % len(items)])
+            item['id'], item['link'] = 90000 - i, f"https://{domain}/product/{self.slug(i)}/"
+            image_url = f"https://images.{domain}/2025/10/{self.slug(i)}-t-shirt.jpg"
+            if i % 2 == 0:
+                item['yoast_head_json'] = {'og_image': [{'url': image_url}]}
+            else:
+                item['content'] = {'rendered': f'<p>{self.slug(i)}</p><img src="{image_url}" alt="x">'}
+            self.add_image(image_url)
+            # Một nửa ảnh có bản replacement hợp lệ
+            if i % 4 < 2: self.add_image(image_url.replace('-t-shirt.jpg', '-sweater.jpg'))
+            products.append(item)
+        for page in range(1, 3):
+            chunk = products[(page - 1) * 100:page * 100]
+            self.add(f"https://{domain}/wp-json/wp/v2/product?per_page=100&page={page}&orderby=date&order=desc",
+                     json.dumps(chunk), 'application/json', headers={'ETag': f'"api-{page}-{len(chunk)}"'})
+        self.configs.append({'url': f'https://{domain}/', 'source_type': 'api',
+                             'replacements': {'-t-shirt.jpg': ['-sweater.jpg']}})
+
+    def api_attachment(self, domain='bench-attach.test'):
+        products = []
+        for i in range(self.products):
+            attachment_url = f"https://{domain}/wp-json/wp/v2/media?parent={80000 - i}"
+            products.append({'id': 80000 - i, 'link': f"https://{domain}/product/{self.slug(i)}/",
+                             '_links': {'wp:attachment': [{'href': attachment_url}]}})
+            image_url = f"https://{domain}/wp-content/uploads/2025/10/mockup-{self.slug(i)}.jpg"
+            media = [{'source_url': f"https://{domain}/wp-content/uploads/2025/10/size-chart-{i}.jpg"},
+                     {'source_url': image_url}]
+            self.add(attachment_url, json.dumps(media), 'application/json')
+            self.add_image(image_url)
+        for page in range(1, 3):
+            chunk = products[(page - 1) * 100:page * 100]
+            self.add(f"https://{domain}/wp-json/wp/v2/product?per_page=100&page={page}&orderby=date&order=desc",
+                     json.dumps(chunk), 'application/json')
+        self.configs.append({'url': f'https://{domain}/', 'source_type': 'api-attachment',
+                             'attachment_prefix_filter': 'mockup'})
+
+    def prevnext(self, domain='bench-prevnext.test'):
+        product_urls = [f"https://{domain}/product/{self.slug(i)}/" for i in range(self.products)]
+        category = re.sub(r'(<a href=")[^"]*(" aria-label="x" class="woocommerce-LoopProduct-link)',
+                          lambda m: m.group(1) + product_urls[0] + m.group(2), self.category_template, count=1)
+        self.add(f"https://{domain}/", category, 'text/html; charset=UTF-8')
+        for i, product_url in enumerate(product_urls):
+            image_url = f"https://images.{domain}/2025/10/abcd1234-{self.slug(i)}-t-shirt.jpg"
+            next_url = product_urls[i + 1] if i + 1 < len(product_urls) else None
+            self.add(product_url, self.product_page(image_url, next_url), 'text/html; charset=UTF-8')
+            self.add_image(image_url)
+            self.add_image(image_url.replace('abcd1234-', ''))
+        self.configs.append({'url': f'https://{domain}/', 'source_type': 'prevnext',
+                             'first_product_selector': '.product-small a.woocommerce-LoopProduct-link',
+                             'next_product_selector': 'a:has(i.icon-angle-right)',
+                             'fallback_rules': {'type': 'cut_filename_prefix', 'domain': f'images.{domain}',
+                                                'prefix_length': 9}})
+
+    def product_list(self, domain='bench-list.test', repo_url_pattern=None):
+        product_urls = [f"https://{domain}/product/{self.slug(i)}/" for i in range(self.products)]
+        list_url = (repo_url_pattern or "https://raw.githubusercontent.com/ktbteam/productcrawler/main/domain/{domain}.txt"
+                    ).format(domain=domain)
+        self.add(list_url, "\n".join(product_urls), 'text/plain; charset=utf-8', headers={'ETag': '"list-1"'})
+        for i, product_url in enumerate(product_urls):
+            image_url = f"https://images.{domain}/2025/10/{self.slug(i)}-t-shirt.jpg"
+            self.add(product_url, self.product_page(image_url), 'text/html; charset=UTF-8')
+        self.configs.append({'url': f'https://{domain}/', 'source_type': 'product-list'})
+
+    def sitemap(self, domain='bench-sitemap.test'):
+        entries = []
+        for i in range(self.products):
+            product_url = f"https://{domain}/product/{self.slug(i)}-tee-{i}/"
+            image_url = f"https://{domain}/wp-content/uploads/2025/10/{self.slug(i)}-tee.jpg"
+            entries.append(f"<url><loc>{product_url}</loc><lastmod>2025-10-01T00:00:00+00:00</lastmod>"
+                           f"<image:image><image:loc>{image_url}</image:loc></image:image></url>")
+            self.add_image(image_url, recent=i % 3 != 0)
+        products_sitemap = f"https://{domain}/product-sitemap_products_1.xml"
+        self.add(products_sitemap,
+                 '<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9" '
+                 'xmlns:image="http://www.google.com/schemas/sitemap-image/1.1">\n' + "\n".join(reversed(entries)) +
+                 '\n</urlset>', 'application/xml', headers={'ETag': '"sitemap-1"'})
+        self.add(f"https://{domain}/sitemap.xml",
+                 '<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                 f'<sitemap><loc>https://{domain}/page-sitemap.xml</loc></sitemap>'
+                 f'<sitemap><loc>{products_sitemap}</loc></sitemap></sitemapindex>', 'application/xml')
+        self.configs.append({'url': f'https://{domain}/sitemap.xml', 'source_type': 'sitemap',
+                             'crawl_sitemap_backwards': True, 'product_url_keywords': ['-tee'],
+                             'enable_design_deduplication': False, 'check_recency': True,
+                             'download_images': True})
+
+SOURCE_TYPES = ('api', 'api-attachment', 'prevnext', 'product-list', 'sitemap')
+
+def build_synthetic_site(products=60, source_types=SOURCE_TYPES, seed=18, repo_url_pattern=None):
+    """Trả về (recordings, configs) với một domain giả cho mỗi source_type, mỗi domain `products` sản phẩm."""
+    builder = _SiteBuilder(products, seed)
+    for source_type in source_types:
+        if source_type == 'product-list': builder.product_list(repo_url_pattern=repo_url_pattern)
+        else: getattr(builder, source_type.replace('-', '_'))()
+    return builder.recordings, builder.configs
@@ -1,100 +1,151 @@
 # crawlers/api_attachment_crawler.py
 import requests
-from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
 
-from utils.constants import MAX_API_PAGES, DEFAULT_API_URL_PATTERN, HEADERS
+from utils.constants import MAX_API_PAGES, DEFAULT_API_URL_PATTERN, ATTACHMENT_FETCH_CONCURRENCY
+from utils.http_client import http_get
+from utils.validator_store import conditional_get, remember_validators
+from utils.config_plan import as_plan
 from utils.url_processor import process_and_finalize_url
+from utils.seen_index import SeenTracker
+
+def _pick_media_url(media_list, search_prefix):
+    """Trả về URL ảnh của media đầu tiên có tên file bắt đầu bằng search_prefix."""
+    for media_item in media_list:
+        # --- LOGIC LẤY URL ẢNH THEO 3 CẤP ƯU TIÊN ---
+        img_url = None
+
+        # Cấp 1: Thử lấy 'source_url' ở cấp cao nhất (nhanh nhất, tốt nhất)
+        img_url = media_item.get('source_url')
+        if img_url:
+            print(f"    -> Tìm thấy ảnh từ 'source_url' cấp cao nhất")
+
+        # Cấp 2: Nếu không có, tìm trong 'media_details.sizes'
+        if not img_url:
+            media_details = media_item.get('media_details', {})
+            sizes = media_details.get('sizes', {})
+            preferred_sizes = ['full', 'large', 'medium', 'thumbnail']
+
+            for size in preferred_sizes:
+                if size in sizes and sizes[size].get('source_url'):
+                    img_url = sizes[size]['source_url']
+                    print(f"    -> Tìm thấy ảnh từ media_details (size: {size})")
+                    break
+
+        # Cấp 3: Nếu vẫn không có, dùng 'guid.rendered' làm dự phòng
+        if not img_url:
+            img_url = media_item.get('guid', {}).get('rendered', '')
+            if img_url:
+                print(f"    -> Tìm thấy ảnh bằng phương pháp dự phòng (guid)")
+        # --- KẾT THÚC LOGIC ƯU TIÊN ---
+
+        if img_url:
+            filename = img_url.split('/')[-1]
+            # Vẫn cần bộ lọc prefix để chọn đúng ảnh trong list media trả về
+            if filename.lower().startswith(search_prefix.lower()):
+                return img_url
+    return None
+
+def _resolve_product_image(item, plan, search_prefix, use_embed):
+    """
+    Tìm và chuẩn hóa ảnh cho một sản phẩm; chạy trong thread pool. Trả về (URL ảnh hoặc None, failed): failed là
+    True khi API attachment lỗi mạng/timeout (lỗi HTTP như 404 là kết quả hợp lệ).
+    """
+    img_url = None
+    if use_embed:
+        # Featured media đã được nhúng sẵn trong response sản phẩm (_embed), không cần gọi thêm API
+        img_url = _pick_media_url(item.get('_embedded', {}).get('wp:featuredmedia', []), search_prefix)
+
+    if not img_url:
+        attachment_link = item.get('_links', {}).get('wp:attachment', [{}])[0].get('href')
+        if not attachment_link:
+            return None, False
+        try:
+            attachment_response = http_get(attachment_link, timeout=20)
+            attachment_response.raise_for_status()
+            img_url = _pick_media_url(attachment_response.json(), search_prefix)
+        except requests.exceptions.RequestException as e:
+            print(f"    -> Lỗi khi gọi API attachment {attachment_link}: {e}")
+            return None, not isinstance(e, requests.exceptions.HTTPError)
+
+    return (process_and_finalize_url(img_url, plan) if img_url else None), False
 
 def crawl(url_data, stop_urls_list):
     """
     Crawl images from 'wp:attachment' using a 3-tier priority system for URL extraction.
+    Attachment requests are sent concurrently; with 'attachment_embed' the featured media is
+    requested inline (_embed=wp:featuredmedia) and the attachment call is only a fallback.
+    Products already processed in earlier runs are skipped, and the crawl stops after a run of them.
     """
     all_image_urls = []
     new_product_urls_found = []
+    seen_image_urls = set()
     page = 1
-    domain = urlparse(url_data['url']).netloc
+    plan = as_plan(url_data)
+    domain = plan.domain
     stop_url_found = None
-    
+
     # attachment_prefix_filter vẫn hữu ích để chọn đúng media từ danh sách
-    search_prefix = url_data.get("attachment_prefix_filter")
+    search_prefix = plan.get("attachment_prefix_filter")
     if not search_prefix:
         print(f"CẢNH BÁO: [{domain}] Cấu hình thiếu 'attachment_prefix_filter'.")
         return [], []
+    use_embed = plan.get("attachment_embed", False)
+    tracker = SeenTracker(domain, stop_urls_list)
 
-    while page <= MAX_API_PAGES and not stop_url_found:
-        api_url = DEFAULT_API_URL_PATTERN.format(domain=domain, page=page)
-        try:
-            product_response = requests.get(api_url, headers=HEADERS, timeout=30)
-            product_response.raise_for_status()
-            products_data = product_response.json()
-            if not products_data:
+    first_page, crawl_failed = None, False
+    with ThreadPoolExecutor(max_workers=ATTACHMENT_FETCH_CONCURRENCY) as executor:
+        while page <= MAX_API_PAGES and not stop_url_found:
+            api_url = DEFAULT_API_URL_PATTERN.format(domain=domain, page=page)
+            if use_embed: api_url += "&_embed=wp:featuredmedia"
+            try:
+                # Trang 1 dùng conditional GET: 304 nghĩa là không có sản phẩm mới
+                product_response = conditional_get(api_url, timeout=30) if page == 1 else http_get(api_url, timeout=30)
+                if product_response.status_code == 304:
+                    print(f"[{domain}] API không thay đổi (304 Not Modified). Bỏ qua domain.")
+                    return [], []
+                product_response.raise_for_status()
+                if page == 1: first_page = (api_url, product_response)
+                products_data = product_response.json()
+                if not products_data:
+                    break
+
+                # Chỉ xử lý các sản phẩm mới đứng trước stop URL
+                items_to_process = []
+                for item in products_data:
+                    product_url = item.get('link')
+                    decision = tracker.check(product_url) if product_url else SeenTracker.NEW
+                    if decision == SeenTracker.STOP:
+                        stop_url_found = product_url
+                        break
+                    if decision == SeenTracker.NEW: items_to_process.append(item)
+
+                futures = [executor.submit(_resolve_product_image, item, plan, search_prefix, use_embed)
+                           for item in items_to_process]
+                # Gộp kết quả theo đúng thứ tự sản phẩm trong API
+                for item, future in zip(items_to_process, futures):
+                    final_img_url, failed = future.result()
+                    # Sản phẩm đã xử lý xong được ghi vào index đã xem kể cả khi không có ảnh; lỗi mạng thì để lần sau
+                    if not failed: tracker.mark(item.get('link'))
+                    if final_img_url and final_img_url not in seen_image_urls:
+                        seen_image_urls.add(final_img_url)
+                        product_url = item.get('link')
+                        all_image_urls.append({"image_url": final_img_url, "product_url": product_url})
+                        if product_url:
+                            new_product_urls_found.append(product_url)
+
+                page += 1
+            except requests.exceptions.RequestException as e:
+                print(f"    -> Lỗi khi gọi API sản phẩm {api_url}: {e}")
+                crawl_failed = page == 1
                 break
 
-            for item in products_data:
-                product_url = item.get('link')
-                if product_url and product_url in stop_urls_list:
-                    stop_url_found = product_url
-                    break
-                
-                attachment_link = item.get('_links', {}).get('wp:attachment', [{}])[0].get('href')
-                if not attachment_link:
-                    continue
-
-                try:
-                    attachment_response = requests.get(attachment_link, headers=HEADERS, timeout=20)
-                    attachment_response.raise_for_status()
-                    media_list = attachment_response.json()
-
-                    for media_item in media_list:
-                        # --- LOGIC LẤY URL ẢNH THEO 3 CẤP ƯU TIÊN ---
-                        img_url = None
-                        
-                        # Cấp 1: Thử lấy 'source_url' ở cấp cao nhất (nhanh nhất, tốt nhất)
-                        img_url = media_item.get('source_url')
-                        if img_url:
-                            print(f"    -> Tìm thấy ảnh từ 'source_url' cấp cao nhất")
-                        
-                        # Cấp 2: Nếu không có, tìm trong 'media_details.sizes'
-                        if not img_url:
-                            media_details = media_item.get('media_details', {})
-                            sizes = media_details.get('sizes', {})
-                            preferred_sizes = ['full', 'large', 'medium', 'thumbnail']
-                            
-                            for size in preferred_sizes:
-                                if size in sizes and sizes[size].get('source_url'):
-                                    img_url = sizes[size]['source_url']
-                                    print(f"    -> Tìm thấy ảnh từ media_details (size: {size})")
-                                    break
-
-                        # Cấp 3: Nếu vẫn không có, dùng 'guid.rendered' làm dự phòng
-                        if not img_url:
-                            img_url = media_item.get('guid', {}).get('rendered', '')
-                            if img_url:
-                                print(f"    -> Tìm thấy ảnh bằng phương pháp dự phòng (guid)")
-                        # --- KẾT THÚC LOGIC ƯU TIÊN ---
-
-                        if img_url:
-                            filename = img_url.split('/')[-1]
-                            # Vẫn cần bộ lọc prefix để chọn đúng ảnh trong list media trả về
-                            if filename.lower().startswith(search_prefix.lower()):
-                                final_img_url = process_and_finalize_url(img_url, url_data)
-                                if final_img_url and final_img_url not in [d.get('image_url') for d in all_image_urls]:
-                                    all_image_urls.append({"image_url": final_img_url, "product_url": product_url})
-                                    if product_url:
-                                        new_product_urls_found.append(product_url)
-                                break # Đã tìm thấy ảnh phù hợp cho sản phẩm này, thoát vòng lặp media
-                
-                except requests.exceptions.RequestException as e:
-                    print(f"    -> Lỗi khi gọi API attachment {attachment_link}: {e}")
-                    continue
-
-            page += 1
-        except requests.exceptions.RequestException as e:
-            print(f"    -> Lỗi khi gọi API sản phẩm {api_url}: {e}")
-            break
-            
+    if not crawl_failed: tracker.commit()
+    if first_page and not crawl_failed: remember_validators(*first_page)
+
     if stop_url_found:
-        print(f"[{domain}] Found {len(new_product_urls_found)} new URLs. Stopped at stop URL.")
-        
+        reason = "already-seen products" if tracker.stopped_by_index else "stop URL"
+        print(f"[{domain}] Found {len(new_product_urls_found)} new URLs. Stopped at {reason}.")
+
     final_image_urls = [item['image_url'] for item in all_image_urls]
-    return final_image_urls, new_product_urls_found
\ No newline at end of file
+    return final_image_urls, new_product_urls_found
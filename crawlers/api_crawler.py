@@ -1,47 +1,103 @@
 # crawlers/api_crawler.py
 import requests
-from urllib.parse import urlparse
-from bs4 import BeautifulSoup
-from utils.constants import MAX_API_PAGES, DEFAULT_API_URL_PATTERN, HEADERS
+from datetime import datetime, timedelta
+from urllib.parse import quote
+from utils.constants import MAX_API_PAGES, DEFAULT_API_URL_PATTERN, API_CURSOR_FIELDS
+from utils.http_client import http_get
+from utils.validator_store import conditional_get, remember_validators
+from utils.config_plan import as_plan
+from utils.cursor_store import get_cursor_store
+from utils.seen_index import SeenTracker
 from utils.url_processor import process_and_finalize_url
+from utils.html_extract import first_image_tag
+
+def _build_api_url(domain, page, use_cursor, cursor):
+    api_url = DEFAULT_API_URL_PATTERN.format(domain=domain, page=page)
+    if not use_cursor: return api_url
+    api_url += f"&_fields={API_CURSOR_FIELDS}"
+    if cursor and cursor.get('date'):
+        # Lùi 1 giây vì 'after' không bao gồm mốc; sản phẩm đã xử lý vẫn bị chặn bởi stop URL
+        try:
+            after = datetime.fromisoformat(cursor['date']) - timedelta(seconds=1)
+            api_url += f"&after={quote(after.isoformat())}"
+        except ValueError:
+            pass
+    return api_url
+
+def _item_image_url(item):
+    return (item.get('yoast_head_json', {}).get('og_image', [{}])[0].get('url') or
+            (img_tag.get('src') if (img_tag := first_image_tag(item.get('content', {}).get('rendered', ''))) else None))
 
 def crawl(url_data, stop_urls_list):
-    """Crawl images from a WordPress API endpoint."""
+    """
+    Crawl images from a WordPress API endpoint.
+    With 'api_cursor' the newest product date/id is stored per domain and later runs only request products
+    published after it (with a trimmed _fields list); stop URLs still apply as a fallback.
+    Products already processed in earlier runs are skipped, and the crawl stops after a run of them.
+    """
     all_image_urls, new_product_urls_found = [], []
     page = 1
-    domain = urlparse(url_data['url']).netloc
+    plan = as_plan(url_data)
+    domain = plan.domain
     stop_url_found = None
+    first_page, crawl_failed = None, False
+    use_cursor = plan.get('api_cursor', False)
+    cursor = get_cursor_store().get_cursor(domain) if use_cursor else None
+    newest_item = None
+    tracker = SeenTracker(domain, stop_urls_list)
 
     while page <= MAX_API_PAGES and not stop_url_found:
-        api_url = DEFAULT_API_URL_PATTERN.format(domain=domain, page=page)
+        api_url = _build_api_url(domain, page, use_cursor, cursor)
         try:
-            r = requests.get(api_url, headers=HEADERS, timeout=30)
+            # Trang 1 dùng conditional GET: 304 nghĩa là không có sản phẩm mới
+            r = conditional_get(api_url, timeout=30) if page == 1 else http_get(api_url, timeout=30)
+            if r.status_code == 304:
+                print(f"[{domain}] API không thay đổi (304 Not Modified). Bỏ qua domain.")
+                return [], []
+            if page == 1 and cursor and r.status_code == 400:
+                # Site không nhận tham số 'after': bỏ cursor, quét lại như cũ
+                print(f"[{domain}] API không hỗ trợ truy vấn theo cursor. Quét lại không dùng cursor.")
+                cursor = None
+                continue
             r.raise_for_status()
+            if page == 1: first_page = (api_url, r)
             data = r.json()
             if not data: break
+            if page == 1: newest_item = data[0]
 
             for item in data:
                 product_url = item.get('link')
-                if product_url and product_url in stop_urls_list:
+                decision = tracker.check(product_url) if product_url else SeenTracker.NEW
+                if decision == SeenTracker.STOP:
                     stop_url_found = product_url
                     break
+                if decision == SeenTracker.SKIP: continue
                 
-                img_url = (item.get('yoast_head_json', {}).get('og_image', [{}])[0].get('url') or 
-                         (img_tag.get('src') if (img_tag := BeautifulSoup(item.get('content', {}).get('rendered', ''), 'html.parser').find('img')) else None))
+                img_url = _item_image_url(item)
                 
                 if img_url:
                     if img_url.startswith('http://'): img_url = img_url.replace('http://', 'https://')
                     
-                    final_img_url = process_and_finalize_url(img_url, url_data)
+                    final_img_url = process_and_finalize_url(img_url, plan)
                     
                     if final_img_url and final_img_url not in all_image_urls:
                         all_image_urls.append(final_img_url)
                         if product_url: new_product_urls_found.append(product_url)
+                # Sản phẩm đã xử lý xong được ghi vào index đã xem kể cả khi không có ảnh
+                tracker.mark(product_url)
             page += 1
         except requests.exceptions.RequestException:
+            crawl_failed = page == 1
             break
+
+    if not crawl_failed: tracker.commit()
+    if first_page and not crawl_failed: remember_validators(*first_page)
+    # Chỉ tiến cursor khi trang 1 được xử lý xong; cursor được lưu ở cuối lần chạy cùng stop_urls
+    if use_cursor and newest_item and not crawl_failed and newest_item.get('date'):
+        get_cursor_store().set_cursor(domain, {'date': newest_item['date'], 'id': newest_item.get('id')})
             
     if stop_url_found:
-        print(f"[{domain}] Found {len(new_product_urls_found)} new URLs. Stopped at stop URL.")
+        reason = "already-seen products" if tracker.stopped_by_index else "stop URL"
+        print(f"[{domain}] Found {len(new_product_urls_found)} new URLs. Stopped at {reason}.")
         
-    return all_image_urls, new_product_urls_found
\ No newline at end of file
+    return all_image_urls, new_product_urls_found
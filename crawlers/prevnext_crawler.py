@@ -1,52 +1,70 @@
 # crawlers/prevnext_crawler.py
 import requests
-from urllib.parse import urlparse, urljoin
-from bs4 import BeautifulSoup
-from utils.constants import MAX_PREVNEXT_URLS, HEADERS
-from utils.url_processor import process_and_finalize_url, find_best_image_url
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+from utils.constants import MAX_PREVNEXT_URLS, PREVNEXT_PIPELINE_WORKERS
+from utils.http_client import http_get
+from utils.html_extract import extract_page
+from utils.url_processor import process_and_finalize_url
+from utils.config_plan import as_plan
+from utils.seen_index import SeenTracker
 
 def crawl(url_data, stop_urls_list):
     """Crawl images by following 'previous' and 'next' links on product pages."""
     all_image_urls, new_product_urls_found = [], []
-    domain = urlparse(url_data['url']).netloc
+    plan = as_plan(url_data)
+    domain = plan.domain
 
     try:
-        r = requests.get(url_data['url'], headers=HEADERS, timeout=30)
+        r = http_get(plan.url, timeout=30)
         r.raise_for_status()
-        soup = BeautifulSoup(r.text, "html.parser")
-        first_product_tag = soup.select_one(url_data['first_product_selector'])
+        _, first_product_tag = extract_page(r.text, plan, link_selector=plan['first_product_selector'], want_image=False)
         if not first_product_tag: return [], []
-        current_product_url = urljoin(url_data['url'], first_product_tag.get('href'))
+        current_product_url = urljoin(plan.url, first_product_tag.get('href'))
     except requests.exceptions.RequestException:
         return [], []
 
     count = 0
-    stop_url_found = None
-    while count < MAX_PREVNEXT_URLS:
-        if current_product_url in stop_urls_list:
-            stop_url_found = current_product_url
-            break
-        print(f"Crawling: {current_product_url}")
-        try:
-            r = requests.get(current_product_url, headers=HEADERS, timeout=30)
-            r.raise_for_status()
-            soup = BeautifulSoup(r.text, "html.parser")
-            
-            best_url = find_best_image_url(soup, url_data)
-            if best_url:
-                final_img_url = process_and_finalize_url(best_url, url_data)
-                if final_img_url and final_img_url not in all_image_urls:
-                    all_image_urls.append(final_img_url)
-                    new_product_urls_found.append(current_product_url)
+    stop_url_found, crawl_failed = None, False
+    # Trang của sản phẩm đã crawl ở lần trước vẫn được tải để lấy link kế tiếp, nhưng không kiểm tra lại ảnh
+    tracker = SeenTracker(domain, stop_urls_list)
+    # Pipeline: luồng chính chỉ tải trang và tìm link kế tiếp; việc kiểm tra ảnh (HEAD fallback/replacement)
+    # chạy trong pool, kết quả được gộp lại theo đúng thứ tự trang sau khi đi hết chuỗi
+    pending_results = []
+    with ThreadPoolExecutor(max_workers=PREVNEXT_PIPELINE_WORKERS) as executor:
+        while count < MAX_PREVNEXT_URLS:
+            decision = tracker.check(current_product_url)
+            if decision == SeenTracker.STOP:
+                stop_url_found = current_product_url
+                break
+            print(f"Crawling: {current_product_url}")
+            try:
+                r = http_get(current_product_url, timeout=30)
+                r.raise_for_status()
+                best_url, next_product_tag = extract_page(r.text, plan, link_selector=plan['next_product_selector'],
+                                                          want_image=decision == SeenTracker.NEW)
+                # Trang đã tải và parse xong: ghi vào index đã xem kể cả khi không có ảnh
+                if decision == SeenTracker.NEW: tracker.mark(current_product_url)
+                if best_url:
+                    pending_results.append((current_product_url, executor.submit(process_and_finalize_url, best_url, plan)))
 
-            next_product_tag = soup.select_one(url_data['next_product_selector'])
-            if not next_product_tag or not next_product_tag.get('href'): break
-            current_product_url = urljoin(current_product_url, next_product_tag.get('href'))
-            count += 1
-        except requests.exceptions.RequestException:
-            break
-            
+                if not next_product_tag or not next_product_tag.get('href'): break
+                current_product_url = urljoin(current_product_url, next_product_tag.get('href'))
+                count += 1
+            except requests.exceptions.RequestException:
+                # Chuỗi bị đứt giữa chừng: ảnh đã tìm được vẫn được trả về, nhưng không ghi vào index đã xem
+                crawl_failed = True
+                break
+
+        for product_url, future in pending_results:
+            final_img_url = future.result()
+            if final_img_url and final_img_url not in all_image_urls:
+                all_image_urls.append(final_img_url)
+                new_product_urls_found.append(product_url)
+
+    if not crawl_failed: tracker.commit()
     if stop_url_found:
-        print(f"[{domain}] Found {len(new_product_urls_found)} new URLs. Stopped at stop URL.")
+        reason = "already-seen products" if tracker.stopped_by_index else "stop URL"
+        print(f"[{domain}] Found {len(new_product_urls_found)} new URLs. Stopped at {reason}.")
         
     return all_image_urls, new_product_urls_found
\ No newline at end of file
@@ -1,53 +1,89 @@
 # crawlers/product_list_crawler.py
 import requests
-from urllib.parse import urlparse
-from bs4 import BeautifulSoup
-from utils.constants import REPO_URL_PATTERN, MAX_PREVNEXT_URLS, HEADERS
-from utils.url_processor import process_and_finalize_url, find_best_image_url
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from utils.constants import REPO_URL_PATTERN, MAX_PREVNEXT_URLS, PRODUCT_LIST_FETCH_CONCURRENCY
+from utils.http_client import http_get
+from utils.validator_store import conditional_get, remember_validators
+from utils.html_extract import extract_page
+from utils.url_processor import process_and_finalize_url
+from utils.config_plan import as_plan
+from utils.seen_index import SeenTracker
+
+def _crawl_product(product_url, plan):
+    """
+    Tải và parse một trang sản phẩm; trả về (URL ảnh đã chuẩn hóa hoặc None, failed). failed là True khi gặp lỗi
+    mạng/timeout (trang lỗi HTTP như 404 là kết quả hợp lệ). Chạy trong thread pool.
+    """
+    print(f"Crawling: {product_url}")
+    try:
+        # Không stream để các lần tải trùng URL đang chạy song song được gộp trong http_client
+        with http_get(product_url, timeout=30) as r:
+            r.raise_for_status()
+            content = r.content
+        best_url, _ = extract_page(content, plan)
+        return (process_and_finalize_url(best_url, plan) if best_url else None), False
+    except requests.exceptions.HTTPError:
+        return None, False
+    except requests.exceptions.RequestException:
+        return None, True
 
 def crawl(url_data, stop_urls_list):
     """Crawl images by fetching a list of product URLs from a remote file."""
     all_image_urls, new_product_urls_found = [], []
-    domain = urlparse(url_data['url']).netloc
+    plan = as_plan(url_data)
+    domain = plan.domain
     repo_file_url = REPO_URL_PATTERN.format(domain=domain)
 
     try:
-        r = requests.get(repo_file_url, headers=HEADERS, timeout=30)
-        r.raise_for_status()
-        product_urls = [line.strip() for line in r.text.splitlines() if line.strip()]
+        list_response = conditional_get(repo_file_url, timeout=30)
+        if list_response.status_code == 304:
+            print(f"[{domain}] Danh sách sản phẩm không thay đổi (304 Not Modified). Bỏ qua domain.")
+            return [], []
+        list_response.raise_for_status()
+        product_urls = [line.strip() for line in list_response.text.splitlines() if line.strip()]
     except requests.exceptions.RequestException:
         return [], []
     
+    # Bỏ qua sản phẩm đã crawl ở các lần trước; dừng ở stop URL hoặc sau một chuỗi sản phẩm đã crawl
     urls_to_crawl, stop_url_found = [], None
-    if stop_urls_list:
-        for product_url in product_urls:
-            if product_url in stop_urls_list:
-                stop_url_found = product_url
-                break
-            urls_to_crawl.append(product_url)
-        if not stop_url_found: urls_to_crawl = product_urls
-    else:
-        urls_to_crawl = product_urls
+    tracker = SeenTracker(domain, stop_urls_list)
+    for product_url in product_urls:
+        decision = tracker.check(product_url)
+        if decision == SeenTracker.STOP:
+            stop_url_found = product_url
+            break
+        if decision == SeenTracker.NEW: urls_to_crawl.append(product_url)
 
     if stop_url_found:
         print(f"[{domain}] Found {len(urls_to_crawl)} new URLs to crawl. Will stop at: {stop_url_found}")
 
-    for product_url in urls_to_crawl:
-        if len(all_image_urls) >= MAX_PREVNEXT_URLS: break
-        print(f"Crawling: {product_url}")
-        try:
-            with requests.get(product_url, headers=HEADERS, timeout=30, stream=True) as r:
-                r.raise_for_status()
-                content = b''.join(r.iter_content(chunk_size=8192))
-                soup = BeautifulSoup(content, "html.parser")
-                
-            best_url = find_best_image_url(soup, url_data)
-            if best_url:
-                final_img_url = process_and_finalize_url(best_url, url_data)
-                if final_img_url and final_img_url not in all_image_urls:
-                    all_image_urls.append(final_img_url)
-                    new_product_urls_found.append(product_url)
-        except requests.exceptions.RequestException:
-            continue
-            
+    pending, url_iter, crawl_failed = deque(), iter(urls_to_crawl), False
+    with ThreadPoolExecutor(max_workers=PRODUCT_LIST_FETCH_CONCURRENCY) as executor:
+        while True:
+            # Số trang đang tải không vượt quá số ảnh còn thiếu, nên không tải thừa khi sắp chạm MAX_PREVNEXT_URLS
+            while len(pending) < min(PRODUCT_LIST_FETCH_CONCURRENCY, MAX_PREVNEXT_URLS - len(all_image_urls)):
+                product_url = next(url_iter, None)
+                if product_url is None: break
+                pending.append((product_url, executor.submit(_crawl_product, product_url, plan)))
+            if not pending or len(all_image_urls) >= MAX_PREVNEXT_URLS: break
+
+            # Gộp kết quả theo đúng thứ tự trong danh sách sản phẩm
+            product_url, future = pending.popleft()
+            final_img_url, failed = future.result()
+            crawl_failed = crawl_failed or failed
+            # Trang đã xử lý xong (kể cả không có ảnh hoặc lỗi HTTP như 404) được ghi vào index đã xem
+            if not failed: tracker.mark(product_url)
+            if final_img_url and final_img_url not in all_image_urls:
+                all_image_urls.append(final_img_url)
+                new_product_urls_found.append(product_url)
+
+        for _, future in pending: future.cancel()
+
+    # Có trang sản phẩm lỗi mạng: không ghi index đã xem và validator, để lần sau crawl lại danh sách này
+    if crawl_failed:
+        print(f"[{domain}] Một số trang sản phẩm lỗi mạng. Sẽ crawl lại ở lần chạy sau.")
+    else:
+        tracker.commit()
+        remember_validators(repo_file_url, list_response)
     return all_image_urls, new_product_urls_found
\ No newline at end of file
@@ -1,9 +1,74 @@
 # crawlers/sitemap_crawler.py
-import requests
-from bs4 import BeautifulSoup
+import xml.etree.ElementTree as ET
+from collections import deque
+from itertools import chain
 from urllib.parse import urlparse
-from utils.constants import HEADERS
+from utils.constants import SITEMAP_CHUNK_SIZE, SITEMAP_TAIL_BUFFER
+from utils.http_client import http_get
 from utils.url_processor import process_and_finalize_url
+from utils.validator_store import conditional_get, remember_validators
+from utils.config_plan import as_plan
+from utils.seen_index import SeenTracker
+
+SITEMAP_IMAGE_NS = '{http://www.google.com/schemas/sitemap-image/1.1}'
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+def _iter_xml_elements(response, name):
+    """
+    Parse XML theo từng chunk của response (không giữ cả cây trong bộ nhớ) và yield các element tên `name`.
+    Element đã yield sẽ bị xóa khỏi cây; response được đóng khi generator kết thúc hoặc bị close().
+    """
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    root = None
+    try:
+        # Chunk None cuối cùng để đóng parser và lấy nốt các event còn lại
+        for chunk in chain(response.iter_content(chunk_size=SITEMAP_CHUNK_SIZE), [None]):
+            if chunk is None: parser.close()
+            else: parser.feed(chunk)
+            for event, elem in parser.read_events():
+                if event == 'start':
+                    if root is None: root = elem
+                    continue
+                if _local_name(elem.tag) == name:
+                    yield elem
+                    root.clear()
+    finally:
+        response.close()
+
+def iter_sitemap_entries(response):
+    """Yield (loc, image:loc) cho từng <url> của sitemap; giá trị là None nếu thẻ không tồn tại."""
+    for url_entry in _iter_xml_elements(response, 'url'):
+        product_url = image_url = None
+        for child in url_entry.iter():
+            if _local_name(child.tag) != 'loc': continue
+            if child.tag.startswith(SITEMAP_IMAGE_NS):
+                if image_url is None: image_url = child.text or ''
+            elif product_url is None:
+                product_url = child.text or ''
+        yield product_url, image_url
+
+def _iter_product_sitemaps(target_sitemaps):
+    """
+    Yield (sitemap_url, response) theo đúng thứ tự quét, dùng conditional GET.
+    Nếu mọi sitemap đều trả về 304 thì không yield gì (domain không có thay đổi).
+    Khi có một sitemap thay đổi, các sitemap 304 khác được tải lại để giữ nguyên logic quét như cũ.
+    """
+    unchanged, any_changed = [], False
+    for sitemap_url in target_sitemaps:
+        if any_changed:
+            yield sitemap_url, http_get(sitemap_url, timeout=60, stream=True)
+            continue
+        response = conditional_get(sitemap_url, timeout=60, stream=True)
+        if response.status_code == 304:
+            response.close()
+            unchanged.append(sitemap_url)
+            continue
+        any_changed = True
+        for unchanged_url in unchanged:
+            yield unchanged_url, http_get(unchanged_url, timeout=60, stream=True)
+        yield sitemap_url, response
 
 def crawl(url_data, stop_urls_list):
     """
@@ -14,23 +79,23 @@ def crawl(url_data, stop_urls_list):
     processed_design_bases = set()
 
     # Lấy các tùy chọn nâng cao từ config
-    main_sitemap_url = url_data['url']
-    product_url_keywords = url_data.get('product_url_keywords', [])
-    product_url_exclusions = url_data.get('product_url_exclusions', [])
-    crawl_backwards = url_data.get('crawl_sitemap_backwards', False)
-    sitemap_limit = url_data.get('sitemap_crawl_limit', 1)
+    plan = as_plan(url_data)
+    main_sitemap_url = plan.url
+    product_url_keywords = plan.keywords
+    crawl_backwards = plan.get('crawl_sitemap_backwards', False)
+    sitemap_limit = plan.get('sitemap_crawl_limit', 1)
     
     # Lấy "công tắc" điều khiển việc khử trùng lặp design, mặc định là True
-    enable_deduplication = url_data.get('enable_design_deduplication', True)
+    enable_deduplication = plan.get('enable_design_deduplication', True)
+    tracker = SeenTracker(plan.domain, stop_urls_list)
 
     try:
         # Giai đoạn 1: Lấy danh sách sitemap sản phẩm
         # ... (Phần code này giữ nguyên) ...
         print(f"-> Đang quét sitemap chính: {main_sitemap_url}")
-        r_index = requests.get(main_sitemap_url, headers=HEADERS, timeout=30)
+        r_index = http_get(main_sitemap_url, timeout=30, stream=True)
         r_index.raise_for_status()
-        soup_index = BeautifulSoup(r_index.content, 'xml')
-        product_sitemaps = [loc.text for loc in soup_index.find_all('loc') if '_products_' in loc.text]
+        product_sitemaps = [loc.text or '' for loc in _iter_xml_elements(r_index, 'loc') if '_products_' in (loc.text or '')]
         if not product_sitemaps:
             print("LỖI: Không tìm thấy sitemap sản phẩm.")
             return [], []
@@ -39,28 +104,31 @@ def crawl(url_data, stop_urls_list):
 
         # Giai đoạn 2: Lặp qua từng sitemap đã chọn để quét
         stop_url_was_hit = False
-        for sitemap_url in target_sitemaps:
+        processed_sitemaps = []
+        for sitemap_url, r_products in _iter_product_sitemaps(target_sitemaps):
             print(f"\n--- Bắt đầu quét sitemap: {sitemap_url} ---")
-            r_products = requests.get(sitemap_url, headers=HEADERS, timeout=60)
             r_products.raise_for_status()
-            soup_products = BeautifulSoup(r_products.content, 'xml')
-            
-            url_entries = soup_products.find_all('url')
+            processed_sitemaps.append((sitemap_url, r_products))
+
+            entries_stream = iter_sitemap_entries(r_products)
+            url_entries = entries_stream
             if crawl_backwards:
-                url_entries.reverse()
+                # Sản phẩm mới nằm ở cuối file: chỉ giữ phần đuôi thay vì toàn bộ danh sách <url>
+                url_entries = reversed(deque(entries_stream, maxlen=SITEMAP_TAIL_BUFFER))
 
-            for url_entry in url_entries:
-                product_url_tag = url_entry.find('loc')
-                if not product_url_tag: continue
-                product_url = product_url_tag.text
+            # Lọc ngay trong lúc parse và ngừng đọc response khi gặp stop URL;
+            # việc kiểm tra ảnh (HEAD) chạy sau khi đã đóng kết nối tới sitemap
+            selected_entries = []
+            for product_url, raw_image_url in url_entries:
+                if product_url is None: continue
 
                 # --- BỘ LỌC KEYWORDS (LUÔN CHẠY) ---
                 url_path = urlparse(product_url).path
                 # Cổng 1: Inclusion
-                if product_url_keywords and not any(keyword in url_path for keyword in product_url_keywords):
+                if plan.keyword_re and not plan.keyword_re.search(url_path):
                     continue
                 # Cổng 2: Exclusion
-                if product_url_exclusions and any(keyword in url_path for keyword in product_url_exclusions):
+                if plan.exclusion_re and plan.exclusion_re.search(url_path):
                     continue
                 
                 # --- LOGIC KHỬ TRÙNG LẶP DESIGN (CÓ THỂ BẬT/TẮT) ---
@@ -83,16 +151,23 @@ def crawl(url_data, stop_urls_list):
                     if design_base:
                         processed_design_bases.add(design_base)
 
-                if product_url in stop_urls_list:
-                    print(f"-> Đã gặp stop URL. Dừng toàn bộ quá trình quét sitemap.")
+                decision = tracker.check(product_url)
+                if decision == SeenTracker.STOP:
+                    if tracker.stopped_by_index:
+                        print(f"-> Đã gặp {tracker.stop_after} sản phẩm đã crawl liên tiếp. Dừng toàn bộ quá trình quét sitemap.")
+                    else:
+                        print(f"-> Đã gặp stop URL. Dừng toàn bộ quá trình quét sitemap.")
                     stop_url_was_hit = True
                     break
+                if decision == SeenTracker.SKIP: continue
+                selected_entries.append((product_url, raw_image_url))
+            entries_stream.close()
 
-                image_url_tag = url_entry.find('image:loc')
-                if not image_url_tag: continue
-                raw_image_url = image_url_tag.text
-                final_img_url = process_and_finalize_url(raw_image_url, url_data)
-
+            for product_url, raw_image_url in selected_entries:
+                # Sản phẩm đã xử lý được ghi vào index đã xem kể cả khi không có ảnh
+                tracker.mark(product_url)
+                if raw_image_url is None: continue
+                final_img_url = process_and_finalize_url(raw_image_url, plan)
                 if final_img_url:
                     unfiltered_results.append({
                         'image_url': final_img_url,
@@ -104,8 +179,16 @@ def crawl(url_data, stop_urls_list):
             if stop_url_was_hit:
                 break
 
+        if not processed_sitemaps:
+            print(f"-> Sitemap sản phẩm không thay đổi (304 Not Modified). Bỏ qua domain.")
+            return [], []
+
     except Exception as e:
         print(f"LỖI: Có lỗi xảy ra trong quá trình xử lý sitemap. {e}")
         return [], []
 
+    tracker.commit()
+    for sitemap_url, r_products in processed_sitemaps:
+        remember_validators(sitemap_url, r_products)
+
     return unfiltered_results, new_product_urls_found
\ No newline at end of file
@@ -1,94 +1,168 @@
 # main.py
+import argparse
+import importlib
+import re
+import sys
 import time
-import pytz
 from datetime import datetime
-from urllib.parse import urlparse
 
 # Import các hàm tiện ích từ thư mục utils
 from utils.file_handler import (load_config, load_stop_urls, save_stop_urls, 
                                 save_urls, download_images_for_domain)
 from utils.notifier import send_telegram_message
 from utils.git_handler import git_push_changes, trigger_workflow_dispatch
-from utils.url_processor import is_image_recent
-from utils.constants import STOP_URLS_COUNT, LOG_FILE
-
-# Import tất cả các module crawler đã xây dựng
-from crawlers import (api_crawler, prevnext_crawler, product_list_crawler, 
-                      api_attachment_crawler, sitemap_crawler)
+from utils.url_processor import filter_recent, prune_metadata_memory_cache
+from utils.scheduler import run_domain_jobs
+from utils.validator_store import save_validators
+from utils.replacement_stats import save_replacement_stats
+from utils.state_store import record_run
+from utils.cursor_store import save_cursors
+from utils.seen_index import save_seen_indexes
+from utils.profiler import phase, reset_profile
+from utils.config_plan import ConfigError
+from utils.poll_schedule import PollSchedule
+from utils.shard import parse_shard, select_shard, write_shard_result, load_shard_results, apply_shard_results
+from utils.constants import (STOP_URLS_COUNT, LOG_FILE, MAX_CRAWL_WORKERS, PROFILE_FILE, PROFILE_IN_REPORT,
+                             DAEMON_MIN_INTERVAL, DAEMON_PUSH_INTERVAL)
 
 # --- Crawler Registry ---
-# Ánh xạ 'source_type' trong config.json tới hàm crawl tương ứng
+# Ánh xạ 'source_type' trong config.json tới module crawler; module chỉ được import khi có domain dùng tới
 CRAWLER_MAPPING = {
-    'api': api_crawler.crawl,
-    'prevnext': prevnext_crawler.crawl,
-    'product-list': product_list_crawler.crawl,
-    'api-attachment': api_attachment_crawler.crawl,
-    'sitemap': sitemap_crawler.crawl,
+    'api': 'crawlers.api_crawler',
+    'prevnext': 'crawlers.prevnext_crawler',
+    'product-list': 'crawlers.product_list_crawler',
+    'api-attachment': 'crawlers.api_attachment_crawler',
+    'sitemap': 'crawlers.sitemap_crawler',
 }
 
-def main():
-    """Hàm chính điều phối toàn bộ quá trình crawl."""
-    start_time = time.time()
-    configs = load_config()
-    stop_urls_data = load_stop_urls()
-    urls_summary = {}
+# Dòng số liệu của một domain trong imagecrawler.log
+_LOG_LINE_RE = re.compile(r'^(\S+): (\d+) New Images\. Total: (\d+)$')
 
-    for url_data in configs:
-        domain = urlparse(url_data['url']).netloc
-        source_type = url_data.get('source_type')
-        domain_stop_urls_list = set(stop_urls_data.get(domain, []))
+def get_crawler(source_type):
+    """Hàm crawl cho source_type (import module lần đầu cần tới), hoặc None nếu không có crawler phù hợp."""
+    module_name = CRAWLER_MAPPING.get(source_type)
+    return importlib.import_module(module_name).crawl if module_name else None
 
-        print(f"\n--- Processing domain: {domain} (type: {source_type}) ---")
+def process_domain(url_data, domain_stop_urls_list):
+    """Crawl, lọc và lưu kết quả cho một domain (url_data là ConfigPlan). Trả về None nếu không có crawler phù hợp."""
+    domain = url_data.domain
+    source_type = url_data.source_type
 
-        # Lấy hàm crawl tương ứng từ registry
-        crawler_function = CRAWLER_MAPPING.get(source_type)
-        if not crawler_function:
-            print(f"CẢNH BÁO: Không tìm thấy crawler cho source_type '{source_type}'. Bỏ qua domain này.")
-            continue
+    print(f"\n--- Processing domain: {domain} (type: {source_type}) ---")
 
-        # Gọi hàm crawl và nhận kết quả
-        # Giả định các crawlers trả về list of dicts: [{'image_url': ..., 'product_title': ..., 'product_url': ...}]
-        # Hoặc list of strings (để tương thích ngược)
+    # Lấy hàm crawl tương ứng từ registry
+    crawler_function = get_crawler(source_type)
+    if not crawler_function:
+        print(f"CẢNH BÁO: Không tìm thấy crawler cho source_type '{source_type}'. Bỏ qua domain này.")
+        return None
+
+    # Gọi hàm crawl và nhận kết quả
+    # Giả định các crawlers trả về list of dicts: [{'image_url': ..., 'product_title': ..., 'product_url': ...}]
+    # Hoặc list of strings (để tương thích ngược)
+    with phase('crawl', domain):
         unfiltered_results_raw, new_product_urls_found = crawler_function(url_data, domain_stop_urls_list)
 
-        # Chuẩn hóa dữ liệu trả về thành list of dicts
-        unfiltered_results = []
-        if unfiltered_results_raw and isinstance(unfiltered_results_raw[0], str):
-             # Chuyển đổi từ list of strings sang list of dicts nếu crawler cũ
-            unfiltered_results = [{'image_url': url, 'product_url': '', 'product_title': ''} for url in unfiltered_results_raw]
-        else:
-            unfiltered_results = unfiltered_results_raw
-
-        # Lọc các ảnh không đủ mới (nếu được cấu hình)
-        final_results, discarded_count = [], 0
-        if url_data.get("check_recency", False):
-            print(f"[{domain}] Filtering {len(unfiltered_results)} found items for recency...")
-            for item in unfiltered_results:
-                if is_image_recent(item['image_url']):
-                    final_results.append(item)
-                else:
-                    discarded_count += 1
-        else:
-            final_results = unfiltered_results
-        
-        # Tích hợp chức năng download mới
-        if url_data.get("download_images", False):
+    # Chuẩn hóa dữ liệu trả về thành list of dicts
+    unfiltered_results = []
+    if unfiltered_results_raw and isinstance(unfiltered_results_raw[0], str):
+         # Chuyển đổi từ list of strings sang list of dicts nếu crawler cũ
+        unfiltered_results = [{'image_url': url, 'product_url': '', 'product_title': ''} for url in unfiltered_results_raw]
+    else:
+        unfiltered_results = unfiltered_results_raw
+
+    # Lọc các ảnh không đủ mới (nếu được cấu hình)
+    final_results, discarded_count = [], 0
+    if url_data.check_recency:
+        print(f"[{domain}] Filtering {len(unfiltered_results)} found items for recency...")
+        with phase('recency', domain):
+            final_results, discarded_results = filter_recent(unfiltered_results)
+        discarded_count = len(discarded_results)
+    else:
+        final_results = unfiltered_results
+
+    # Tích hợp chức năng download mới
+    if url_data.download_images:
+        with phase('download', domain):
             download_images_for_domain(final_results, domain, url_data)
-        
-        # Lưu URL vào file .txt (chức năng này vẫn hoạt động song song)
-        final_image_urls = [item['image_url'] for item in final_results]
+
+    # Lưu URL vào file .txt (chức năng này vẫn hoạt động song song)
+    final_image_urls = [item['image_url'] for item in final_results]
+    with phase('save', domain):
         new_urls_count, total_urls_count = save_urls(domain, final_image_urls, discarded_count)
-        urls_summary[domain] = {'new_count': new_urls_count, 'total_count': total_urls_count}
-        
+    return {
+        'domain': domain,
+        'counts': {'new_count': new_urls_count, 'total_count': total_urls_count},
+        'new_product_urls_found': new_product_urls_found,
+    }
+
+def _load_config_or_exit():
+    try:
+        return load_config()
+    except ConfigError as e:
+        # Dừng ngay trước khi crawl: config lỗi không được để lộ ra giữa lần chạy
+        print(f"LỖI: config.json không hợp lệ:\n{e}")
+        raise SystemExit(1)
+
+def main(max_workers=MAX_CRAWL_WORKERS, configs=None, shard=None, report=True):
+    """
+    Hàm chính điều phối toàn bộ quá trình crawl. configs: list ConfigPlan cần crawl (mặc định toàn bộ config.json).
+    shard: (i, N) để chỉ crawl các domain của shard i và ghi file kết quả cho bước merge (utils/shard.py)
+    thay vì ghi log, gửi Telegram và push. report=False: chỉ crawl và lưu trạng thái, phía gọi tự báo cáo (daemon).
+    Trả về {domain: {'new_count', 'total_count'}} của các domain đã crawl.
+    """
+    start_time = time.time()
+    profile = reset_profile()
+    if configs is None: configs = _load_config_or_exit()
+    if shard:
+        configs = select_shard(configs, *shard)
+        print(f"--- Shard {shard[0]}/{shard[1]}: {len(configs)} domain ---")
+    stop_urls_data = load_stop_urls()
+    urls_summary = {}
+
+    # Các domain được crawl song song; stop_urls_data chỉ được đọc trong lúc crawl
+    def domain_job(url_data):
+        return process_domain(url_data, set(stop_urls_data.get(url_data.domain, [])))
+
+    results = run_domain_jobs(configs, domain_job, max_workers=max_workers)
+
+    # Gộp kết quả theo đúng thứ tự config để log và stop_urls.txt giống khi chạy tuần tự
+    for result in results:
+        if result is None: continue
+        domain = result['domain']
+        urls_summary[domain] = result['counts']
+
         # Cập nhật danh sách stop_urls
-        if new_product_urls_found:
-            stop_urls_data[domain] = new_product_urls_found[:STOP_URLS_COUNT]
-    
-    save_stop_urls(stop_urls_data)
+        if result['new_product_urls_found']:
+            stop_urls_data[domain] = result['new_product_urls_found'][:STOP_URLS_COUNT]
     
+    with phase('finalize'):
+        save_stop_urls(stop_urls_data)
+        # Chỉ lưu ETag/Last-Modified sau khi stop_urls đã được cập nhật
+        save_validators()
+        save_cursors()
+        save_seen_indexes()
+        save_replacement_stats()
+
+    duration = time.time() - start_time
+    if shard:
+        path = write_shard_result(*shard, start_time, duration, configs, urls_summary, stop_urls_data, profile)
+        profile.write(PROFILE_FILE)
+        print(f"--- Shard result saved to {path} ---")
+        return urls_summary
+    if not report:
+        profile.write(PROFILE_FILE)
+        return urls_summary
+    _report(urls_summary, start_time, duration, profile)
+    git_push_changes()
+    return urls_summary
+
+def _report(urls_summary, start_time, duration, profile=None, log_summary=None):
+    """
+    Ghi imagecrawler.log, lịch sử lần chạy và profile; gửi Telegram nếu urls_summary có ảnh mới.
+    log_summary: số liệu các domain ghi vào log (mặc định urls_summary). Trả về True nếu có ảnh mới.
+    """
     # --- Tổng kết và báo cáo ---
-    end_time = time.time()
-    duration = end_time - start_time
+    import pytz  # chỉ cần cho phần báo cáo
     now_vietnam = datetime.now(pytz.timezone('Asia/Ho_Chi_Minh'))
     
     log_header = [
@@ -101,10 +175,10 @@ def main():
     reportable_lines = []
     full_log_lines = list(log_header)
     
-    for domain, counts in urls_summary.items():
+    for domain, counts in (log_summary or urls_summary).items():
         log_line = f"{domain}: {counts['new_count']} New Images. Total: {counts['total_count']}"
         full_log_lines.append(log_line)
-        if counts['new_count'] > 0:
+        if domain in urls_summary and counts['new_count'] > 0:
             reportable_lines.append(log_line)
     
     duration_line = f"Crawl duration: {int(duration // 60)} min {int(duration % 60)} seconds."
@@ -113,16 +187,139 @@ def main():
     print(f"\n--- Summary saved to {LOG_FILE} ---")
     with open(LOG_FILE, "w", encoding="utf-8") as f:
         f.write("\n".join(full_log_lines))
+    record_run(start_time, duration, urls_summary)
+    if profile is not None:
+        profile.write(PROFILE_FILE)
+        print(f"--- Run profile saved to {PROFILE_FILE} ---")
     
     if found_new_images:
         print("Tìm thấy ảnh mới, đang chuẩn bị gửi báo cáo và kích hoạt workflow...")
         final_report_lines = log_header + reportable_lines + [duration_line]
+        if PROFILE_IN_REPORT and profile is not None: final_report_lines += profile.summary_lines()
         send_telegram_message("\n".join(final_report_lines))
         # trigger_workflow_dispatch() # Bỏ comment nếu muốn kích hoạt workflow
     else:
         print("Không có ảnh mới nào được tìm thấy. Bỏ qua các hành động tiếp theo.")
-    
+    return found_new_images
+
+def _read_log_counts():
+    """Số liệu từng domain trong imagecrawler.log hiện có, để daemon giữ dòng log của các domain chưa đến hạn."""
+    counts = {}
+    try:
+        with open(LOG_FILE, 'r', encoding='utf-8') as f:
+            for line in f:
+                match = _LOG_LINE_RE.match(line.strip())
+                if match: counts[match.group(1)] = {'new_count': int(match.group(2)), 'total_count': int(match.group(3))}
+    except FileNotFoundError:
+        pass
+    return counts
+
+def merge_shards(paths):
+    """
+    Gộp kết quả của các runner --shard: ghi domain/*.txt và stop_urls.txt, rồi tạo một log, một báo cáo Telegram
+    và một lần push. Thời lượng báo cáo là của shard chậm nhất (các shard chạy song song). Profile của các shard
+    được cộng dồn thành một profile (PROFILE_FILE) và dùng cho tóm tắt trong báo cáo Telegram.
+    """
+    try:
+        results, missing = load_shard_results(paths)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"LỖI: Không gộp được kết quả shard: {e}")
+        raise SystemExit(1)
+    if missing:
+        # Runner lỗi: domain của shard đó giữ nguyên dữ liệu cũ và được crawl lại ở lần chạy sau
+        print(f"CẢNH BÁO: Thiếu kết quả của shard {', '.join(map(str, missing))}/{results[0]['count']}.")
+    stop_urls_data = load_stop_urls()
+    urls_summary = apply_shard_results(results, stop_urls_data, _load_config_or_exit())
+    save_stop_urls(stop_urls_data)
+    print(f"--- Đã gộp {len(results)} shard, {len(urls_summary)} domain ---")
+    start_time = min(result['started_at'] for result in results)
+    duration = max(result['duration'] for result in results)
+    profile = reset_profile()
+    for result in results:
+        if result.get('profile'): profile.merge(result['profile'])
+    _report(urls_summary, start_time, duration, profile)
     git_push_changes()
+    return urls_summary
+
+def run_daemon(max_workers=MAX_CRAWL_WORKERS):
+    """
+    Chạy liên tục trong một process: Session, pool kết nối và các cache được giữ nguyên giữa các chu kỳ.
+    Mỗi chu kỳ chỉ crawl các domain đã đến hạn theo PollSchedule; config.json được đọc lại mỗi chu kỳ.
+    imagecrawler.log luôn có đủ các domain (domain chưa đến hạn giữ số liệu lần crawl gần nhất); thay đổi chỉ
+    được push khi có ảnh mới, và cách lần push trước ít nhất DAEMON_PUSH_INTERVAL.
+
+    Lưu ý: git_push_changes chạy ngoài GitHub Actions sẽ amend commit cuối và force push. Không chạy daemon cùng
+    lúc với workflow theo lịch (cron) trên cùng repo: lần force push của daemon sẽ ghi đè commit của workflow
+    (và ngược lại push của workflow bị từ chối). Tắt 'schedule' trong .github/workflows/imagecrawler.yml khi
+    dùng daemon.
+    """
+    schedule = PollSchedule()
+    configs = _load_config_or_exit()
+    log_counts = _read_log_counts()
+    last_push, push_pending = 0.0, False
+    print(f"--- Daemon mode: {len(configs)} domain ---")
+    try:
+        while True:
+            try:
+                configs = load_config()
+            except ConfigError as e:
+                print(f"CẢNH BÁO: config.json không hợp lệ, tiếp tục dùng config cũ:\n{e}")
+            due_configs = schedule.due(configs)
+            if due_configs:
+                print(f"\n=== Chu kỳ daemon: {len(due_configs)}/{len(configs)} domain đến hạn ===")
+                prune_metadata_memory_cache()
+                cycle_start = time.time()
+                try:
+                    urls_summary = main(max_workers=max_workers, configs=due_configs, report=False)
+                except Exception as e:
+                    # Lỗi của một chu kỳ không dừng daemon; các domain này vẫn đến hạn ở chu kỳ sau
+                    print(f"LỖI: Chu kỳ daemon thất bại: {e}")
+                    time.sleep(DAEMON_MIN_INTERVAL)
+                    continue
+                log_counts.update(urls_summary)
+                log_summary = {plan.domain: log_counts[plan.domain] for plan in configs if plan.domain in log_counts}
+                if _report(urls_summary, cycle_start, time.time() - cycle_start, log_summary=log_summary):
+                    push_pending = True
+                for url_data in due_configs:
+                    counts = urls_summary.get(url_data.domain) or {'new_count': 0}
+                    interval = schedule.record(url_data.domain, counts['new_count'])
+                    print(f"[{url_data.domain}] Lần poll tiếp theo sau {int(interval // 60)} phút.")
+                schedule.save()
+            push_wait = last_push + DAEMON_PUSH_INTERVAL - time.time()
+            if push_pending and push_wait <= 0:
+                git_push_changes()
+                last_push, push_pending = time.time(), False
+            wait = schedule.seconds_until_next(configs)
+            if push_pending: wait = min(wait, max(0.0, push_wait))
+            print(f"--- Chờ {int(wait)} giây tới chu kỳ tiếp theo ---")
+            time.sleep(wait)
+    except KeyboardInterrupt:
+        print("Dừng daemon.")
+        schedule.save()
+        if push_pending: git_push_changes()
+
+def _shard_arg(text):
+    try:
+        return parse_shard(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    arg_parser = argparse.ArgumentParser(description="KTB image crawler")
+    arg_parser.add_argument('--daemon', action='store_true',
+                            help='chạy liên tục, mỗi domain có chu kỳ poll riêng (thay cho cron)')
+    arg_parser.add_argument('--profile-startup', action='store_true',
+                            help='đo thời gian import từng module khi khởi động và so với STARTUP_BUDGET_MS')
+    arg_parser.add_argument('--shard', type=_shard_arg, metavar='i/N',
+                            help='chỉ crawl các domain của shard i (0 <= i < N) và ghi kết quả vào shards/')
+    arg_parser.add_argument('--merge-shards', nargs='+', metavar='PATH',
+                            help='gộp kết quả các shard (file hoặc thư mục), ghi log, báo cáo và push một lần')
+    args = arg_parser.parse_args()
+    if sum(map(bool, (args.daemon, args.shard, args.merge_shards))) > 1:
+        arg_parser.error('--daemon, --shard và --merge-shards không dùng cùng nhau')
+    if args.profile_startup:
+        from utils.startup_profile import report_startup
+        sys.exit(0 if report_startup() else 1)
+    if args.daemon: run_daemon()
+    elif args.merge_shards: merge_shards(args.merge_shards)
+    else: main(shard=args.shard)
\ No newline at end of file
@@ -0,0 +1,71 @@
+# tests/conftest.py
+"""
+Fixture dùng chung. Code crawler đọc/ghi domain/, stop_urls.txt và .cache/ theo đường dẫn cố định trong
+utils/constants.py, nên giống benchmarks/bench_pipeline.py mỗi lần chạy được thực hiện trong một bản sao code
+ở thư mục tạm và trong process con; HTTP đi qua server replay (benchmarks/replay.py), không cần mạng.
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.join(BASE_DIR, 'benchmarks')
+sys.path.insert(0, BASE_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from replay import ReplayServer  # noqa: E402
+
+# Chạy trước đoạn code của test trong process con: cài adapter replay và hàm emit() để trả kết quả dạng JSON
+_PRELUDE = '''
+import json, os, sys
+sys.path.insert(0, os.getcwd())
+spec = json.loads(os.environ['TEST_SPEC'])
+from replay import install_replay_adapter
+from utils.http_client import get_session
+install_replay_adapter(get_session(), spec['base_url'])
+def emit(value): print('\\n' + json.dumps(value))
+'''
+
+class Workdir:
+    """Bản sao code (main.py, utils/, crawlers/) cùng dữ liệu riêng; run() chạy một đoạn code trong đó."""
+    def __init__(self, path, server):
+        self.path, self.server = str(path), server
+        ignore = shutil.ignore_patterns('__pycache__', '*.pyc')
+        os.makedirs(self.path)
+        shutil.copy2(os.path.join(BASE_DIR, 'main.py'), self.path)
+        for package in ('utils', 'crawlers'):
+            shutil.copytree(os.path.join(BASE_DIR, package), os.path.join(self.path, package), ignore=ignore)
+        os.makedirs(os.path.join(self.path, 'domain'))
+        self.write('stop_urls.txt', '{}')
+        self.write('config.json', '[]')
+
+    def write(self, name, text):
+        with open(os.path.join(self.path, name), 'w', encoding='utf-8') as f: f.write(text)
+
+    def read(self, name):
+        with open(os.path.join(self.path, name), 'r', encoding='utf-8') as f: return f.read()
+
+    def run(self, code, **spec):
+        """Chạy code (có sẵn biến spec và hàm emit) và trả về giá trị emit() cuối cùng."""
+        spec['base_url'] = self.server.base_url
+        env = dict(os.environ, PYTHONPATH=BENCH_DIR, TEST_SPEC=json.dumps(spec), GITHUB_ACTIONS='',
+                   TELEGRAM_BOT_TOKEN='', TELEGRAM_CHAT_ID='', STATE_BACKEND='files')
+        completed = subprocess.run([sys.executable, '-c', _PRELUDE + code], cwd=self.path, env=env,
+                                   capture_output=True, text=True, timeout=300)
+        if completed.returncode != 0:
+            raise AssertionError(f"process con lỗi:\n{completed.stdout[-2000:]}\n{completed.stderr[-4000:]}")
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+
+@pytest.fixture
+def replay_server():
+    server = ReplayServer({}).start()
+    yield server
+    server.stop()
+
+@pytest.fixture
+def workdir(tmp_path, replay_server):
+    return Workdir(tmp_path / 'repo', replay_server)
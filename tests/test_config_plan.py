@@ -0,0 +1,35 @@
+# tests/test_config_plan.py
+import json
+
+import pytest
+
+from main import CRAWLER_MAPPING
+from utils.config_plan import SOURCE_TYPES, ConfigError, ConfigPlan, compile_plans
+from utils.constants import CONFIG_FILE
+
+def test_repo_config_compiles():
+    with open(CONFIG_FILE, 'r', encoding='utf-8') as f: configs = json.load(f)
+    assert len(compile_plans(configs)) == len(configs)
+
+def test_source_types_match_crawler_mapping():
+    assert set(SOURCE_TYPES) == set(CRAWLER_MAPPING)
+
+@pytest.mark.parametrize('entry, message', [
+    ({'source_type': 'prevnext'}, "cần 'first_product_selector'"),
+    ({'source_type': 'prevnext', 'first_product_selector': 'a.first'}, "cần 'next_product_selector'"),
+    ({'source_type': 'api-attachment'}, "cần 'attachment_prefix_filter'"),
+    ({'source_type': 'shopify'}, "'source_type' phải là một trong"),
+])
+def test_missing_required_keys_are_config_errors(entry, message):
+    with pytest.raises(ConfigError, match=message):
+        ConfigPlan(dict(entry, url='https://shop.example.com/'))
+
+def test_compile_plans_reports_every_bad_entry():
+    configs = [{'url': 'https://a.example.com/', 'source_type': 'api'},
+               {'url': 'https://b.example.com/'},
+               {'url': 'https://c.example.com/', 'source_type': 'prevnext'}]
+    with pytest.raises(ConfigError) as excinfo:
+        compile_plans(configs)
+    message = str(excinfo.value)
+    assert "config[1] (https://b.example.com/): thiếu 'source_type'" in message
+    assert 'config[2]' in message and 'config[0]' not in message
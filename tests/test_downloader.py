@@ -0,0 +1,91 @@
+# tests/test_downloader.py
+import hashlib
+import os
+
+from utils.constants import DOWNLOAD_RETRIES
+from utils.downloader import PART_SUFFIX, PART_VALIDATOR_SUFFIX, DownloadIndex, claim_finished_files
+
+DOWNLOAD = '''
+import requests
+from utils import downloader, http_client
+downloader.DOWNLOAD_BACKOFF = http_client.HTTP_RETRY_BACKOFF = 0
+try:
+    downloader.download_file(spec['url'], 'image.jpg')
+    emit(None)
+except requests.exceptions.RequestException as e:
+    emit(e.response.status_code if e.response is not None else type(e).__name__)
+'''
+
+def test_download_retries_in_one_layer(workdir, replay_server):
+    url = 'https://img.example.com/busy.jpg'
+    replay_server.recordings[('GET', url)] = (503, {}, b'')
+    assert workdir.run(DOWNLOAD, url=url) == 503
+    # Chỉ vòng retry của download_file, không nhân thêm với HTTP_MAX_RETRIES của http_client
+    assert replay_server.request_count == DOWNLOAD_RETRIES + 1
+
+DOWNLOAD_FOR_DOMAIN = '''
+from utils import downloader, http_client
+from utils.file_handler import download_images_for_domain
+downloader.DOWNLOAD_BACKOFF = http_client.HTTP_RETRY_BACKOFF = 0
+download_images_for_domain(spec['items'], 'shop.example.com', {'url': 'https://shop.example.com/'})
+emit(None)
+'''
+
+IMAGE = b'new image body ' * 64
+
+def _write_part(workdir, relative_path, data, validator):
+    path = os.path.join(workdir.path, relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + PART_SUFFIX, 'wb') as f: f.write(data)
+    with open(path + PART_VALIDATOR_SUFFIX, 'w', encoding='utf-8') as f: f.write(validator)
+
+def _read_bytes(workdir, relative_path):
+    with open(os.path.join(workdir.path, relative_path), 'rb') as f: return f.read()
+
+def test_resume_continues_when_image_unchanged(workdir, replay_server):
+    url = 'https://img.example.com/image.jpg'
+    replay_server.recordings[('GET', url)] = (200, {'ETag': '"v2"'}, IMAGE)
+    _write_part(workdir, 'image.jpg', IMAGE[:100], '"v2"')
+    assert workdir.run(DOWNLOAD, url=url) is None
+    assert _read_bytes(workdir, 'image.jpg') == IMAGE
+    assert not os.path.exists(os.path.join(workdir.path, 'image.jpg' + PART_VALIDATOR_SUFFIX))
+
+def test_resume_restarts_when_image_changed(workdir, replay_server):
+    url = 'https://img.example.com/image.jpg'
+    replay_server.recordings[('GET', url)] = (200, {'ETag': '"v2"'}, IMAGE)
+    # Phần đã tải thuộc phiên bản cũ (v1): không được nối đuôi ảnh mới vào
+    _write_part(workdir, 'image.jpg', b'old image prefix', '"v1"')
+    assert workdir.run(DOWNLOAD, url=url) is None
+    assert _read_bytes(workdir, 'image.jpg') == IMAGE
+
+def test_failed_partial_is_kept_out_of_final_folder(workdir, replay_server):
+    good, bad = 'https://img.example.com/good.jpg', 'https://img.example.com/bad.jpg'
+    replay_server.recordings[('GET', good)] = (200, {}, IMAGE)
+    replay_server.recordings[('GET', bad)] = (503, {}, b'')
+    _write_part(workdir, 'downloaded/shop.example.com.20250101-000000.temp/bad.jpg', b'partial', '"v1"')
+    items = [{'image_url': url, 'product_url': 'https://shop.example.com/product/x/'} for url in (good, bad)]
+    workdir.run(DOWNLOAD_FOR_DOMAIN, items=items)
+
+    downloaded = os.path.join(workdir.path, 'downloaded')
+    folders = sorted(os.listdir(downloaded))
+    assert len(folders) == 2 and folders[0].endswith('.1_images') and folders[1].endswith('.temp')
+    assert os.listdir(os.path.join(downloaded, folders[0])) == ['good.jpg']
+    assert sorted(os.listdir(os.path.join(downloaded, folders[1]))) == ['bad.jpg' + PART_SUFFIX,
+                                                                        'bad.jpg' + PART_VALIDATOR_SUFFIX]
+
+def test_resumed_temp_folder_is_claimed(tmp_path):
+    index = DownloadIndex(path=str(tmp_path / 'index.json'))
+    index.claim(hashlib.sha256(b'old').hexdigest(), 'shop.20250101-000000.1_images/old.jpg')
+    folder = tmp_path / 'shop.20250102-000000.temp'
+    folder.mkdir()
+    (folder / 'same.jpg').write_bytes(b'old')
+    (folder / 'new.jpg').write_bytes(b'new')
+    (folder / ('partial.jpg' + PART_SUFFIX)).write_bytes(b'par')
+
+    duplicates = claim_finished_files(str(folder), folder.name, index)
+    assert duplicates == [('same.jpg', 'shop.20250101-000000.1_images/old.jpg')]
+    assert sorted(os.listdir(folder)) == ['new.jpg', 'partial.jpg' + PART_SUFFIX]
+    # new.jpg đã nằm trong index: cùng nội dung ở thư mục khác sẽ bị nhận ra là trùng
+    assert index.claim(hashlib.sha256(b'new').hexdigest(), 'other/x.jpg') == f"{folder.name}/new.jpg"
+    # Claim lại chính file đó (lần tải tiếp sau nữa) không bị coi là trùng
+    assert claim_finished_files(str(folder), folder.name, index) == []
@@ -0,0 +1,54 @@
+# tests/test_html_extract.py
+"""Backend 'stream' phải cho cùng kết quả với 'html.parser' trên các trang đã lưu trong benchmarks/fixtures/html."""
+import json
+import os
+
+import pytest
+
+from utils.config_plan import ConfigError, ConfigPlan
+from utils.constants import BASE_DIR, CONFIG_FILE
+from utils.html_extract import extract_page
+
+FIXTURE_DIR = os.path.join(BASE_DIR, 'benchmarks', 'fixtures', 'html')
+LINK_SELECTOR_KEYS = ('first_product_selector', 'next_product_selector', 'product_title_selector')
+
+def _load(name):
+    with open(os.path.join(FIXTURE_DIR, name), 'rb') as f: return f.read()
+
+def _extract(markup, url_data, backend, link_selector=None, want_image=True):
+    image_url, link_tag = extract_page(markup, url_data, link_selector=link_selector, want_image=want_image,
+                                       backend=backend)
+    return image_url, (link_tag.get('href') if link_tag else None)
+
+with open(os.path.join(FIXTURE_DIR, 'cases.json'), 'r', encoding='utf-8') as f: CASES = json.load(f)
+PAGES = sorted(name for name in os.listdir(FIXTURE_DIR) if name.endswith('.html'))
+with open(CONFIG_FILE, 'r', encoding='utf-8') as f: CONFIGS = json.load(f)
+
+@pytest.mark.parametrize('case', CASES, ids=[case['fixture'] for case in CASES])
+def test_stream_matches_html_parser_on_cases(case):
+    plan = ConfigPlan(case['url_data'])
+    args = (case.get('link_selector'), case.get('want_image', True))
+    expected = _extract(_load(case['fixture']), plan, 'html.parser', *args)
+    assert _extract(_load(case['fixture']), plan, 'stream', *args) == expected
+
+@pytest.mark.parametrize('page', PAGES)
+def test_stream_matches_html_parser_for_config_selectors(page):
+    """Mọi selector ảnh/link đang dùng trong config.json, trên mọi trang đã lưu."""
+    markup = _load(page)
+    for raw in CONFIGS:
+        plan = ConfigPlan(raw)
+        assert _extract(markup, plan, 'stream') == _extract(markup, plan, 'html.parser'), plan.domain
+        for key in LINK_SELECTOR_KEYS:
+            if not raw.get(key): continue
+            expected = _extract(markup, plan, 'html.parser', raw[key], want_image=False)
+            assert _extract(markup, plan, 'stream', raw[key], want_image=False) == expected, (plan.domain, key)
+
+def test_lxml_backend_without_lxml_raises(monkeypatch):
+    from bs4.builder import builder_registry
+    monkeypatch.setattr(builder_registry, 'lookup', lambda *features: None)
+    with pytest.raises(ImportError, match='lxml'):
+        extract_page(_load(PAGES[0]), {'url': 'https://example.com/'}, backend='lxml')
+
+def test_unknown_html_backend_is_a_config_error():
+    with pytest.raises(ConfigError, match='html_backend'):
+        ConfigPlan({'url': 'https://example.com/', 'html_backend': 'html5lib'})
@@ -0,0 +1,99 @@
+# tests/test_prevnext_crawler.py
+"""Crawler prevnext dạng pipeline phải cho cùng kết quả với vòng lặp tuần tự (kiểm tra ảnh ngay sau mỗi trang)."""
+import re
+
+import pytest
+
+from replay import DROP_CONNECTION, build_synthetic_site
+
+COMPARE = '''
+import requests
+from urllib.parse import urljoin
+from crawlers.prevnext_crawler import crawl
+from utils.config_plan import as_plan
+from utils.constants import MAX_PREVNEXT_URLS
+from utils.html_extract import extract_page
+from utils.http_client import http_get
+from utils.url_processor import process_and_finalize_url
+
+def sequential_crawl(url_data, stop_urls_list):
+    all_image_urls, new_product_urls_found = [], []
+    plan = as_plan(url_data)
+    r = http_get(plan.url, timeout=30)
+    r.raise_for_status()
+    _, first_product_tag = extract_page(r.text, plan, link_selector=plan['first_product_selector'], want_image=False)
+    current_product_url = urljoin(plan.url, first_product_tag.get('href'))
+    count = 0
+    while count < MAX_PREVNEXT_URLS:
+        if current_product_url in stop_urls_list: break
+        try:
+            r = http_get(current_product_url, timeout=30)
+            r.raise_for_status()
+            best_url, next_product_tag = extract_page(r.text, plan, link_selector=plan['next_product_selector'])
+            if best_url:
+                final_img_url = process_and_finalize_url(best_url, plan)
+                if final_img_url and final_img_url not in all_image_urls:
+                    all_image_urls.append(final_img_url)
+                    new_product_urls_found.append(current_product_url)
+            if not next_product_tag or not next_product_tag.get('href'): break
+            current_product_url = urljoin(current_product_url, next_product_tag.get('href'))
+            count += 1
+        except requests.exceptions.RequestException:
+            break
+    return all_image_urls, new_product_urls_found
+
+stop_urls = set(spec['stop_urls'])
+pipelined = crawl(spec['config'], stop_urls)
+emit({'pipelined': pipelined, 'sequential': sequential_crawl(spec['config'], stop_urls)})
+'''
+
+_OG_IMAGE_RE = re.compile(rb'(<meta property="og:image" content=")([^"]*)')
+
+@pytest.fixture
+def site(replay_server):
+    recordings, configs = build_synthetic_site(products=30, source_types=('prevnext',))
+    replay_server.recordings.update(recordings)
+    product_urls = [url for method, url in recordings if method == 'GET' and '/product/' in url]
+    return replay_server.recordings, configs[0], product_urls
+
+def _image_url(recordings, product_url):
+    return _OG_IMAGE_RE.search(recordings[('GET', product_url)][2]).group(2).decode()
+
+def _compare(workdir, config, stop_urls=()):
+    result = workdir.run(COMPARE, config=config, stop_urls=list(stop_urls))
+    assert result['pipelined'] == result['sequential']
+    return result['pipelined']
+
+def test_full_chain(workdir, site):
+    recordings, config, product_urls = site
+    images, products = _compare(workdir, config)
+    assert products == product_urls
+    assert len(images) == len(product_urls)
+
+def test_stop_url(workdir, site):
+    recordings, config, product_urls = site
+    images, products = _compare(workdir, config, stop_urls=[product_urls[12]])
+    assert products == product_urls[:12]
+
+@pytest.mark.parametrize('failure', ['http_404', 'connection_dropped'])
+def test_network_error_breaks_chain(workdir, site, failure):
+    recordings, config, product_urls = site
+    if failure == 'http_404': del recordings[('GET', product_urls[17])]
+    else: recordings[('GET', product_urls[17])] = (DROP_CONNECTION, {}, b'')
+    images, products = _compare(workdir, config)
+    assert products == product_urls[:17]
+
+def test_failed_fallback_and_duplicate_images(workdir, site):
+    recordings, config, product_urls = site
+    # Sản phẩm 3: ảnh fallback (bỏ prefix) không tồn tại, giữ nguyên URL gốc
+    original = _image_url(recordings, product_urls[3])
+    recordings.pop(('GET', original.replace('abcd1234-', '')))
+    # Sản phẩm 6 dùng cùng ảnh với sản phẩm 5: chỉ sản phẩm đầu tiên được tính
+    status, headers, body = recordings[('GET', product_urls[6])]
+    duplicate = _image_url(recordings, product_urls[5]).encode()
+    recordings[('GET', product_urls[6])] = (status, headers, _OG_IMAGE_RE.sub(lambda m: m.group(1) + duplicate, body, 1))
+
+    images, products = _compare(workdir, config)
+    assert products == [url for i, url in enumerate(product_urls) if i != 6]
+    assert images[3] == original and 'abcd1234-' not in images[4]
+    assert len(set(images)) == len(images)
@@ -0,0 +1,80 @@
+# tests/test_seen_index.py
+import re
+
+from replay import build_synthetic_site
+
+from utils.constants import SEEN_STOP_AFTER
+
+CRAWL_PREVNEXT = '''
+from crawlers.prevnext_crawler import crawl
+from utils.seen_index import save_seen_indexes
+images, products = crawl(spec['config'], set(spec.get('stop_urls', [])))
+save_seen_indexes()
+emit({'images': images, 'products': products})
+'''
+
+def _prevnext_site(server, products=20):
+    recordings, configs = build_synthetic_site(products=products, source_types=('prevnext',))
+    server.recordings.update(recordings)
+    product_urls = [url for method, url in recordings if method == 'GET' and '/product/' in url]
+    return configs[0], product_urls
+
+def test_completed_crawl_stops_at_seen_products(workdir, replay_server):
+    config, product_urls = _prevnext_site(replay_server)
+    first = workdir.run(CRAWL_PREVNEXT, config=config)
+    assert first['products'] == product_urls
+
+    # Không còn stop URL nào: lần sau dừng nhờ index sau SEEN_STOP_AFTER sản phẩm đã thấy
+    second = workdir.run(CRAWL_PREVNEXT, config=config)
+    assert second == {'images': [], 'products': []}
+
+def test_failed_chain_is_recrawled_next_run(workdir, replay_server):
+    config, product_urls = _prevnext_site(replay_server)
+    broken_url = product_urls[8]
+    broken = replay_server.recordings.pop(('GET', broken_url))
+
+    first = workdir.run(CRAWL_PREVNEXT, config=config)
+    assert first['products'] == product_urls[:8]
+
+    # Chuỗi bị đứt: các sản phẩm đã crawl không được ghi vào index, lần sau được crawl lại từ đầu
+    replay_server.recordings[('GET', broken_url)] = broken
+    second = workdir.run(CRAWL_PREVNEXT, config=config)
+    assert second['products'] == product_urls
+    assert second['images'][:8] == first['images']
+
+CRAWL_PRODUCT_LIST = '''
+from crawlers.product_list_crawler import crawl
+from utils.seen_index import save_seen_indexes
+images, products = crawl(spec['config'], set())
+save_seen_indexes()
+emit({'images': images, 'products': products})
+'''
+
+_IMAGE_TAG_RE = re.compile(rb'<meta property="og:image"[^>]*>|<img\b[^>]*>')
+
+def test_products_without_image_are_indexed(workdir, replay_server):
+    config, product_urls = _prevnext_site(replay_server)
+    imageless = product_urls[1::3]
+    for url in imageless:
+        status, headers, body = replay_server.recordings[('GET', url)]
+        replay_server.recordings[('GET', url)] = (status, headers, _IMAGE_TAG_RE.sub(b'', body))
+    first = workdir.run(CRAWL_PREVNEXT, config=config)
+    assert first['products'] == [url for url in product_urls if url not in imageless]
+
+    # Sản phẩm không có ảnh cũng đã được ghi vào index: lần sau vẫn dừng sau SEEN_STOP_AFTER sản phẩm đã thấy
+    replay_server.request_count = 0
+    assert workdir.run(CRAWL_PREVNEXT, config=config) == {'images': [], 'products': []}
+    assert replay_server.request_count == SEEN_STOP_AFTER
+
+def test_http_error_products_are_indexed(workdir, replay_server):
+    recordings, configs = build_synthetic_site(products=20, source_types=('product-list',))
+    replay_server.recordings.update(recordings)
+    product_urls = [url for method, url in recordings if method == 'GET' and '/product/' in url]
+    del replay_server.recordings[('GET', product_urls[4])]
+    first = workdir.run(CRAWL_PRODUCT_LIST, config=configs[0])
+    assert product_urls[4] not in first['products'] and len(first['products']) == len(product_urls) - 1
+
+    # Trang 404 là kết quả hợp lệ: không bị tải lại; lần sau chỉ còn request tải danh sách sản phẩm
+    replay_server.request_count = 0
+    assert workdir.run(CRAWL_PRODUCT_LIST, config=configs[0]) == {'images': [], 'products': []}
+    assert replay_server.request_count == 1
@@ -0,0 +1,41 @@
+# tests/test_shard.py
+import json
+
+from replay import build_synthetic_site
+
+SHARD = '''
+import main
+main.main(shard=tuple(spec['shard']))
+'''
+
+MERGE = '''
+import json
+import main
+from utils.constants import PROFILE_FILE
+sent = []
+main.git_push_changes = lambda: None
+main.PROFILE_IN_REPORT = True
+main.send_telegram_message = sent.append
+main.merge_shards(['shards'])
+with open(PROFILE_FILE, 'r', encoding='utf-8') as f: profile = json.load(f)
+emit({'profile': profile, 'sent': sent})
+'''
+
+def test_merge_combines_shard_profiles(workdir, replay_server):
+    recordings, configs = build_synthetic_site(products=12)
+    replay_server.recordings.update(recordings)
+    workdir.write('config.json', json.dumps(configs))
+    for index in range(2):
+        workdir.run(SHARD + 'emit(None)', shard=[index, 2])
+    shard_profiles = [json.loads(workdir.read(f'shards/shard-{index}-of-2.json'))['profile'] for index in range(2)]
+
+    result = workdir.run(MERGE)
+    profile = result['profile']
+    for key in ('requests', 'bytes'):
+        assert profile['totals'][key] == sum(p['totals'][key] for p in shard_profiles) > 0
+    assert set(profile['hosts']) == set(shard_profiles[0]['hosts']) | set(shard_profiles[1]['hosts'])
+    crawl = [p['phases']['crawl'] for p in shard_profiles]
+    assert profile['phases']['crawl']['count'] == sum(c['count'] for c in crawl)
+    assert profile['duration'] == max(p['duration'] for p in shard_profiles)
+    # Tóm tắt profile (PROFILE_IN_REPORT) có trong báo cáo Telegram của bước merge
+    assert len(result['sent']) == 1 and f"Requests: {profile['totals']['requests']} (" in result['sent'][0]
@@ -0,0 +1,21 @@
+# tests/test_startup.py
+import subprocess
+import sys
+
+from utils.constants import BASE_DIR, STARTUP_BUDGET_MS
+from utils.startup_profile import measure_startup
+
+# Module chỉ được import khi dùng tới (xem CRAWLER_MAPPING trong main.py và các import muộn trong utils/)
+LAZY_MODULES = ('bs4', 'soupsieve', 'dateutil', 'pytz', 'dotenv', 'asyncio', 'crawlers.api_crawler',
+                'crawlers.prevnext_crawler', 'crawlers.product_list_crawler', 'crawlers.api_attachment_crawler',
+                'crawlers.sitemap_crawler')
+
+def test_heavy_modules_are_not_imported_at_startup():
+    code = f"import sys, main; print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    completed = subprocess.run([sys.executable, '-c', code], cwd=BASE_DIR, capture_output=True, text=True, check=True)
+    assert completed.stdout.strip() == ''
+
+def test_cold_start_within_budget():
+    wall_ms, rows = measure_startup('main', repeat=5)
+    assert any(name.strip() == 'main' for _, _, name in rows)
+    assert wall_ms <= STARTUP_BUDGET_MS, f"cold start {wall_ms:.0f} ms > {STARTUP_BUDGET_MS} ms"
@@ -0,0 +1,27 @@
+# tests/test_url_processor.py
+import threading
+
+import pytest
+
+from utils import url_processor
+
+@pytest.fixture
+def probes(monkeypatch):
+    """Thay check_url_exists: chỉ các URL có 'ok' là hợp lệ; ghi lại URL đã được HEAD."""
+    probed, lock = [], threading.Lock()
+    def fake_check(url):
+        with lock: probed.append(url)
+        return 'ok' in url
+    monkeypatch.setattr(url_processor, 'check_url_exists', fake_check)
+    return probed
+
+def test_first_valid_index_keeps_priority_order(probes):
+    urls = ['a', 'b-ok', 'c', 'd-ok', 'e']
+    assert url_processor._first_valid_index(urls, batch_size=5) == 1
+    assert url_processor._first_valid_index(['a', 'b', 'c'], batch_size=5) is None
+
+def test_first_valid_index_probes_in_batches(probes):
+    urls = ['a', 'b', 'c-ok', 'd', 'e', 'f', 'g']
+    assert url_processor._first_valid_index(urls, batch_size=2) == 2
+    # Đợt 1 (a, b) không có URL hợp lệ, đợt 2 (c, d) có: đợt 3 trở đi không được gửi
+    assert sorted(probes) == ['a', 'b', 'c-ok', 'd']
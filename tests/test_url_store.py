@@ -0,0 +1,67 @@
+# tests/test_url_store.py
+"""DomainUrlFile.prepend phải ghi ra file giống hệt save_urls cũ (đọc lại toàn bộ file và ghi lại mỗi lần)."""
+import os
+import random
+
+import pytest
+
+from utils.url_store import DomainUrlFile
+
+def legacy_prepend(path, new_urls, max_urls):
+    """save_urls trước khi có DomainUrlFile (bỏ phần in log)."""
+    try:
+        with open(path, "r", encoding="utf-8") as f: existing_urls = [line.strip() for line in f]
+    except FileNotFoundError: existing_urls = []
+    unique_new_urls = [u for u in new_urls if u not in existing_urls]
+    all_urls = (unique_new_urls + existing_urls)[:max_urls]
+    with open(path, "w", encoding="utf-8") as f: f.write("\n".join(all_urls))
+    return unique_new_urls, all_urls
+
+POOL = [f"https://cdn.example.com/img/{i}.jpg" for i in range(40)]
+
+def _random_urls(rng, n):
+    return [rng.choice(POOL) for _ in range(n)]
+
+def _random_raw(rng):
+    """Nội dung file do người/công cụ khác ghi: khoảng trắng thừa, dòng trống, CRLF, xuống dòng cuối file."""
+    lines = [rng.choice(['', ' ', f"  {u} ", u, u + '\t']) if rng.random() < 0.2 else u
+             for u in _random_urls(rng, rng.randint(0, 12))]
+    raw = rng.choice(['\n', '\r\n']).join(lines)
+    if lines and rng.random() < 0.3: raw += '\n'
+    return raw
+
+def _read(path):
+    try:
+        with open(path, 'rb') as f: return f.read()
+    except FileNotFoundError: return None
+
+def _write_external(path, raw, step):
+    with open(path, 'w', encoding='utf-8', newline='') as f: f.write(raw)
+    # mtime khác hẳn lần ghi trước, giống một lần sửa file thật
+    os.utime(path, ns=(step * 10**9, step * 10**9))
+
+@pytest.mark.parametrize('seed', range(50))
+def test_prepend_matches_legacy_save_urls(tmp_path, seed):
+    rng = random.Random(seed)
+    legacy_path, new_path = str(tmp_path / 'legacy.txt'), str(tmp_path / 'new' / 'domain.txt')
+    store = DomainUrlFile(new_path)
+    if rng.random() < 0.7:
+        raw = _random_raw(rng)
+        _write_external(legacy_path, raw, 1)
+        os.makedirs(os.path.dirname(new_path))
+        _write_external(new_path, raw, 1)
+
+    for step in range(2, 14):
+        action = rng.random()
+        if action < 0.2:
+            # File bị sửa từ bên ngoài giữa hai lần chạy: DomainUrlFile phải đọc lại (mtime/size đổi)
+            raw = _random_raw(rng)
+            _write_external(legacy_path, raw, step)
+            os.makedirs(os.path.dirname(new_path), exist_ok=True)
+            _write_external(new_path, raw, step)
+        elif action < 0.25 and os.path.exists(legacy_path):
+            os.remove(legacy_path)
+            os.remove(new_path)
+        new_urls, max_urls = _random_urls(rng, rng.randint(0, 6)), rng.randint(1, 15)
+        assert store.prepend(new_urls, max_urls) == legacy_prepend(legacy_path, new_urls, max_urls), step
+        assert _read(new_path) == _read(legacy_path), step
@@ -0,0 +1,183 @@
+# utils/config_plan.py
+import importlib.util
+import re
+from types import MappingProxyType
+from urllib.parse import urlparse
+
+class ConfigError(ValueError):
+    """config.json có entry không hợp lệ (báo lỗi ngay lúc khởi động thay vì giữa lần crawl)."""
+
+# source_type hợp lệ (khớp CRAWLER_MAPPING trong main.py) -> các key bắt buộc của crawler tương ứng
+SOURCE_TYPES = {
+    'api': (),
+    'prevnext': ('first_product_selector', 'next_product_selector'),
+    'product-list': (),
+    'api-attachment': ('attachment_prefix_filter',),
+    'sitemap': (),
+}
+
+def _keyword_pattern(keywords):
+    # Một regex alternation thay cho any(keyword in text ...): cùng kết quả, quét chuỗi một lần
+    return re.compile('|'.join(re.escape(keyword) for keyword in keywords)) if keywords else None
+
+class ConfigPlan:
+    """
+    Một entry của config.json đã được kiểm tra và biên dịch sẵn: regex, selector, tuple suffix, pattern keyword.
+    Bất biến; plan.get(key) / plan[key] vẫn đọc được giá trị gốc cho các key không có thuộc tính riêng.
+    """
+    __slots__ = ('raw', 'url', 'domain', 'source_type', 'selector', 'image_selector', 'link_selectors',
+                 'replacements', 'suffixes', 'replacement_map', 'always_replace', 'first_img_rule',
+                 'fallback_domain', 'fallback_prefix_length', 'check_recency', 'download_images',
+                 'filename_replace', 'filename_replacement', 'filename_cut', 'filename_from_title',
+                 'keywords', 'keyword_re', 'exclusions', 'exclusion_re', 'html_backend')
+
+    def __init__(self, raw):
+        # Import muộn: html_extract -> url_processor -> config_plan
+        from .html_extract import compile_selector
+        errors = []
+        def fail(message): errors.append(message)
+        def option(key, kind, default=None):
+            value = raw.get(key, default)
+            if value is not None and not isinstance(value, kind):
+                fail(f"'{key}' phải là {kind.__name__ if isinstance(kind, type) else '/'.join(k.__name__ for k in kind)}")
+                return default
+            return value
+        def string_list(key):
+            value = option(key, list, [])
+            if any(not isinstance(item, str) for item in value): fail(f"'{key}' phải là list các chuỗi")
+            return tuple(item for item in value if isinstance(item, str))
+        def regex(key, pattern):
+            try:
+                return re.compile(pattern)
+            except re.error as e:
+                fail(f"'{key}' không phải regex hợp lệ: {e}")
+        set_ = lambda name, value: object.__setattr__(self, name, value)
+
+        if not isinstance(raw, dict):
+            raise ConfigError("entry phải là object JSON")
+        set_('raw', MappingProxyType(dict(raw)))
+        url = option('url', str, '')
+        if not url.startswith('http'): fail("'url' phải là URL http(s)")
+        set_('url', url)
+        set_('domain', urlparse(url).netloc)
+        source_type = option('source_type', str)
+        if source_type is not None and source_type not in SOURCE_TYPES:
+            fail(f"'source_type' phải là một trong {', '.join(SOURCE_TYPES)}")
+        for key in SOURCE_TYPES.get(source_type, ()):
+            if not raw.get(key): fail(f"source_type '{source_type}' cần '{key}'")
+        set_('source_type', source_type)
+
+        # Selector: biên dịch sẵn cho bộ quét stream; selector nằm ngoài phạm vi bộ quét mới được kiểm tra
+        # cú pháp bằng soupsieve (dùng bởi bs4), để lúc khởi động không phải import soupsieve khi không cần
+        link_selectors = {}
+        for key in ('selector', 'first_product_selector', 'next_product_selector', 'product_title_selector'):
+            text = option(key, str)
+            if not text: continue
+            compiled = compile_selector(text)
+            if compiled is None:
+                import soupsieve
+                try:
+                    soupsieve.compile(text)
+                except soupsieve.SelectorSyntaxError as e:
+                    fail(f"'{key}' không phải CSS selector hợp lệ: {str(e).splitlines()[0]}")
+                    continue
+            link_selectors[text] = compiled
+        set_('selector', raw.get('selector') or None)
+        set_('image_selector', link_selectors.get(self.selector))
+        set_('link_selectors', MappingProxyType(link_selectors))
+
+        # replacements: list suffix (ưu tiên ảnh theo đuôi) hoặc dict original -> list replacement
+        replacements = option('replacements', (list, dict), {})
+        suffixes, replacement_map = (), None
+        if isinstance(replacements, list):
+            suffixes = string_list('replacements')
+        elif replacements:
+            if any(not isinstance(v, list) or any(not isinstance(r, str) for r in v) for v in replacements.values()):
+                fail("'replacements' dạng dict phải ánh xạ chuỗi -> list các chuỗi")
+            # dict thường: apply_replacements kiểm tra isinstance(replacements, dict)
+            replacement_map = {k: tuple(v) for k, v in replacements.items() if isinstance(v, list)}
+        set_('replacements', replacement_map if replacement_map is not None else suffixes)
+        set_('suffixes', suffixes)
+        set_('replacement_map', replacement_map)
+        set_('always_replace', bool(raw.get('always_replace', False)))
+        set_('first_img_rule', not self.selector and not replacements)
+
+        fallback_rules = option('fallback_rules', dict, {}) or {}
+        fallback_domain, prefix_length = None, 0
+        if fallback_rules.get('type') == 'cut_filename_prefix':
+            fallback_domain, prefix_length = fallback_rules.get('domain'), fallback_rules.get('prefix_length', 0)
+            if not isinstance(prefix_length, int) or prefix_length < 1:
+                fail("'fallback_rules.prefix_length' phải là số nguyên dương")
+        set_('fallback_domain', fallback_domain)
+        set_('fallback_prefix_length', prefix_length)
+
+        set_('check_recency', bool(raw.get('check_recency', False)))
+        set_('download_images', bool(raw.get('download_images', False)))
+        replace_config = raw.get('download_filename_regex_replace')
+        filename_replace, filename_replacement = None, ''
+        if isinstance(replace_config, dict) and replace_config.get('pattern'):
+            filename_replace = regex('download_filename_regex_replace', replace_config['pattern'])
+            filename_replacement = replace_config.get('replacement', '')
+        set_('filename_replace', filename_replace)
+        set_('filename_replacement', filename_replacement)
+        cut_pattern = option('download_filename_regex_cut', str)
+        set_('filename_cut', regex('download_filename_regex_cut', cut_pattern) if cut_pattern else None)
+        set_('filename_from_title', bool(raw.get('download_filename_from_title', False)))
+
+        keywords, exclusions = string_list('product_url_keywords'), string_list('product_url_exclusions')
+        set_('keywords', keywords)
+        set_('keyword_re', _keyword_pattern(keywords))
+        set_('exclusions', exclusions)
+        set_('exclusion_re', _keyword_pattern(exclusions))
+        option('sitemap_crawl_limit', int)
+        html_backend = option('html_backend', str)
+        if html_backend is not None:
+            from .html_extract import BACKENDS
+            if html_backend not in BACKENDS:
+                fail(f"'html_backend' phải là một trong {', '.join(BACKENDS)}")
+            elif html_backend == 'lxml' and importlib.util.find_spec('lxml') is None:
+                fail("'html_backend' là 'lxml' nhưng chưa cài lxml (pip install lxml)")
+        set_('html_backend', html_backend)
+
+        if errors:
+            raise ConfigError('; '.join(errors))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ConfigPlan là bất biến")
+
+    def __getitem__(self, key):
+        return self.raw[key]
+
+    def __contains__(self, key):
+        return key in self.raw
+
+    def get(self, key, default=None):
+        return self.raw.get(key, default)
+
+    def compiled_selector(self, text):
+        """Selector đã biên dịch cho bộ quét stream (None nếu selector không được hỗ trợ)."""
+        if text in self.link_selectors: return self.link_selectors[text]
+        from .html_extract import compile_selector
+        return compile_selector(text)
+
+    def __repr__(self):
+        return f"ConfigPlan({self.domain!r}, {self.source_type!r})"
+
+def as_plan(url_data):
+    """Nhận plan hoặc dict config (vd: từ benchmark); dict được biên dịch tại chỗ."""
+    return url_data if isinstance(url_data, ConfigPlan) else ConfigPlan(url_data)
+
+def compile_plans(configs):
+    """Biên dịch toàn bộ config; gom lỗi của mọi entry vào một ConfigError."""
+    if not isinstance(configs, list): raise ConfigError("config.json phải là một list")
+    plans, errors = [], []
+    for index, raw in enumerate(configs):
+        try:
+            # Entry không có source_type sẽ không có crawler nào chạy: coi là lỗi cấu hình
+            if isinstance(raw, dict) and 'source_type' not in raw: raise ConfigError("thiếu 'source_type'")
+            plans.append(ConfigPlan(raw))
+        except ConfigError as e:
+            label = raw.get('url') if isinstance(raw, dict) else None
+            errors.append(f"config[{index}] ({label}): {e}")
+    if errors: raise ConfigError("\n".join(errors))
+    return plans
@@ -11,16 +11,121 @@ CONFIG_FILE = os.path.join(BASE_DIR, 'config.json')
 STOP_URLS_FILE = os.path.join(BASE_DIR, 'stop_urls.txt')
 LOG_FILE = os.path.join(BASE_DIR, 'imagecrawler.log')
 ENV_FILE = os.path.join(BASE_DIR, '.env')
+# Thư mục cache giữa các lần chạy (không commit lên git)
+CACHE_DIR = os.path.join(BASE_DIR, '.cache')
+# Profile hiệu năng (JSON) của lần chạy gần nhất, nằm trong .cache/ để không bị commit cùng dữ liệu crawl;
+# PROFILE_IN_REPORT=1 để thêm tóm tắt vào báo cáo Telegram
+PROFILE_FILE = os.path.join(CACHE_DIR, 'imagecrawler.profile.json')
+PROFILE_IN_REPORT = os.getenv('PROFILE_IN_REPORT', '0') == '1'
+URL_METADATA_DB = os.path.join(CACHE_DIR, 'url_metadata.sqlite3')
+VALIDATORS_FILE = os.path.join(CACHE_DIR, 'validators.json')
+REPLACEMENT_STATS_FILE = os.path.join(CACHE_DIR, 'replacement_stats.json')
+# Backend lưu trạng thái: 'files' (stop_urls.txt + domain/*.txt như cũ) hoặc 'sqlite' (xem utils/state_store.py)
+STATE_BACKEND = os.getenv('STATE_BACKEND', 'files')
+STATE_DB = os.path.join(CACHE_DIR, 'state.sqlite3')
+CURSORS_FILE = os.path.join(CACHE_DIR, 'cursors.json')
+DOWNLOAD_INDEX_FILE = os.path.join(CACHE_DIR, 'download_hashes.json')
+SEEN_INDEX_DIR = os.path.join(CACHE_DIR, 'seen')
+POLL_SCHEDULE_FILE = os.path.join(CACHE_DIR, 'poll_schedule.json')
+# Kết quả của từng runner khi chạy main.py --shard i/N, được gộp bởi main.py --merge-shards (không commit lên git)
+SHARD_DIR = os.path.join(BASE_DIR, 'shards')
 
 # --- Constants ---
 MAX_URLS = 500
 MAX_PREVNEXT_URLS = 100
 MAX_API_PAGES = 2
 DEFAULT_API_URL_PATTERN = "https://{domain}/wp-json/wp/v2/product?per_page=100&page={page}&orderby=date&order=desc"
+# Chế độ cursor của api_crawler (key 'api_cursor' trong config): chỉ lấy các field cần thiết và sản phẩm mới hơn cursor
+API_CURSOR_FIELDS = "id,date,link,yoast_head_json.og_image,content"
 HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"}
 REPO_URL_PATTERN = "https://raw.githubusercontent.com/ktbteam/productcrawler/main/domain/{domain}.txt"
 STOP_URLS_COUNT = 10
+# Index sản phẩm đã xử lý (utils/seen_index.py): crawler bỏ qua sản phẩm đã thấy và dừng sau SEEN_STOP_AFTER
+# sản phẩm đã thấy liên tiếp, kể cả khi không còn stop URL nào trên site; mỗi domain giữ tối đa SEEN_INDEX_MAX URL
+SEEN_STOP_AFTER = 5
+SEEN_INDEX_MAX = 200000
+# Sitemap được parse theo từng chunk; khi quét ngược chỉ giữ lại tối đa SITEMAP_TAIL_BUFFER <url> cuối file
+SITEMAP_CHUNK_SIZE = 64 * 1024
+SITEMAP_TAIL_BUFFER = 5000
+# Backend trích xuất HTML trang sản phẩm: 'html.parser', 'lxml' hoặc 'stream' (xem utils/html_extract.py).
+# Có thể ghi đè cho từng domain bằng key 'html_backend' trong config.json. 'stream' chỉ nên bật cho domain
+# đã có trang lưu sẵn trong benchmarks/fixtures/html và được kiểm tra bởi tests/test_html_extract.py
+HTML_EXTRACT_BACKEND = os.getenv('HTML_EXTRACT_BACKEND', 'html.parser')
+
+# Số worker kiểm tra ảnh (fallback/replacement) chạy song song với việc đi theo chuỗi trang trong prevnext_crawler
+PREVNEXT_PIPELINE_WORKERS = 4
+# Số request wp:attachment chạy song song trong api_attachment_crawler
+ATTACHMENT_FETCH_CONCURRENCY = 8
+# Số trang sản phẩm được tải/parse song song trong product_list_crawler (cửa sổ trượt, giữ nguyên thứ tự)
+PRODUCT_LIST_FETCH_CONCURRENCY = 8
+
+# --- Download ảnh ---
+# Số ảnh tải song song, số ảnh tối đa trên mỗi host, số lần thử lại và thời gian chờ cơ sở (giây, tăng gấp đôi)
+DOWNLOAD_CONCURRENCY = 6
+DOWNLOAD_PER_HOST = 4
+DOWNLOAD_RETRIES = 3
+DOWNLOAD_BACKOFF = 1.0
+# Chunk ghi file: khoảng 1/16 kích thước ảnh, giới hạn trong khoảng này (byte)
+DOWNLOAD_MIN_CHUNK = 64 * 1024
+DOWNLOAD_MAX_CHUNK = 1024 * 1024
+
+# --- Scheduler ---
+# Số domain được crawl đồng thời và số job tối đa trên cùng một host (có thể ghi đè bằng biến môi trường)
+MAX_CRAWL_WORKERS = int(os.getenv('CRAWL_WORKERS', 8))
+MAX_CRAWL_WORKERS_PER_HOST = int(os.getenv('CRAWL_WORKERS_PER_HOST', 1))
+
+# --- Daemon (main.py --daemon) ---
+# Chu kỳ poll của mỗi domain (giây): ban đầu bằng cron 30 phút, giảm một nửa khi có ảnh mới,
+# nhân DAEMON_BACKOFF_FACTOR khi không có, trong khoảng [DAEMON_MIN_INTERVAL, DAEMON_MAX_INTERVAL]
+DAEMON_INITIAL_INTERVAL = 30 * 60
+DAEMON_MIN_INTERVAL = 5 * 60
+DAEMON_MAX_INTERVAL = 6 * 3600
+DAEMON_BACKOFF_FACTOR = 2
+# Khoảng cách tối thiểu (giây) giữa hai lần git push của daemon; chỉ push khi có ảnh mới
+DAEMON_PUSH_INTERVAL = 30 * 60
+
+# --- Startup (main.py --profile-startup) ---
+# Ngân sách cold start (ms) của `import main` trong process mới, gồm cả khởi động interpreter;
+# crawler và thư viện nặng (bs4, dateutil, pytz, dotenv...) chỉ được import khi dùng tới
+STARTUP_BUDGET_MS = 400
+
+# --- HTTP client ---
+# Session dùng chung: số host giữ pool, số kết nối keep-alive mỗi host và số request đồng thời tối đa mỗi host
+HTTP_POOL_CONNECTIONS = 64
+HTTP_POOL_MAXSIZE = 8
+MAX_CONNECTIONS_PER_HOST = 8
+# Limiter thích ứng theo host (utils/rate_limiter.py): số request đồng thời ban đầu; tốc độ (req/s) khi host
+# bắt đầu quá tải, sàn/trần tốc độ và burst của token bucket; độ trễ bị coi là quá tải khi vượt
+# HOST_LATENCY_FACTOR lần mức nền và lớn hơn HOST_SLOW_LATENCY giây
+HOST_INITIAL_CONCURRENCY = 4
+HOST_INITIAL_RATE = 20.0
+HOST_MIN_RATE = 0.5
+HOST_MAX_RATE = 100.0
+HOST_RATE_BURST = 10
+HOST_LATENCY_FACTOR = 4.0
+HOST_SLOW_LATENCY = 2.0
+# Thử lại khi gặp 429/503 hoặc lỗi kết nối: số lần, thời gian chờ cơ sở (giây, tăng gấp đôi), Retry-After tối đa
+HTTP_MAX_RETRIES = 2
+HTTP_RETRY_BACKOFF = 1.0
+HTTP_MAX_RETRY_WAIT = 60
+
+# --- Recency check ---
+# Số HEAD request chạy song song khi lọc ảnh theo độ mới, và giới hạn trên mỗi host ảnh
+RECENCY_CHECK_CONCURRENCY = 16
+RECENCY_CHECK_PER_HOST = 8
+
+# --- Replacement probing ---
+# Số HEAD kiểm tra ứng viên replacement chạy song song (dùng chung cho mọi domain)
+REPLACEMENT_PROBE_WORKERS = 16
+# Một replacement được coi là "thường thắng" của domain khi đã thắng ít nhất MIN_WINS lần và chiếm ít nhất
+# MIN_SHARE số lần xử lý; khi đó nó được kiểm tra một mình trước khi thử song song toàn bộ danh sách
+REPLACEMENT_STATS_MIN_WINS = 5
+REPLACEMENT_STATS_MIN_SHARE = 0.8
 
 # --- Cache ---
 # Cache được quản lý trong module xử lý URL để tránh biến toàn cục
-URL_METADATA_CACHE = {}
\ No newline at end of file
+URL_METADATA_CACHE = {}
+# Cache metadata lưu trên đĩa: TTL (giây) cho kết quả 200 và kết quả lỗi/404, số entry tối đa (LRU)
+URL_METADATA_POSITIVE_TTL = 12 * 3600
+URL_METADATA_NEGATIVE_TTL = 3600
+URL_METADATA_MAX_ENTRIES = 50000
\ No newline at end of file
@@ -0,0 +1,54 @@
+# utils/cursor_store.py
+import json
+import os
+import threading
+from .constants import CURSORS_FILE
+from .state_store import get_state_store
+
+class CursorStore:
+    """
+    Cursor theo domain (vd: ngày/id sản phẩm mới nhất của WP API) để lần chạy sau chỉ lấy phần mới.
+    Giống ValidatorStore: cursor mới chỉ được ghi xuống file khi gọi save() ở cuối lần chạy.
+    """
+    def __init__(self, path=CURSORS_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pending = {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f: self._cursors = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError): self._cursors = {}
+
+    def get_cursor(self, domain):
+        with self._lock:
+            if domain in self._pending: return self._pending[domain]
+            return self._cursors.get(domain)
+
+    def set_cursor(self, domain, cursor):
+        with self._lock:
+            self._pending[domain] = cursor
+
+    def save(self):
+        with self._lock:
+            if not self._pending: return
+            self._cursors.update(self._pending)
+            self._pending = {}
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f: json.dump(self._cursors, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_cursor_store():
+    """Dùng state DB nếu STATE_BACKEND=sqlite (cursor được ghi cùng transaction cuối lần chạy), ngược lại file JSON."""
+    global _store
+    state_store = get_state_store()
+    if state_store: return state_store
+    with _store_lock:
+        if _store is None: _store = CursorStore()
+        return _store
+
+def save_cursors():
+    # Với state DB, cursor đã được ghi trong commit() của save_stop_urls
+    if _store: _store.save()
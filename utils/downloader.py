@@ -0,0 +1,193 @@
+# utils/downloader.py
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+
+from .constants import (DOWNLOAD_INDEX_FILE, DOWNLOAD_CONCURRENCY, DOWNLOAD_PER_HOST, DOWNLOAD_RETRIES,
+                        DOWNLOAD_BACKOFF, DOWNLOAD_MIN_CHUNK, DOWNLOAD_MAX_CHUNK)
+from .http_client import http_get
+from .profiler import count
+
+PART_SUFFIX = '.part'
+# ETag/Last-Modified của response đầu tiên, lưu cạnh file .part để gửi kèm If-Range khi tải tiếp
+PART_VALIDATOR_SUFFIX = '.part.validator'
+
+def is_partial_file(name):
+    """File tải dở (.part) hoặc validator đi kèm của nó."""
+    return name.endswith((PART_SUFFIX, PART_VALIDATOR_SUFFIX))
+
+class DownloadIndex:
+    """
+    Index sha256 nội dung -> đường dẫn file ảnh đã lưu (tương đối với thư mục downloaded), dùng để không lưu
+    cùng một ảnh hai lần giữa các lần chạy dù tên file khác nhau.
+    """
+    def __init__(self, path=DOWNLOAD_INDEX_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._dirty = False
+        try:
+            with open(path, 'r', encoding='utf-8') as f: self._hashes = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError): self._hashes = {}
+
+    def claim(self, digest, relative_path):
+        """Ghi nhận digest cho file mới; trả về đường dẫn đã có nếu nội dung này từng được lưu."""
+        with self._lock:
+            existing = self._hashes.get(digest)
+            if existing and existing != relative_path: return existing
+            self._hashes[digest] = relative_path
+            self._dirty = True
+            return None
+
+    def rename_folder(self, old_folder, new_folder):
+        prefix = f"{old_folder}/"
+        with self._lock:
+            for digest, relative_path in self._hashes.items():
+                if relative_path.startswith(prefix):
+                    self._hashes[digest] = f"{new_folder}/{relative_path[len(prefix):]}"
+                    self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self._dirty: return
+            self._dirty = False
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f: json.dump(self._hashes, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+_index = None
+_index_lock = threading.Lock()
+_host_slots = {}
+_host_slots_lock = threading.Lock()
+
+def get_download_index():
+    global _index
+    with _index_lock:
+        if _index is None: _index = DownloadIndex()
+        return _index
+
+def _host_slot(url):
+    host = urlparse(url).netloc
+    with _host_slots_lock:
+        if host not in _host_slots: _host_slots[host] = threading.BoundedSemaphore(DOWNLOAD_PER_HOST)
+        return _host_slots[host]
+
+def _chunk_size(response):
+    """Chunk lớn dần theo kích thước file: khoảng 1/16 file, trong khoảng [DOWNLOAD_MIN_CHUNK, DOWNLOAD_MAX_CHUNK]."""
+    try:
+        length = int(response.headers.get('Content-Length') or 0)
+    except ValueError:
+        length = 0
+    return max(DOWNLOAD_MIN_CHUNK, min(DOWNLOAD_MAX_CHUNK, length // 16))
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(DOWNLOAD_MAX_CHUNK), b''): digest.update(block)
+    return digest
+
+def _validator_path(part_path):
+    return part_path[:-len(PART_SUFFIX)] + PART_VALIDATOR_SUFFIX
+
+def _read_validator(part_path):
+    try:
+        with open(_validator_path(part_path), 'r', encoding='utf-8') as f: return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def _write_validator(part_path, response):
+    # If-Range chỉ nhận ETag mạnh (không có W/) hoặc Last-Modified
+    etag = response.headers.get('ETag')
+    validator = etag if etag and not etag.startswith('W/') else response.headers.get('Last-Modified')
+    validator_path = _validator_path(part_path)
+    if validator:
+        with open(validator_path, 'w', encoding='utf-8') as f: f.write(validator)
+    elif os.path.exists(validator_path):
+        os.remove(validator_path)
+
+def _fetch_to_part(url, part_path):
+    """
+    Tải url vào part_path, tiếp tục từ phần đã có bằng HTTP Range + If-Range: nếu ảnh trên server đã đổi,
+    server trả 200 và file được tải lại từ đầu. Trả về sha256 của toàn bộ nội dung.
+    """
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    validator = _read_validator(part_path) if offset else None
+    # Không có validator thì không biết phần đã tải có còn khớp không: tải lại từ đầu
+    if not validator: offset = 0
+    headers = {'Range': f'bytes={offset}-', 'If-Range': validator} if offset else {}
+    # Chỉ thử lại ở vòng retry của download_file, không chồng thêm retry của http_client
+    with http_get(url, timeout=60, stream=True, headers=headers, retries=0) as r:
+        if offset and r.status_code == 416:
+            # Phần đã tải không còn khớp với file trên server: tải lại từ đầu
+            os.remove(part_path)
+            return _fetch_to_part(url, part_path)
+        r.raise_for_status()
+        if offset and r.status_code == 206:
+            digest, mode = _hash_file(part_path), 'ab'
+        else:
+            digest, mode = hashlib.sha256(), 'wb'
+            _write_validator(part_path, r)
+        with open(part_path, mode) as f:
+            for chunk in r.iter_content(chunk_size=_chunk_size(r)):
+                f.write(chunk)
+                digest.update(chunk)
+                count('download.bytes', len(chunk))
+    return digest.hexdigest()
+
+def download_file(url, filepath):
+    """
+    Tải một file với retry + backoff lũy thừa. Dữ liệu được ghi vào <filepath>.part và chỉ đổi tên thành
+    filepath khi tải xong, nên lần chạy sau có thể tải tiếp phần còn thiếu. Trả về sha256 của nội dung.
+    """
+    part_path = filepath + PART_SUFFIX
+    for attempt in range(DOWNLOAD_RETRIES + 1):
+        try:
+            with _host_slot(url):
+                digest = _fetch_to_part(url, part_path)
+            os.replace(part_path, filepath)
+            if os.path.exists(_validator_path(part_path)): os.remove(_validator_path(part_path))
+            return digest
+        except requests.exceptions.RequestException as e:
+            status = e.response.status_code if e.response is not None else None
+            # Lỗi 4xx (trừ 429) sẽ không tự hết khi thử lại
+            if attempt == DOWNLOAD_RETRIES or (status and 400 <= status < 500 and status != 429): raise
+            delay = DOWNLOAD_BACKOFF * (2 ** attempt)
+            print(f"    -> Lỗi tải {url}: {e}. Thử lại sau {delay:.0f}s...")
+            time.sleep(delay)
+
+def claim_finished_files(folder_path, folder_name, index=None):
+    """
+    Hash và claim các file đã tải xong trong folder_path (thư mục .temp của lần chạy bị gián đoạn, khi đó index
+    chưa kịp được lưu). File trùng nội dung với ảnh đã lưu trước đó bị xóa; trả về list (filename, existing).
+    """
+    index = index or get_download_index()
+    duplicates = []
+    for filename in sorted(os.listdir(folder_path)):
+        if is_partial_file(filename): continue
+        filepath = os.path.join(folder_path, filename)
+        existing = index.claim(_hash_file(filepath).hexdigest(), f"{folder_name}/{filename}")
+        if existing:
+            os.remove(filepath)
+            duplicates.append((filename, existing))
+    return duplicates
+
+def download_all(jobs, on_done, concurrency=DOWNLOAD_CONCURRENCY):
+    """
+    Chạy download_file song song cho list (url, filepath). on_done(url, filepath, digest, error) được gọi
+    lần lượt theo thứ tự jobs khi từng file hoàn tất.
+    """
+    if not jobs: return
+    def run(job):
+        try:
+            return download_file(*job), None
+        except Exception as e:
+            return None, e
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(jobs)))) as executor:
+        for (url, filepath), (digest, error) in zip(jobs, executor.map(run, jobs)):
+            on_done(url, filepath, digest, error)
@@ -0,0 +1,15 @@
+# utils/env.py
+import threading
+from .constants import ENV_FILE
+
+_loaded = False
+_loaded_lock = threading.Lock()
+
+def load_env():
+    """Đọc file .env một lần, ở lần đầu cần tới biến môi trường (Telegram, GitHub), thay vì lúc import module."""
+    global _loaded
+    with _loaded_lock:
+        if _loaded: return
+        from dotenv import load_dotenv
+        load_dotenv(dotenv_path=ENV_FILE)
+        _loaded = True
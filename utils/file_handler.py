@@ -2,36 +2,52 @@
 import json
 import os
 import re
-import requests
 from datetime import datetime
 from urllib.parse import urlparse
-from .constants import CONFIG_FILE, STOP_URLS_FILE, DOMAIN_DIR, MAX_URLS, HEADERS
+from .constants import CONFIG_FILE, STOP_URLS_FILE, DOMAIN_DIR, MAX_URLS
+from .url_store import get_domain_url_file
+from .state_store import get_state_store
+from .downloader import claim_finished_files, is_partial_file, download_all, get_download_index
+from .profiler import count
+from .config_plan import ConfigError, compile_plans, as_plan
+
+_UNSAFE_FILENAME_RE = re.compile(r'[\\/*?:"<>|]')
+_DASHES_RE = re.compile(r'--+')
 
 # --- Các hàm load/save cũ (giữ nguyên) ---
 def load_config():
+    """Đọc config.json và biên dịch từng entry thành ConfigPlan (utils/config_plan.py). Ném ConfigError nếu có entry lỗi."""
     try:
-        with open(CONFIG_FILE, 'r', encoding='utf-8') as f: return json.load(f)
+        with open(CONFIG_FILE, 'r', encoding='utf-8') as f: configs = json.load(f)
     except FileNotFoundError:
         print(f"LỖI: Không tìm thấy file config tại: {CONFIG_FILE}")
         return []
+    except json.JSONDecodeError as e:
+        raise ConfigError(f"{CONFIG_FILE} không phải JSON hợp lệ: {e}")
+    return compile_plans(configs)
 
 def load_stop_urls():
+    state_store = get_state_store()
+    if state_store: return state_store.load_stop_urls()
     try:
         with open(STOP_URLS_FILE, 'r', encoding='utf-8') as f: return json.load(f)
     except (FileNotFoundError, json.JSONDecodeError): return {}
 
 def save_stop_urls(stop_urls):
+    # Với backend sqlite, đây là bước ghi cuối lần chạy: một transaction rồi export các file có thay đổi
+    state_store = get_state_store()
+    if state_store:
+        state_store.commit(stop_urls)
+        return
     with open(STOP_URLS_FILE, 'w', encoding='utf-8') as f: json.dump(stop_urls, f, indent=2)
 
 def save_urls(domain, new_urls, discarded_count=0):
-    if not os.path.exists(DOMAIN_DIR): os.makedirs(DOMAIN_DIR)
-    filename = os.path.join(DOMAIN_DIR, f"{domain}.txt")
-    try:
-        with open(filename, "r", encoding="utf-8") as f: existing_urls = [line.strip() for line in f]
-    except FileNotFoundError: existing_urls = []
-    unique_new_urls = [u for u in new_urls if u not in existing_urls]
-    all_urls = (unique_new_urls + existing_urls)[:MAX_URLS]
-    with open(filename, "w", encoding="utf-8") as f: f.write("\n".join(all_urls))
+    state_store = get_state_store()
+    if state_store:
+        unique_new_urls, all_urls = state_store.prepend_urls(domain, new_urls, MAX_URLS)
+    else:
+        filename = os.path.join(DOMAIN_DIR, f"{domain}.txt")
+        unique_new_urls, all_urls = get_domain_url_file(filename).prepend(new_urls, MAX_URLS)
     console_report = f"[{domain}] Added {len(unique_new_urls)} new URLs."
     if discarded_count > 0: console_report += f" Discarded {discarded_count} old URLs."
     console_report += f" Total: {len(all_urls)}"
@@ -42,92 +58,138 @@ def save_urls(domain, new_urls, discarded_count=0):
 def sanitize_filename(name):
     """Làm sạch một chuỗi để nó trở thành một tên file hợp lệ."""
     if not name: return ""
-    name = re.sub(r'[\\/*?:"<>|]', "", name)
+    name = _UNSAFE_FILENAME_RE.sub("", name)
     name = name.replace(" ", "-").lower()
     return name[:150]
 
+def _build_filename(item, url_data):
+    """Tên file theo 4 cấp ưu tiên: Regex Replace > Regex Cut > Tiêu đề > Tên gốc."""
+    image_url, product_url = item.get('image_url'), item.get('product_url')
+    plan = as_plan(url_data)
+
+    filename_base = ""
+    slug = urlparse(product_url).path.split('/')[-1]
+
+    # 1. Ưu tiên 1: Tìm và thay thế bằng Regex (Mới)
+    if plan.filename_replace:
+        filename_base = plan.filename_replace.sub(plan.filename_replacement, slug)
+        # Xử lý các trường hợp tạo ra dấu -- hoặc bắt đầu/kết thúc bằng -
+        filename_base = _DASHES_RE.sub('-', filename_base).strip('-')
+
+    # 2. Ưu tiên 2: Cắt chuỗi bằng Regex (Cũ)
+    if not filename_base and plan.filename_cut:
+        filename_base = plan.filename_cut.sub("", slug)
+
+    # 3. Ưu tiên 3: Dùng tiêu đề sản phẩm
+    if not filename_base and plan.filename_from_title and item.get('product_title'):
+        filename_base = item.get('product_title')
+
+    # 4. Ưu tiên 4: Dùng tên file gốc
+    original_image_name = image_url.split('/')[-1].split('?')[0]
+    if not filename_base:
+        filename_base = os.path.splitext(original_image_name)[0]
+
+    safe_filename_base = sanitize_filename(filename_base)
+    file_extension = os.path.splitext(original_image_name)[1] or '.webp'
+    return f"{safe_filename_base}{file_extension}"
+
+def _find_temp_folder(base_download_dir, domain):
+    """Thư mục .temp của lần chạy trước bị gián đoạn (nếu có) để tải tiếp thay vì bắt đầu lại."""
+    prefix = f"{domain}."
+    leftovers = sorted(name for name in os.listdir(base_download_dir)
+                       if name.startswith(prefix) and name.endswith('.temp')
+                       and os.path.isdir(os.path.join(base_download_dir, name)))
+    return leftovers[-1] if leftovers else None
+
 def download_images_for_domain(final_results, domain, url_data):
     """
     Tải ảnh với logic tạo tên file 4 cấp độ ưu tiên: Regex Replace > Regex Cut > Tiêu đề > Tên gốc.
+    Ảnh được tải song song (utils/downloader.py); thư mục .temp bị bỏ dở từ lần trước được tải tiếp, và ảnh
+    trùng nội dung với ảnh đã lưu ở các lần trước sẽ bị bỏ qua.
     """
     if not final_results: return
-    
-    # Lấy các tùy chọn download từ config
-    replace_config = url_data.get("download_filename_regex_replace")
-    cut_pattern = url_data.get("download_filename_regex_cut")
-    use_title_as_filename = url_data.get("download_filename_from_title", False)
+    plan = as_plan(url_data)
 
     base_download_dir = os.path.join(os.path.dirname(DOMAIN_DIR), 'downloaded')
     os.makedirs(base_download_dir, exist_ok=True)
     
     timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
-    temp_folder_name = f"{domain}.{timestamp}.temp"
+    temp_folder_name = _find_temp_folder(base_download_dir, domain)
+    if temp_folder_name:
+        print(f"[{domain}] Tiếp tục tải vào thư mục tạm của lần chạy trước: {temp_folder_name}")
+    else:
+        temp_folder_name = f"{domain}.{timestamp}.temp"
     temp_download_path = os.path.join(base_download_dir, temp_folder_name)
     os.makedirs(temp_download_path, exist_ok=True)
+    download_index = get_download_index()
+    # Ảnh đã tải xong ở lần chạy bị gián đoạn chưa được ghi vào index: hash và claim lại trước khi tải tiếp
+    resumed_duplicates = set()
+    for filename, existing in claim_finished_files(temp_download_path, temp_folder_name, download_index):
+        resumed_duplicates.add(filename)
+        count('download.dedupe_skipped')
+        print(f"    -> Bỏ qua (Trùng nội dung với {existing}): {filename}")
     
     print(f"[{domain}] Bắt đầu tải {len(final_results)} ảnh vào thư mục tạm: {temp_folder_name}")
-    download_count = 0
-    
+
+    # Tạo tên file theo thứ tự kết quả; trùng tên thì giữ ảnh đầu tiên như trước
+    jobs, planned = [], set()
     for item in final_results:
         image_url = item.get('image_url')
         product_url = item.get('product_url')
         if not image_url or not product_url: continue
-        
         try:
-            # --- LOGIC TẠO TÊN FILE 4 CẤP ƯU TIÊN ---
-            filename_base = ""
-            slug = urlparse(product_url).path.split('/')[-1]
-            
-            # 1. Ưu tiên 1: Tìm và thay thế bằng Regex (Mới)
-            if replace_config and isinstance(replace_config, dict):
-                pattern = replace_config.get('pattern')
-                replacement = replace_config.get('replacement', '')
-                if pattern:
-                    filename_base = re.sub(pattern, replacement, slug)
-                    # Xử lý các trường hợp tạo ra dấu -- hoặc bắt đầu/kết thúc bằng -
-                    filename_base = re.sub(r'--+', '-', filename_base).strip('-')
-
-            # 2. Ưu tiên 2: Cắt chuỗi bằng Regex (Cũ)
-            if not filename_base and cut_pattern:
-                filename_base = re.sub(cut_pattern, "", slug)
-
-            # 3. Ưu tiên 3: Dùng tiêu đề sản phẩm
-            if not filename_base and use_title_as_filename and item.get('product_title'):
-                filename_base = item.get('product_title')
-
-            # 4. Ưu tiên 4: Dùng tên file gốc
-            original_image_name = image_url.split('/')[-1].split('?')[0]
-            if not filename_base:
-                filename_base = os.path.splitext(original_image_name)[0]
-            
-            safe_filename_base = sanitize_filename(filename_base)
-            file_extension = os.path.splitext(original_image_name)[1] or '.webp'
-            filename = f"{safe_filename_base}{file_extension}"
-            # --- KẾT THÚC LOGIC TẠO TÊN FILE ---
-
-            filepath = os.path.join(temp_download_path, filename)
-            if os.path.exists(filepath):
-                print(f"    -> Bỏ qua (Tên file đã tồn tại): {filename}")
-                continue
-
-            r = requests.get(image_url, headers=HEADERS, timeout=60, stream=True)
-            r.raise_for_status()
-            
-            with open(filepath, 'wb') as f:
-                for chunk in r.iter_content(chunk_size=8192): f.write(chunk)
-            
-            download_count += 1
-            print(f"    ({download_count}/{len(final_results)}) Tải thành công: {filename}")
-
+            filename = _build_filename(item, plan)
         except Exception as e:
             print(f"    -> Lỗi trong quá trình download/xử lý file: {e}")
+            continue
+        if filename in resumed_duplicates: continue
+        filepath = os.path.join(temp_download_path, filename)
+        if filename in planned or os.path.exists(filepath):
+            print(f"    -> Bỏ qua (Tên file đã tồn tại): {filename}")
+            continue
+        planned.add(filename)
+        jobs.append((image_url, filepath))
 
-    # Đổi tên thư mục tạm thành tên cuối cùng
-    if download_count > 0:
-        final_folder_name = f"{domain}.{timestamp}.{download_count}_images"
+    download_count = 0
+
+    def on_done(image_url, filepath, digest, error):
+        nonlocal download_count
+        filename = os.path.basename(filepath)
+        if error is not None:
+            print(f"    -> Lỗi trong quá trình download/xử lý file: {error}")
+            return
+        existing = download_index.claim(digest, f"{temp_folder_name}/{filename}")
+        if existing:
+            os.remove(filepath)
+            count('download.dedupe_skipped')
+            print(f"    -> Bỏ qua (Trùng nội dung với {existing}): {filename}")
+            return
+        download_count += 1
+        print(f"    ({download_count}/{len(final_results)}) Tải thành công: {filename}")
+
+    download_all(jobs, on_done)
+
+    # Đổi tên thư mục tạm thành tên cuối cùng (tính cả ảnh đã tải xong ở lần chạy bị gián đoạn)
+    names = os.listdir(temp_download_path)
+    partial_names = [name for name in names if is_partial_file(name)]
+    saved_count = len(names) - len(partial_names)
+    if saved_count > 0:
+        final_folder_name = f"{domain}.{timestamp}.{saved_count}_images"
         final_download_path = os.path.join(base_download_dir, final_folder_name)
         os.rename(temp_download_path, final_download_path)
-        print(f"✅ Hoàn tất! Đã lưu {download_count} ảnh vào thư mục: {final_folder_name}")
-    else:
+        download_index.rename_folder(temp_folder_name, final_folder_name)
+        print(f"✅ Hoàn tất! Đã lưu {saved_count} ảnh vào thư mục: {final_folder_name}")
+        if partial_names:
+            # Ảnh tải lỗi giữa chừng không được nằm trong thư mục ảnh: chuyển sang thư mục .temp để lần sau tải tiếp
+            leftover_folder_name = f"{domain}.{timestamp}.temp"
+            leftover_path = os.path.join(base_download_dir, leftover_folder_name)
+            os.makedirs(leftover_path, exist_ok=True)
+            for name in partial_names:
+                os.replace(os.path.join(final_download_path, name), os.path.join(leftover_path, name))
+            print(f"[{domain}] Giữ lại các file tải dở trong: {leftover_folder_name}")
+    elif not os.listdir(temp_download_path):
         os.rmdir(temp_download_path)
-        print(f"[{domain}] Không có ảnh mới nào được tải về.")
\ No newline at end of file
+        print(f"[{domain}] Không có ảnh mới nào được tải về.")
+    else:
+        print(f"[{domain}] Không có ảnh mới nào được tải về. Giữ lại phần tải dở trong: {temp_folder_name}")
+    download_index.save()
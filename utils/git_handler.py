@@ -3,12 +3,11 @@ import os
 import subprocess
 import requests
 from datetime import datetime
-from dotenv import load_dotenv
-from .constants import BASE_DIR, ENV_FILE
-
-load_dotenv(dotenv_path=ENV_FILE)
+from .constants import BASE_DIR
+from .env import load_env
 
 def git_push_changes():
+    load_env()
     if os.getenv('GITHUB_ACTIONS') == 'true':
         print("Đang chạy trên GitHub Actions, bỏ qua git push.")
         return
@@ -38,6 +37,7 @@ def git_push_changes():
         print(f"❌ Đã xảy ra lỗi không xác định khi push: {e}")
 
 def trigger_workflow_dispatch():
+    load_env()
     pat = os.getenv('KTBHUB_PAT')
     if not pat: return
     print("🚀 Kích hoạt workflow 'new_image_available' trên repo ktbteam/ktb-image...")
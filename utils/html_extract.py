@@ -0,0 +1,265 @@
+# utils/html_extract.py
+import re
+from html.parser import HTMLParser
+
+from .constants import HTML_EXTRACT_BACKEND
+from .url_processor import choose_best_image_url, find_best_image_url
+from .config_plan import as_plan
+from .profiler import phase
+
+# Backend trích xuất HTML:
+#   'html.parser' - BeautifulSoup + html.parser (mặc định, dựng toàn bộ cây)
+#   'lxml'        - BeautifulSoup + lxml (nhanh hơn, cần cài lxml: pip install lxml; nếu thiếu sẽ ném ImportError)
+#   'stream'      - tokenizer của thư viện chuẩn, chỉ theo dõi og:image, ảnh khớp selector và link cần tìm,
+#                   dừng ngay khi đã đủ dữ liệu. Selector không hỗ trợ sẽ tự chuyển về html.parser.
+# bs4 chỉ được import khi cần (parse bằng BeautifulSoup hoặc giải mã bytes) để giảm thời gian khởi động.
+BACKENDS = ('html.parser', 'lxml', 'stream')
+
+# Giống danh sách thẻ rỗng của bs4 (HTMLParserTreeBuilder) để cây thẻ mở/đóng khớp với BeautifulSoup
+VOID_ELEMENTS = frozenset([
+    'area', 'base', 'basefont', 'bgsound', 'br', 'col', 'command', 'embed', 'frame', 'hr', 'image', 'img',
+    'input', 'isindex', 'keygen', 'link', 'menuitem', 'meta', 'nextid', 'param', 'source', 'spacer', 'track', 'wbr',
+])
+
+_COMPOUND_RE = re.compile(r'([a-zA-Z][\w-]*|\*)?((?:[.#][\w-]+)*)')
+_HAS_RE = re.compile(r'(.*?):has\(\s*([^()]*?)\s*\)')
+
+class _Compound:
+    """Một selector đơn giản dạng tag.class#id, có thể kèm :has(<selector đơn giản>)."""
+    __slots__ = ('tag', 'classes', 'ids', 'has')
+
+    def __init__(self, tag, classes, ids, has=None):
+        self.tag, self.classes, self.ids, self.has = tag, classes, ids, has
+
+    def matches(self, node):
+        if self.tag and self.tag != node.tag: return False
+        if self.ids and any(node.attrs.get('id') != i for i in self.ids): return False
+        return not self.classes or self.classes <= node.classes
+
+def _parse_compound(text):
+    has = None
+    has_match = _HAS_RE.fullmatch(text)
+    if has_match:
+        text, inner = has_match.groups()
+        has = _parse_compound(inner)
+        if has is None or has.has: return None
+    match = _COMPOUND_RE.fullmatch(text)
+    if not match or not (match.group(1) or match.group(2)): return None
+    tag = match.group(1).lower() if match.group(1) and match.group(1) != '*' else None
+    parts = re.findall(r'[.#][\w-]+', match.group(2))
+    classes = frozenset(p[1:] for p in parts if p[0] == '.')
+    ids = tuple(p[1:] for p in parts if p[0] == '#')
+    return _Compound(tag, classes, ids, has)
+
+def compile_selector(selector):
+    """
+    Biên dịch selector CSS dạng 'A B C' (chỉ descendant combinator) thành list _Compound.
+    :has(...) chỉ được hỗ trợ ở phần tử cuối. Trả về None nếu selector nằm ngoài phạm vi hỗ trợ.
+    """
+    if not selector or any(ch in selector for ch in ',>+~[]"\''): return None
+    compounds = []
+    for part in selector.split():
+        compound = _parse_compound(part)
+        if compound is None: return None
+        compounds.append(compound)
+    if any(c.has for c in compounds[:-1]): return None
+    return compounds
+
+class _TagAttrs(dict):
+    """Thuộc tính của một thẻ; luôn truthy giống Tag của bs4 kể cả khi thẻ không có thuộc tính."""
+    __slots__ = ()
+
+    def __bool__(self):
+        return True
+
+class _Node:
+    __slots__ = ('tag', 'attrs', 'classes', 'index', 'has_hit')
+
+    def __init__(self, tag, attrs, index):
+        self.tag, self.attrs, self.index, self.has_hit = tag, attrs, index, False
+        self.classes = frozenset(attrs.get('class', '').split())
+
+def _matches_chain(compounds, node, ancestors):
+    """Kiểm tra node có khớp chuỗi descendant selector không (so khớp tham lam từ phải sang trái)."""
+    if not compounds[-1].matches(node): return False
+    pos = len(ancestors) - 1
+    for compound in reversed(compounds[:-1]):
+        while pos >= 0 and not compound.matches(ancestors[pos]): pos -= 1
+        if pos < 0: return False
+        pos -= 1
+    return True
+
+class _StopScan(Exception):
+    pass
+
+class _PageScanner(HTMLParser):
+    """Duyệt HTML một lượt, dựng lại ngăn xếp thẻ giống bs4 và dừng khi kết quả đã xác định."""
+
+    def __init__(self, plan, image_selector, link_selector, want_image):
+        super().__init__(convert_charrefs=True)
+        self.image_selector, self.link_selector, self.want_image = image_selector, link_selector, want_image
+        self.top_suffix = plan.suffixes[0] if plan.suffixes else None
+        self.first_img_rule = plan.first_img_rule
+        self.stack, self.has_candidates = [], []
+        self.image_tags, self.og_image_tag, self.og_seen = [], None, False
+        self.top_suffix_hit = self.first_img_seen = False
+        self.link_matches, self.node_count = [], 0
+
+    # --- Các điều kiện dừng sớm ---
+    def _image_done(self):
+        if not self.want_image: return True
+        if self.top_suffix: return self.top_suffix_hit
+        if not self.og_seen: return False
+        if self.og_image_tag.get('content'): return True
+        return self.first_img_seen if self.first_img_rule else True
+
+    def _link_done(self):
+        if not self.link_selector: return True
+        if not self.link_matches: return False
+        first_index = min(index for index, _ in self.link_matches)
+        return not any(c.index < first_index for c in self.has_candidates)
+
+    def link_tag(self):
+        return min(self.link_matches, key=lambda m: m[0])[1] if self.link_matches else None
+
+    # --- Xử lý thẻ ---
+    def handle_starttag(self, tag, attrs):
+        self._start(tag, attrs)
+        self._check_done()
+
+    def handle_startendtag(self, tag, attrs):
+        self._start(tag, attrs)
+        if tag not in VOID_ELEMENTS: self._end(tag)
+        self._check_done()
+
+    def handle_endtag(self, tag):
+        self._end(tag)
+        self._check_done()
+
+    def _start(self, tag, attrs):
+        attr_dict = _TagAttrs((key, '' if value is None else value) for key, value in attrs)
+        node = _Node(tag, attr_dict, self.node_count)
+        self.node_count += 1
+
+        if tag == 'meta' and not self.og_seen and attr_dict.get('property') == 'og:image':
+            self.og_seen, self.og_image_tag = True, attr_dict
+
+        if self.want_image:
+            is_image = _matches_chain(self.image_selector, node, self.stack) if self.image_selector else tag == 'img'
+            if is_image:
+                self.image_tags.append(attr_dict)
+                img_url = attr_dict.get('src') or attr_dict.get('data-src') or attr_dict.get('data-lazy-src')
+                if img_url:
+                    self.first_img_seen = True
+                    if self.top_suffix and img_url.endswith(self.top_suffix): self.top_suffix_hit = True
+
+        if self.link_selector:
+            target = self.link_selector[-1]
+            for candidate in self.has_candidates:
+                if not candidate.has_hit and target.has.matches(node): candidate.has_hit = True
+            if _matches_chain(self.link_selector, node, self.stack):
+                if target.has: self.has_candidates.append(node)
+                else: self.link_matches.append((node.index, attr_dict))
+
+        if tag not in VOID_ELEMENTS: self.stack.append(node)
+
+    def _end(self, tag):
+        if not any(node.tag == tag for node in self.stack): return
+        while self.stack:
+            node = self.stack.pop()
+            self._close_node(node)
+            if node.tag == tag: break
+
+    def _close_node(self, node):
+        if node in self.has_candidates:
+            self.has_candidates.remove(node)
+            if node.has_hit: self.link_matches.append((node.index, node.attrs))
+
+    def _check_done(self):
+        if self._image_done() and self._link_done(): raise _StopScan()
+
+    def finish(self):
+        try:
+            self.close()
+        except _StopScan:
+            return
+        # Các thẻ chưa đóng ở cuối tài liệu được coi như đóng (giống bs4)
+        while self.stack: self._close_node(self.stack.pop())
+
+class _FirstImageScanner(HTMLParser):
+    """Dừng ngay ở thẻ <img> đầu tiên (cùng tokenizer với html.parser của bs4, nên comment/script được bỏ qua giống hệt)."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.img_tag = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'img':
+            self.img_tag = _TagAttrs((key, '' if value is None else value) for key, value in attrs)
+            raise _StopScan()
+
+_IMG_RE = re.compile(r'<img', re.IGNORECASE)
+
+def first_image_tag(markup):
+    """
+    Trả về thuộc tính của thẻ <img> đầu tiên trong đoạn HTML (hỗ trợ .get(attr)), hoặc None.
+    Tương đương BeautifulSoup(markup, 'html.parser').find('img') nhưng không dựng cây.
+    """
+    if not markup or not _IMG_RE.search(markup): return None
+    scanner = _FirstImageScanner()
+    with phase('html_parse'):
+        try:
+            scanner.feed(markup)
+            scanner.close()
+        except _StopScan:
+            pass
+    return scanner.img_tag
+
+def _to_text(markup):
+    if isinstance(markup, bytes):
+        from bs4.dammit import UnicodeDammit
+        return UnicodeDammit(markup, is_html=True).unicode_markup or ''
+    return markup
+
+def _scan_page(markup, plan, link_selector, want_image):
+    image_selector = None
+    if want_image and plan.selector:
+        image_selector = plan.image_selector
+        if image_selector is None or image_selector[-1].has: return None
+    compiled_link = None
+    if link_selector:
+        compiled_link = plan.compiled_selector(link_selector)
+        if compiled_link is None: return None
+
+    scanner = _PageScanner(plan, image_selector, compiled_link, want_image)
+    try:
+        scanner.feed(_to_text(markup))
+        scanner.finish()
+    except _StopScan:
+        pass
+    image_url = choose_best_image_url(scanner.image_tags, lambda: scanner.og_image_tag, plan) if want_image else None
+    return image_url, scanner.link_tag()
+
+def _bs4_features(backend):
+    if backend != 'lxml': return 'html.parser'
+    from bs4.builder import builder_registry
+    if not builder_registry.lookup('lxml'):
+        raise ImportError("HTML backend 'lxml' cần thư viện lxml (pip install lxml)")
+    return 'lxml'
+
+def extract_page(markup, url_data, link_selector=None, want_image=True, backend=None):
+    """
+    Trích xuất ảnh tốt nhất (theo find_best_image_url) và thẻ đầu tiên khớp link_selector từ một trang HTML.
+    Trả về (image_url, link_tag); link_tag hỗ trợ .get(attr) hoặc là None nếu không tìm thấy.
+    """
+    plan = as_plan(url_data)
+    backend = backend or plan.html_backend or HTML_EXTRACT_BACKEND
+    with phase('html_parse'):
+        if backend == 'stream':
+            result = _scan_page(markup, plan, link_selector, want_image)
+            if result is not None: return result
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(markup, _bs4_features(backend))
+        image_url = find_best_image_url(soup, plan) if want_image else None
+        link_tag = soup.select_one(link_selector) if link_selector else None
+    return image_url, link_tag
@@ -0,0 +1,91 @@
+# utils/http_client.py
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+from .constants import (HEADERS, HTTP_POOL_CONNECTIONS, HTTP_POOL_MAXSIZE,
+                        HTTP_MAX_RETRIES, HTTP_RETRY_BACKOFF, HTTP_MAX_RETRY_WAIT)
+from .profiler import record_request, count
+from .rate_limiter import THROTTLE_STATUSES, get_host_limiter, parse_retry_after
+from .single_flight import SingleFlight
+
+# Một Session dùng chung cho toàn bộ crawler để tái sử dụng kết nối TCP/TLS (keep-alive)
+_session = None
+_session_lock = threading.Lock()
+_http_flight = SingleFlight('http')
+
+def get_session():
+    """Trả về Session dùng chung (tạo lần đầu khi cần)."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers.update(HEADERS)
+            _session = session
+        return _session
+
+def _send_once(limiter, method, url, kwargs):
+    """Một lần gửi qua limiter của host; trả về (response, retry_after)."""
+    waited = limiter.acquire()
+    if waited > 0.01: count('rate_limit.waited_seconds', round(waited, 3))
+    # Thời gian được đo sau khi có slot, không tính thời gian chờ giới hạn theo host
+    start, response, retry_after = time.perf_counter(), None, None
+    try:
+        response = get_session().request(method, url, **kwargs)
+        if response.status_code in THROTTLE_STATUSES:
+            count('rate_limit.throttled')
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        return response, retry_after
+    finally:
+        latency = time.perf_counter() - start
+        record_request(method, url, response, latency, stream=kwargs.get('stream', False))
+        limiter.release(response.status_code if response is not None else None, latency,
+                        error=response is None, retry_after=retry_after)
+
+def _request_with_retries(method, url, kwargs, retries=HTTP_MAX_RETRIES):
+    limiter = get_host_limiter(url)
+    for attempt in range(retries + 1):
+        last_attempt = attempt == retries
+        try:
+            response, retry_after = _send_once(limiter, method, url, kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if last_attempt: raise
+            count('rate_limit.retry')
+            time.sleep(HTTP_RETRY_BACKOFF * (2 ** attempt))
+            continue
+        if response.status_code not in THROTTLE_STATUSES or last_attempt: return response
+        if retry_after is not None and retry_after > HTTP_MAX_RETRY_WAIT: return response
+        # Host đã bị chặn tới hết Retry-After trong limiter; nếu không có header thì chờ theo backoff
+        count('rate_limit.retry')
+        response.close()
+        if retry_after is None: time.sleep(HTTP_RETRY_BACKOFF * (2 ** attempt))
+
+def _flight_key(method, url, kwargs):
+    # timeout không ảnh hưởng tới nội dung response nên không nằm trong key
+    options = sorted((k, sorted(v.items()) if isinstance(v, dict) else v) for k, v in kwargs.items() if k != 'timeout')
+    return method, url, repr(options)
+
+def http_request(method, url, **kwargs):
+    """
+    Gửi request qua Session dùng chung, qua limiter thích ứng của từng host (utils/rate_limiter.py).
+    429/503 và lỗi kết nối/timeout được thử lại tối đa HTTP_MAX_RETRIES lần (theo Retry-After nếu có).
+    Request không stream trùng (method, url, tham số) với một request đang chạy sẽ dùng chung response của nó,
+    nên phía gọi không được sửa response. Ném requests.exceptions.RequestException giống như requests.get/head.
+    retries=0 tắt thử lại ở tầng này, cho phía gọi có vòng retry riêng (xem utils/downloader.py).
+    """
+    retries = kwargs.pop('retries', HTTP_MAX_RETRIES)
+    if kwargs.get('stream'): return _request_with_retries(method, url, kwargs, retries)
+    return _http_flight.do(_flight_key(method, url, kwargs) + (retries,),
+                           lambda: _request_with_retries(method, url, kwargs, retries))
+
+def http_get(url, **kwargs):
+    return http_request('GET', url, **kwargs)
+
+def http_head(url, **kwargs):
+    # Giữ mặc định của requests.head: không tự theo redirect
+    kwargs.setdefault('allow_redirects', False)
+    return http_request('HEAD', url, **kwargs)
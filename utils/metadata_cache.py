@@ -0,0 +1,93 @@
+# utils/metadata_cache.py
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from .constants import (URL_METADATA_DB, URL_METADATA_POSITIVE_TTL, URL_METADATA_NEGATIVE_TTL,
+                        URL_METADATA_MAX_ENTRIES)
+
+# Số lần ghi trước khi commit và kiểm tra giới hạn kích thước
+_COMMIT_EVERY = 200
+
+class MetadataCache:
+    """
+    Cache metadata của URL (status, Last-Modified, ETag, thời điểm fetch) lưu trong SQLite.
+    Chỉ lưu dữ liệu thô; is_recent được tính lại ở mỗi lần đọc vì phụ thuộc thời điểm hiện tại.
+    """
+    def __init__(self, path=URL_METADATA_DB, positive_ttl=URL_METADATA_POSITIVE_TTL,
+                 negative_ttl=URL_METADATA_NEGATIVE_TTL, max_entries=URL_METADATA_MAX_ENTRIES):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.positive_ttl, self.negative_ttl, self.max_entries = positive_ttl, negative_ttl, max_entries
+        self._lock = threading.Lock()
+        self._pending_writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS url_metadata ("
+            " url TEXT PRIMARY KEY, status INTEGER NOT NULL, last_modified TEXT, etag TEXT,"
+            " fetched_at REAL NOT NULL, accessed_at REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_url_metadata_accessed ON url_metadata (accessed_at)")
+        self._conn.commit()
+
+    def _is_fresh(self, status, fetched_at, now):
+        ttl = self.positive_ttl if status == 200 else self.negative_ttl
+        return now - fetched_at <= ttl
+
+    def get(self, url):
+        """Trả về entry còn hạn hoặc None."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, last_modified, etag, fetched_at FROM url_metadata WHERE url = ?", (url,)).fetchone()
+            if not row: return None
+            status, last_modified, etag, fetched_at = row
+            if not self._is_fresh(status, fetched_at, now): return None
+            self._conn.execute("UPDATE url_metadata SET accessed_at = ? WHERE url = ?", (now, url))
+            self._after_write()
+        return {'status': status, 'last_modified': last_modified, 'etag': etag, 'fetched_at': fetched_at}
+
+    def put(self, url, entry):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO url_metadata (url, status, last_modified, etag, fetched_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (url, entry['status'], entry.get('last_modified'), entry.get('etag'), entry['fetched_at'], time.time()))
+            self._after_write()
+
+    def _after_write(self):
+        self._pending_writes += 1
+        if self._pending_writes >= _COMMIT_EVERY: self._flush()
+
+    def _flush(self):
+        # Xóa entry ít được dùng nhất khi vượt quá max_entries (LRU)
+        self._conn.execute(
+            "DELETE FROM url_metadata WHERE url IN ("
+            " SELECT url FROM url_metadata ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+        self._conn.commit()
+        self._pending_writes = 0
+
+    def close(self):
+        with self._lock:
+            if self._conn is None: return
+            self._flush()
+            self._conn.close()
+            self._conn = None
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_metadata_cache():
+    """Trả về cache dùng chung, hoặc None nếu không mở được file SQLite (khi đó chỉ dùng cache trong bộ nhớ)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = MetadataCache()
+            except (sqlite3.Error, OSError) as e:
+                print(f"CẢNH BÁO: Không mở được cache metadata tại {URL_METADATA_DB}: {e}")
+                _cache = False
+            else:
+                atexit.register(_cache.close)
+        return _cache or None
@@ -1,12 +1,10 @@
 # utils/notifier.py
 import os
 import requests
-from dotenv import load_dotenv
-from .constants import ENV_FILE
-
-load_dotenv(dotenv_path=ENV_FILE)
+from .env import load_env
 
 def send_telegram_message(message):
+    load_env()
     bot_token = os.getenv('TELEGRAM_BOT_TOKEN')
     chat_id = os.getenv('TELEGRAM_CHAT_ID')
     if not bot_token or not chat_id:
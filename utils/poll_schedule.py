@@ -0,0 +1,52 @@
+# utils/poll_schedule.py
+import json
+import os
+import threading
+import time
+
+from .constants import (POLL_SCHEDULE_FILE, DAEMON_INITIAL_INTERVAL, DAEMON_MIN_INTERVAL, DAEMON_MAX_INTERVAL,
+                        DAEMON_BACKOFF_FACTOR)
+
+class PollSchedule:
+    """
+    Chu kỳ poll riêng của từng domain cho chế độ --daemon: có ảnh mới thì chu kỳ giảm một nửa (tối thiểu
+    DAEMON_MIN_INTERVAL), không có thì tăng theo DAEMON_BACKOFF_FACTOR (tối đa DAEMON_MAX_INTERVAL).
+    Lưu xuống file sau mỗi chu kỳ để daemon khởi động lại vẫn giữ nhịp cũ.
+    """
+    def __init__(self, path=POLL_SCHEDULE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, 'r', encoding='utf-8') as f: self._domains = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError): self._domains = {}
+
+    def _state(self, domain):
+        # Domain mới (hoặc lần đầu chạy daemon) được crawl ngay
+        return self._domains.get(domain) or {'interval': DAEMON_INITIAL_INTERVAL, 'next_run': 0}
+
+    def due(self, plans, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            return [plan for plan in plans if self._state(plan.domain)['next_run'] <= now]
+
+    def seconds_until_next(self, plans, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            next_runs = [self._state(plan.domain)['next_run'] for plan in plans]
+        return max(0.0, min(next_runs) - now) if next_runs else DAEMON_MIN_INTERVAL
+
+    def record(self, domain, new_count, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            interval = self._state(domain)['interval']
+            if new_count > 0: interval = max(DAEMON_MIN_INTERVAL, interval / 2)
+            else: interval = min(DAEMON_MAX_INTERVAL, interval * DAEMON_BACKOFF_FACTOR)
+            self._domains[domain] = {'interval': interval, 'next_run': now + interval}
+            return interval
+
+    def save(self):
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f: json.dump(self._domains, f, indent=2)
+            os.replace(tmp_path, self.path)
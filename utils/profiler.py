@@ -0,0 +1,179 @@
+# utils/profiler.py
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from .rate_limiter import limiter_snapshot
+
+class RunProfile:
+    """
+    Số liệu hiệu năng của một lần chạy: thời gian theo phase (tổng và theo domain), request theo host
+    (số lượng, status, thời gian, bytes) và các bộ đếm (cache hit/miss...). Thread-safe.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.phases = {}
+        self.domains = {}
+        self.hosts = {}
+        self.counters = {}
+        # Chỉ có ở profile gộp từ các shard (merge): thời lượng và limiter lấy từ dữ liệu shard
+        self.duration = None
+        self.limiters = {}
+
+    def add_phase(self, name, seconds, domain=None):
+        with self._lock:
+            phase = self.phases.setdefault(name, {'count': 0, 'seconds': 0.0})
+            phase['count'] += 1
+            phase['seconds'] += seconds
+            if domain:
+                domain_phases = self.domains.setdefault(domain, {})
+                domain_phases[name] = domain_phases.get(name, 0.0) + seconds
+
+    def record_request(self, method, url, status, seconds, server_seconds, nbytes):
+        host = urlparse(url).netloc
+        with self._lock:
+            stats = self.hosts.setdefault(host, {'requests': 0, 'seconds': 0.0, 'server_seconds': 0.0,
+                                                 'bytes': 0, 'methods': {}, 'status': {}})
+            stats['requests'] += 1
+            stats['seconds'] += seconds
+            stats['server_seconds'] += server_seconds
+            stats['bytes'] += nbytes
+            stats['methods'][method] = stats['methods'].get(method, 0) + 1
+            status_key = str(status) if status else 'error'
+            stats['status'][status_key] = stats['status'].get(status_key, 0) + 1
+
+    def add_bytes(self, url, nbytes):
+        host = urlparse(url).netloc
+        with self._lock:
+            if host in self.hosts: self.hosts[host]['bytes'] += nbytes
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def merge(self, data):
+        """Cộng dồn một profile khác (dạng to_dict(), vd của một shard): phase, host, bộ đếm và limiter."""
+        with self._lock:
+            self.started_at = min(self.started_at, data['started_at'])
+            self.duration = max(self.duration or 0.0, data['duration'])
+            for name, value in data['phases'].items():
+                phase = self.phases.setdefault(name, {'count': 0, 'seconds': 0.0})
+                phase['count'] += value['count']
+                phase['seconds'] += value['seconds']
+            for domain, value in data['domains'].items():
+                domain_phases = self.domains.setdefault(domain, {})
+                for name, seconds in value['phases'].items():
+                    domain_phases[name] = domain_phases.get(name, 0.0) + seconds
+            for host, value in data['hosts'].items():
+                stats = self.hosts.setdefault(host, {'requests': 0, 'seconds': 0.0, 'server_seconds': 0.0,
+                                                     'bytes': 0, 'methods': {}, 'status': {}})
+                for key in ('requests', 'seconds', 'server_seconds', 'bytes'): stats[key] += value[key]
+                for key in ('methods', 'status'):
+                    for name, n in value[key].items(): stats[key][name] = stats[key].get(name, 0) + n
+            for name, n in data['counters'].items():
+                self.counters[name] = self.counters.get(name, 0) + n
+            self.limiters.update(data.get('limiters') or {})
+
+    def _domain_for_host(self, host, domains):
+        # Gán request theo host: domain trùng host hoặc host là subdomain (vd: images.<domain>)
+        for domain in domains:
+            if host == domain or host.endswith('.' + domain): return domain
+        return None
+
+    def to_dict(self):
+        with self._lock:
+            domains = {d: {'phases': {k: round(v, 3) for k, v in p.items()}, 'requests': 0, 'bytes': 0}
+                       for d, p in self.domains.items()}
+            for host, stats in self.hosts.items():
+                domain = self._domain_for_host(host, domains)
+                if domain:
+                    domains[domain]['requests'] += stats['requests']
+                    domains[domain]['bytes'] += stats['bytes']
+            hits = self.counters.get('metadata.memory_hit', 0) + self.counters.get('metadata.disk_hit', 0)
+            lookups = hits + self.counters.get('metadata.miss', 0)
+            return {
+                'started_at': self.started_at,
+                'duration': round(self.duration if self.duration is not None else time.time() - self.started_at, 3),
+                'totals': {
+                    'requests': sum(s['requests'] for s in self.hosts.values()),
+                    'bytes': sum(s['bytes'] for s in self.hosts.values()),
+                    'metadata_cache_hit_rate': round(hits / lookups, 3) if lookups else None,
+                    # Request không phải gửi nhờ gộp vào một request giống hệt đang chạy (utils/single_flight.py)
+                    'requests_coalesced': sum(n for k, n in self.counters.items() if k.startswith('single_flight.')),
+                },
+                'phases': {k: {'count': v['count'], 'seconds': round(v['seconds'], 3)} for k, v in self.phases.items()},
+                'domains': domains,
+                'hosts': {h: dict(s, seconds=round(s['seconds'], 3), server_seconds=round(s['server_seconds'], 3))
+                          for h, s in self.hosts.items()},
+                'counters': dict(self.counters),
+                'limiters': dict(self.limiters, **limiter_snapshot()),
+            }
+
+    def summary_lines(self, top=3):
+        """Tóm tắt ngắn gọn cho báo cáo Telegram."""
+        data = self.to_dict()
+        totals = data['totals']
+        lines = [f"Requests: {totals['requests']} ({totals['bytes'] / 1024 / 1024:.1f} MiB)"]
+        if totals['metadata_cache_hit_rate'] is not None:
+            lines[0] += f", HEAD cache hit: {totals['metadata_cache_hit_rate'] * 100:.0f}%"
+        if totals['requests_coalesced']:
+            lines[0] += f", coalesced: {totals['requests_coalesced']}"
+        phases = sorted(data['phases'].items(), key=lambda kv: kv[1]['seconds'], reverse=True)
+        if phases:
+            lines.append("Phases: " + ", ".join(f"{name} {v['seconds']:.0f}s" for name, v in phases[:top + 2]))
+        slowest = sorted(data['domains'].items(), key=lambda kv: sum(kv[1]['phases'].values()), reverse=True)
+        if slowest:
+            lines.append("Slowest: " + ", ".join(f"{d} {sum(v['phases'].values()):.0f}s" for d, v in slowest[:top]))
+        return lines
+
+    def write(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f: json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp_path, path)
+
+_profile = RunProfile()
+
+def reset_profile():
+    """Bắt đầu profile mới (mỗi lần chạy main)."""
+    global _profile
+    _profile = RunProfile()
+    return _profile
+
+@contextmanager
+def phase(name, domain=None):
+    """Đo thời gian một đoạn code: with phase('crawl', domain): ..."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _profile.add_phase(name, time.perf_counter() - start, domain)
+
+def count(name, n=1):
+    _profile.count(name, n)
+
+def _count_streamed_bytes(profile, url, response):
+    # Body của request stream được đọc sau khi request đã được ghi nhận: cộng dần khi phía gọi đọc qua
+    # iter_content (content, text, json và iter_lines của requests đều đọc qua đây)
+    iter_content = response.iter_content
+    def counting_iter_content(*args, **kwargs):
+        for chunk in iter_content(*args, **kwargs):
+            profile.add_bytes(url, len(chunk.encode('utf-8') if isinstance(chunk, str) else chunk))
+            yield chunk
+    response.iter_content = counting_iter_content
+
+def record_request(method, url, response, seconds, stream=False):
+    """
+    Ghi nhận một request. bytes là số byte body (đã giải nén) thực sự được đọc: với request không stream là
+    toàn bộ body requests đã tải, với request stream được cộng dần khi body được đọc.
+    """
+    if response is None:
+        _profile.record_request(method, url, None, seconds, 0.0, 0)
+        return
+    nbytes = 0 if stream else len(response.content)
+    _profile.record_request(method, url, response.status_code, seconds, response.elapsed.total_seconds(), nbytes)
+    if stream: _count_streamed_bytes(_profile, url, response)
@@ -0,0 +1,116 @@
+# utils/rate_limiter.py
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+from .constants import (MAX_CONNECTIONS_PER_HOST, HOST_INITIAL_CONCURRENCY, HOST_INITIAL_RATE, HOST_MAX_RATE,
+                        HOST_MIN_RATE, HOST_RATE_BURST, HOST_LATENCY_FACTOR, HOST_SLOW_LATENCY, HTTP_MAX_RETRY_WAIT)
+
+THROTTLE_STATUSES = (429, 503)
+
+def parse_retry_after(value):
+    """Retry-After dạng số giây hoặc HTTP date -> số giây cần chờ (None nếu không đọc được)."""
+    if not value: return None
+    value = value.strip()
+    if value.isdigit(): return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None: retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+class HostLimiter:
+    """
+    Giới hạn request tới một host: số request đồng thời + token bucket (req/s), cả hai điều chỉnh kiểu AIMD.
+    - Thành công với độ trễ bình thường: tăng cộng (concurrency +1/limit, rate +0.5 req/s).
+    - 429/503, lỗi kết nối hoặc độ trễ vượt HOST_LATENCY_FACTOR lần mức nền: giảm nhân (chia đôi).
+    - Token bucket chỉ bật sau tín hiệu quá tải đầu tiên (bắt đầu từ HOST_INITIAL_RATE) và tắt lại khi
+      rate hồi về HOST_MAX_RATE, nên host bình thường không bị giới hạn tốc độ.
+    - Retry-After: chặn cả host cho tới thời điểm server yêu cầu (tối đa HTTP_MAX_RETRY_WAIT giây).
+    """
+    def __init__(self, max_concurrency=MAX_CONNECTIONS_PER_HOST, concurrency=HOST_INITIAL_CONCURRENCY,
+                 burst=HOST_RATE_BURST):
+        self.max_concurrency = max(1, max_concurrency)
+        self.concurrency = float(max(1, min(concurrency, self.max_concurrency)))
+        self.rate, self.burst = None, burst  # None: không giới hạn tốc độ
+        self.tokens = float(burst)
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.baseline_latency = None
+        self._refilled_at = time.monotonic()
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        if self.rate is None: return
+        self.tokens = min(self.burst, self.tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def acquire(self):
+        """Chờ tới khi host không bị chặn, còn token và còn slot đồng thời. Trả về số giây đã phải chờ."""
+        started = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                elif self.in_flight >= int(self.concurrency):
+                    wait = None  # chờ release() đánh thức
+                elif self.rate is not None and self.tokens < 1:
+                    wait = (1 - self.tokens) / self.rate
+                else:
+                    if self.rate is not None: self.tokens -= 1
+                    self.in_flight += 1
+                    return time.monotonic() - started
+                self._cond.wait(wait)
+
+    def release(self, status=None, latency=None, error=False, retry_after=None):
+        with self._cond:
+            self.in_flight -= 1
+            throttled = error or status in THROTTLE_STATUSES
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + min(retry_after, HTTP_MAX_RETRY_WAIT))
+            if not throttled and latency is not None:
+                # Mức nền: EWMA của độ trễ, chỉ cập nhật bằng các request không bị chậm bất thường
+                slow = self.baseline_latency is not None and latency > HOST_SLOW_LATENCY and \
+                    latency > self.baseline_latency * HOST_LATENCY_FACTOR
+                if not slow:
+                    self.baseline_latency = latency if self.baseline_latency is None else \
+                        0.9 * self.baseline_latency + 0.1 * latency
+                throttled = slow
+            if throttled:
+                self.concurrency = max(1.0, self.concurrency / 2)
+                if self.rate is None:
+                    self.rate, self.tokens, self._refilled_at = HOST_INITIAL_RATE, min(self.tokens, 1.0), time.monotonic()
+                else:
+                    self.rate = max(HOST_MIN_RATE, self.rate / 2)
+            else:
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+                if self.rate is not None:
+                    self.rate += 0.5
+                    if self.rate >= HOST_MAX_RATE: self.rate, self.tokens = None, float(self.burst)
+            self._cond.notify_all()
+
+    def snapshot(self):
+        with self._cond:
+            return {'concurrency': round(self.concurrency, 2), 'rate': round(self.rate, 2) if self.rate else None,
+                    'baseline_latency': round(self.baseline_latency, 3) if self.baseline_latency else None}
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_host_limiter(url):
+    host = urlparse(url).netloc
+    with _limiters_lock:
+        limiter = _limiters.get(host)
+        if limiter is None: limiter = _limiters[host] = HostLimiter()
+        return limiter
+
+def limiter_snapshot():
+    """Trạng thái cuối của limiter từng host (đưa vào run profile)."""
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {host: limiter.snapshot() for host, limiter in limiters.items()}
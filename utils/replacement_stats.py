@@ -0,0 +1,59 @@
+# utils/replacement_stats.py
+import json
+import os
+import threading
+from .constants import REPLACEMENT_STATS_FILE, REPLACEMENT_STATS_MIN_WINS, REPLACEMENT_STATS_MIN_SHARE
+
+class ReplacementStats:
+    """
+    Thống kê theo domain: replacement nào (cặp 'original -> replacement') thường là ứng viên hợp lệ đầu tiên.
+    Dữ liệu được cập nhật trong bộ nhớ khi crawl và chỉ ghi xuống file khi gọi save() ở cuối lần chạy.
+    """
+    def __init__(self, path=REPLACEMENT_STATS_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._dirty = False
+        try:
+            with open(path, 'r', encoding='utf-8') as f: self._stats = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError): self._stats = {}
+
+    def preferred(self, domain, keys):
+        """Trả về key trong keys thường thắng nhất của domain nếu đủ tin cậy, ngược lại None."""
+        with self._lock:
+            domain_stats = self._stats.get(domain)
+            if not domain_stats: return None
+            wins = domain_stats.get('wins', {})
+            best_key = max(keys, key=lambda k: wins.get(k, 0))
+            best_wins, total = wins.get(best_key, 0), domain_stats.get('total', 0)
+        if best_wins >= REPLACEMENT_STATS_MIN_WINS and best_wins >= total * REPLACEMENT_STATS_MIN_SHARE:
+            return best_key
+        return None
+
+    def record(self, domain, winner_key):
+        """Ghi nhận một lần xử lý; winner_key là None nếu không có replacement nào hợp lệ."""
+        with self._lock:
+            domain_stats = self._stats.setdefault(domain, {'total': 0, 'wins': {}})
+            domain_stats['total'] += 1
+            if winner_key: domain_stats['wins'][winner_key] = domain_stats['wins'].get(winner_key, 0) + 1
+            self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self._dirty: return
+            self._dirty = False
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f: json.dump(self._stats, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+_stats = None
+_stats_lock = threading.Lock()
+
+def get_replacement_stats():
+    global _stats
+    with _stats_lock:
+        if _stats is None: _stats = ReplacementStats()
+        return _stats
+
+def save_replacement_stats():
+    get_replacement_stats().save()
@@ -0,0 +1,27 @@
+# utils/scheduler.py
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from .constants import MAX_CRAWL_WORKERS, MAX_CRAWL_WORKERS_PER_HOST
+
+def run_domain_jobs(configs, job, max_workers=MAX_CRAWL_WORKERS, per_host_limit=MAX_CRAWL_WORKERS_PER_HOST):
+    """
+    Chạy job(url_data) cho từng config song song, giới hạn tổng số worker và số job đồng thời trên mỗi host.
+    Kết quả trả về đúng theo thứ tự của configs để phía gọi gộp dữ liệu giống hệt khi chạy tuần tự.
+    """
+    if not configs: return []
+    host_slots = {}
+    for url_data in configs:
+        host = urlparse(url_data['url']).netloc
+        if host not in host_slots: host_slots[host] = threading.BoundedSemaphore(max(1, per_host_limit))
+
+    def guarded_job(url_data):
+        with host_slots[urlparse(url_data['url']).netloc]:
+            return job(url_data)
+
+    if max_workers <= 1:
+        return [guarded_job(url_data) for url_data in configs]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(configs))) as executor:
+        futures = [executor.submit(guarded_job, url_data) for url_data in configs]
+        # f.result() ném lại exception của job giống như khi chạy tuần tự
+        return [future.result() for future in futures]
@@ -0,0 +1,107 @@
+# utils/seen_index.py
+import hashlib
+import os
+import threading
+from array import array
+
+from .constants import SEEN_INDEX_DIR, SEEN_INDEX_MAX, SEEN_STOP_AFTER
+from .profiler import count
+
+def fingerprint(url):
+    """Fingerprint 64-bit của product URL (xác suất trùng không đáng kể với vài trăm nghìn URL mỗi domain)."""
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'little')
+
+class SeenIndex:
+    """
+    Fingerprint của mọi product URL đã xử lý của một domain, lưu trong file nhị phân (8 byte/URL, theo thứ tự
+    thêm vào; giữ tối đa SEEN_INDEX_MAX URL mới nhất). Giống CursorStore: URL mới chỉ được ghi khi gọi save()
+    ở cuối lần chạy, nên trong một lần chạy index chỉ chứa sản phẩm của các lần trước.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._fingerprints = array('Q')
+        self._pending = []
+        try:
+            with open(path, 'rb') as f: data = f.read()
+            # File bị cắt dở (không chia hết cho 8 byte) thì bỏ phần thừa ở cuối
+            self._fingerprints.frombytes(data[:len(data) - len(data) % self._fingerprints.itemsize])
+        except FileNotFoundError:
+            pass
+        self._seen = set(self._fingerprints)
+
+    def __contains__(self, url):
+        return fingerprint(url) in self._seen
+
+    def __len__(self):
+        return len(self._seen)
+
+    def add(self, urls):
+        with self._lock:
+            self._pending.extend(fingerprint(url) for url in urls)
+
+    def save(self):
+        with self._lock:
+            new = [fp for fp in dict.fromkeys(self._pending) if fp not in self._seen]
+            self._pending = []
+            if not new: return
+            self._fingerprints.extend(new)
+            if len(self._fingerprints) > SEEN_INDEX_MAX:
+                self._fingerprints = self._fingerprints[-SEEN_INDEX_MAX:]
+            self._seen = set(self._fingerprints)
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'wb') as f: f.write(self._fingerprints.tobytes())
+            os.replace(tmp_path, self.path)
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_seen_index(domain):
+    with _indexes_lock:
+        index = _indexes.get(domain)
+        if index is None: index = _indexes[domain] = SeenIndex(os.path.join(SEEN_INDEX_DIR, f"{domain}.bin"))
+        return index
+
+def save_seen_indexes():
+    with _indexes_lock:
+        indexes = list(_indexes.values())
+    for index in indexes: index.save()
+
+class SeenTracker:
+    """
+    Quyết định cho từng product URL theo thứ tự crawl của một domain:
+    - STOP: gặp stop URL (như cũ) hoặc đã gặp SEEN_STOP_AFTER sản phẩm đã xử lý liên tiếp.
+    - SKIP: sản phẩm đã được xử lý ở lần chạy trước.
+    - NEW: sản phẩm mới, cần crawl.
+    Crawler gọi mark() cho mọi sản phẩm đã tải và parse xong (kể cả khi không có ảnh) và commit() khi crawl
+    thành công; URL đã mark của một lần crawl bị lỗi giữa chừng không được đưa vào index, để lần sau vẫn crawl lại.
+    """
+    STOP, SKIP, NEW = 'stop', 'skip', 'new'
+
+    def __init__(self, domain, stop_urls_list, stop_after=SEEN_STOP_AFTER):
+        self.index = get_seen_index(domain)
+        self.stop_urls_list, self.stop_after = stop_urls_list, stop_after
+        self.consecutive_hits = 0
+        self.stopped_by_index = False
+        self._marked = []
+
+    def check(self, product_url):
+        if product_url in self.stop_urls_list: return self.STOP
+        if product_url in self.index:
+            self.consecutive_hits += 1
+            if self.consecutive_hits >= self.stop_after:
+                count('seen.stopped')
+                self.stopped_by_index = True
+                return self.STOP
+            count('seen.skipped')
+            return self.SKIP
+        self.consecutive_hits = 0
+        return self.NEW
+
+    def mark(self, product_url):
+        if product_url: self._marked.append(product_url)
+
+    def commit(self):
+        self.index.add(self._marked)
+        self._marked = []
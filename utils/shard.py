@@ -0,0 +1,108 @@
+# utils/shard.py
+"""
+Chạy config.json phân tán trên nhiều runner (main.py --shard i/N) và gộp kết quả (main.py --merge-shards).
+
+Mỗi domain thuộc đúng một shard, theo hash ổn định của domain (không phụ thuộc thứ tự config hay PYTHONHASHSEED),
+nên domain/<domain>.txt và cache .cache/ của một shard không bao giờ đụng tới shard khác. Runner của shard không
+ghi log, không gửi Telegram và không push; nó ghi một file kết quả (summary, stop URLs, nội dung domain/*.txt
+của các domain trong shard và run profile). Bước merge đọc các file đó, ghi lại stop_urls.txt và domain/*.txt, gộp
+profile của các shard, rồi tạo một log, một báo cáo Telegram và một lần git push duy nhất.
+"""
+import glob
+import hashlib
+import json
+import os
+
+from .constants import SHARD_DIR, DOMAIN_DIR
+
+def parse_shard(text):
+    """'i/N' -> (i, N), với 0 <= i < N. Ném ValueError nếu không hợp lệ (dùng làm type cho argparse)."""
+    try:
+        index, count = (int(part) for part in text.split('/'))
+    except ValueError:
+        raise ValueError(f"shard phải có dạng i/N, nhận '{text}'")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"shard '{text}' không hợp lệ: cần 0 <= i < N")
+    return index, count
+
+def shard_of(domain, count):
+    """Shard của domain: blake2b của tên domain (ổn định giữa các process và các máy) modulo số shard."""
+    return int.from_bytes(hashlib.blake2b(domain.encode('utf-8'), digest_size=8).digest(), 'little') % count
+
+def select_shard(plans, index, count):
+    return [plan for plan in plans if shard_of(plan.domain, count) == index]
+
+def shard_result_path(index, count, shard_dir=SHARD_DIR):
+    return os.path.join(shard_dir, f"shard-{index}-of-{count}.json")
+
+def _read_domain_file(domain):
+    try:
+        with open(os.path.join(DOMAIN_DIR, f"{domain}.txt"), 'r', encoding='utf-8', newline='') as f: return f.read()
+    except FileNotFoundError:
+        return None
+
+def write_shard_result(index, count, started_at, duration, plans, urls_summary, stop_urls_data, profile=None,
+                       shard_dir=SHARD_DIR):
+    """Ghi kết quả của một shard; chỉ chứa các domain thuộc shard này. profile: RunProfile của shard (nếu có)."""
+    domains = [plan.domain for plan in plans]
+    result = {
+        'shard': index, 'count': count, 'started_at': started_at, 'duration': duration,
+        'domains': domains,
+        'urls_summary': {d: urls_summary[d] for d in domains if d in urls_summary},
+        'stop_urls': {d: stop_urls_data[d] for d in domains if d in stop_urls_data},
+        'domain_files': {d: _read_domain_file(d) for d in domains if d in urls_summary},
+        'profile': profile.to_dict() if profile is not None else None,
+    }
+    path = shard_result_path(index, count, shard_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f: json.dump(result, f, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+def load_shard_results(paths):
+    """
+    Đọc các file kết quả (file hoặc thư mục chứa shard-*-of-*.json, tìm đệ quy). Trả về (results, missing):
+    results sắp theo chỉ số shard, missing là các chỉ số shard không có kết quả (runner lỗi).
+    Ném ValueError nếu các shard không cùng N, trùng chỉ số hoặc trùng domain.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path): files += glob.glob(os.path.join(path, '**', 'shard-*-of-*.json'), recursive=True)
+        else: files.append(path)
+    results = {}
+    for path in sorted(files):
+        with open(path, 'r', encoding='utf-8') as f: result = json.load(f)
+        if result['shard'] in results: raise ValueError(f"shard {result['shard']} xuất hiện nhiều lần ({path})")
+        results[result['shard']] = result
+    if not results: raise ValueError(f"không tìm thấy kết quả shard nào trong: {', '.join(paths)}")
+    counts = {result['count'] for result in results.values()}
+    if len(counts) != 1: raise ValueError(f"các shard có số lượng N khác nhau: {sorted(counts)}")
+    owners = {}
+    for index, result in results.items():
+        for domain in result['domains']:
+            if domain in owners: raise ValueError(f"domain {domain} thuộc cả shard {owners[domain]} và {index}")
+            owners[domain] = index
+    count = counts.pop()
+    return [results[i] for i in sorted(results)], [i for i in range(count) if i not in results]
+
+def apply_shard_results(results, stop_urls_data, plans):
+    """
+    Ghi domain/*.txt của các shard và cập nhật stop_urls_data tại chỗ. Trả về urls_summary theo thứ tự config
+    (domain không còn trong config xếp cuối, theo tên) để log và báo cáo giống khi chạy một runner.
+    """
+    merged, stop_urls = {}, {}
+    for result in results:
+        merged.update(result['urls_summary'])
+        stop_urls.update(result['stop_urls'])
+        for domain, text in result['domain_files'].items():
+            if text is None or _read_domain_file(domain) == text: continue
+            path = os.path.join(DOMAIN_DIR, f"{domain}.txt")
+            os.makedirs(DOMAIN_DIR, exist_ok=True)
+            with open(f"{path}.tmp", 'w', encoding='utf-8', newline='') as f: f.write(text)
+            os.replace(f"{path}.tmp", path)
+    order = [plan.domain for plan in plans if plan.domain in merged]
+    order += sorted(set(merged) - set(order))
+    for domain in order + sorted(set(stop_urls) - set(order)):
+        if domain in stop_urls: stop_urls_data[domain] = stop_urls[domain]
+    return {domain: merged[domain] for domain in order}
@@ -0,0 +1,40 @@
+# utils/single_flight.py
+import threading
+
+from .profiler import count
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Gộp các lời gọi đồng thời cùng key: chỉ lời gọi đầu tiên chạy fn, các lời gọi tới trong lúc đó chờ và
+    dùng chung kết quả (hoặc exception). Số lời gọi được gộp được đếm vào profile: single_flight.<name>.shared.
+    """
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader: call = self._calls[key] = _Call()
+        if not leader:
+            count(f'single_flight.{self.name}.shared')
+            call.done.wait()
+            if call.error is not None: raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock: del self._calls[key]
+            call.done.set()
@@ -0,0 +1,47 @@
+# utils/startup_profile.py
+import statistics
+import subprocess
+import sys
+import time
+
+from .constants import BASE_DIR, STARTUP_BUDGET_MS
+
+def _parse_importtime(stderr):
+    """Dòng 'import time: self | cumulative | name' của python -X importtime -> list (self_us, cumulative_us, name)."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line: continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((int(self_us), int(cumulative_us), name.rstrip()))
+    return rows
+
+def measure_startup(module='main', repeat=1):
+    """
+    Import `module` trong process Python mới (cold start) `repeat` lần. Trả về (wall_ms, rows): wall_ms là median
+    thời gian từ lúc chạy interpreter tới khi import xong, rows là thời gian import từng module của lần cuối.
+    """
+    walls, rows = [], []
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=BASE_DIR,
+                                   capture_output=True, text=True, check=True)
+        walls.append((time.perf_counter() - start) * 1000)
+        rows = _parse_importtime(completed.stderr)
+    return statistics.median(walls), rows
+
+def report_startup(module='main', repeat=5, top=15, budget_ms=STARTUP_BUDGET_MS):
+    """In báo cáo thời gian import và so với ngân sách khởi động. Trả về True nếu nằm trong ngân sách."""
+    wall_ms, rows = measure_startup(module, repeat)
+    print(f"--- Startup profile: import {module} (median {repeat} lần chạy) ---")
+    print(f"{'self ms':>8} {'cumul ms':>9}  module")
+    for self_us, cumulative_us, name in sorted(rows, key=lambda r: r[0], reverse=True)[:top]:
+        print(f"{self_us / 1000:>8.1f} {cumulative_us / 1000:>9.1f}  {name.strip()}")
+    total_us = next((cumulative for _, cumulative, name in rows if name.strip() == module), 0)
+    print(f"Import {module}: {total_us / 1000:.1f} ms, cold start (gồm khởi động interpreter): {wall_ms:.1f} ms")
+    within = wall_ms <= budget_ms
+    print(f"{'✅' if within else '❌'} Ngân sách khởi động: {budget_ms} ms")
+    return within
+
+if __name__ == '__main__':
+    # Kiểm tra hồi quy: python -m utils.startup_profile (exit code 1 nếu vượt ngân sách)
+    sys.exit(0 if report_startup() else 1)
@@ -0,0 +1,216 @@
+# utils/state_store.py
+"""
+Backend trạng thái SQLite (bật bằng STATE_BACKEND=sqlite): stop URLs, danh sách ảnh đã lưu của từng domain,
+cursor theo domain và lịch sử các lần chạy nằm trong một file .cache/state.sqlite3 (WAL).
+
+File cũ (domain/*.txt, stop_urls.txt) vẫn là định dạng mà phía sau sử dụng: thay đổi trong lần chạy được giữ
+trong bộ nhớ, ghi vào DB trong một transaction ở cuối lần chạy rồi export lại các file của domain có thay đổi.
+Nếu file cũ bị sửa từ bên ngoài (hash khác lần export gần nhất) thì dữ liệu được import lại từ file.
+
+    python -m utils.state_store --export-all
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from .constants import STATE_BACKEND, STATE_DB, DOMAIN_DIR, STOP_URLS_FILE
+from .url_store import split_url_lines
+
+def _hash_text(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+def _read_raw(path):
+    try:
+        with open(path, 'r', encoding='utf-8', newline='') as f: return f.read()
+    except FileNotFoundError:
+        return None
+
+def _write_atomic(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f: f.write(text)
+    os.replace(tmp_path, path)
+
+class StateStore:
+    def __init__(self, path=STATE_DB, domain_dir=DOMAIN_DIR, stop_urls_file=STOP_URLS_FILE):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.domain_dir, self.stop_urls_file = domain_dir, stop_urls_file
+        self._lock = threading.Lock()
+        self._domains = {}
+        self._pending_cursors = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS image_urls ("
+            " domain TEXT NOT NULL, pos INTEGER NOT NULL, url TEXT NOT NULL, PRIMARY KEY (domain, pos));"
+            "CREATE INDEX IF NOT EXISTS idx_image_urls_url ON image_urls (domain, url);"
+            "CREATE TABLE IF NOT EXISTS stop_urls (domain TEXT PRIMARY KEY, pos INTEGER NOT NULL, urls TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS domain_state (domain TEXT PRIMARY KEY, file_hash TEXT, cursor TEXT);"
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);"
+            "CREATE TABLE IF NOT EXISTS runs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, started_at REAL NOT NULL, duration REAL NOT NULL,"
+            " new_images INTEGER NOT NULL, summary TEXT NOT NULL);")
+        self._conn.commit()
+
+    def _domain_file(self, domain):
+        return os.path.join(self.domain_dir, f"{domain}.txt")
+
+    def _meta(self, key):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    # --- Stop URLs ---
+    def load_stop_urls(self):
+        """Trả về dict domain -> list stop URL, giữ thứ tự domain như trong stop_urls.txt."""
+        with self._lock:
+            raw = _read_raw(self.stop_urls_file)
+            if raw is None: return {}
+            if _hash_text(raw) != self._meta('stop_urls_hash'):
+                # stop_urls.txt được sửa ngoài DB (hoặc DB mới tạo): file là nguồn đúng
+                try:
+                    return json.loads(raw)
+                except json.JSONDecodeError:
+                    return {}
+            rows = self._conn.execute("SELECT domain, urls FROM stop_urls ORDER BY pos").fetchall()
+        return {domain: json.loads(urls) for domain, urls in rows}
+
+    # --- Danh sách ảnh của domain ---
+    def _load_domain(self, domain):
+        state = self._domains.get(domain)
+        if state is not None: return state
+        row = self._conn.execute("SELECT file_hash FROM domain_state WHERE domain = ?", (domain,)).fetchone()
+        raw = _read_raw(self._domain_file(domain))
+        if raw is None:
+            # Không có file: bắt đầu từ danh sách rỗng và tạo file khi commit, giống backend file
+            urls, clean, dirty = [], False, True
+        elif not row or row[0] != _hash_text(raw):
+            # File được sửa ngoài DB (hoặc DB mới tạo): import lại từ file
+            urls = split_url_lines(raw)
+            clean, dirty = raw == "\n".join(urls), True
+        else:
+            urls = [url for (url,) in self._conn.execute(
+                "SELECT url FROM image_urls WHERE domain = ? ORDER BY pos", (domain,))]
+            clean, dirty = raw == "\n".join(urls), False
+        state = self._domains[domain] = {'urls': urls, 'index': set(urls), 'clean': clean, 'dirty': dirty}
+        return state
+
+    def prepend_urls(self, domain, new_urls, max_urls):
+        """Giống DomainUrlFile.prepend nhưng chỉ cập nhật trong bộ nhớ; ghi DB và export khi commit()."""
+        with self._lock:
+            state = self._load_domain(domain)
+            unique_new_urls = [u for u in new_urls if u not in state['index']]
+            if not unique_new_urls and state['clean'] and len(state['urls']) <= max_urls:
+                return unique_new_urls, state['urls']
+            all_urls = (unique_new_urls + state['urls'])[:max_urls]
+            # Trạng thái trong bộ nhớ phải giống khi đọc lại file vừa export
+            text = "\n".join(all_urls)
+            state['text'], state['urls'] = text, split_url_lines(text)
+            state['index'], state['clean'], state['dirty'] = set(state['urls']), text == "\n".join(state['urls']), True
+            return unique_new_urls, all_urls
+
+    # --- Cursor theo domain ---
+    def get_cursor(self, domain):
+        with self._lock:
+            if domain in self._pending_cursors: return self._pending_cursors[domain]
+            row = self._conn.execute("SELECT cursor FROM domain_state WHERE domain = ?", (domain,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def set_cursor(self, domain, cursor):
+        """Cursor chỉ được ghi vào DB khi commit() để lần chạy lỗi giữa chừng không làm mất dữ liệu."""
+        with self._lock:
+            self._pending_cursors[domain] = cursor
+
+    # --- Ghi cuối lần chạy ---
+    def commit(self, stop_urls):
+        """Ghi toàn bộ thay đổi trong một transaction rồi export file cũ cho các domain có thay đổi."""
+        with self._lock:
+            dirty_domains = {d: s['urls'] for d, s in self._domains.items() if s['dirty']}
+            stop_urls_text = json.dumps(stop_urls, indent=2)
+            stop_urls_changed = _read_raw(self.stop_urls_file) != stop_urls_text
+            exports = {self._domain_file(d): s.get('text', "\n".join(s['urls']))
+                       for d, s in self._domains.items() if s['dirty']}
+            with self._conn:
+                for domain, urls in dirty_domains.items():
+                    self._conn.execute("DELETE FROM image_urls WHERE domain = ?", (domain,))
+                    self._conn.executemany("INSERT INTO image_urls (domain, pos, url) VALUES (?, ?, ?)",
+                                           [(domain, pos, url) for pos, url in enumerate(urls)])
+                    self._conn.execute(
+                        "INSERT INTO domain_state (domain, file_hash) VALUES (?, ?)"
+                        " ON CONFLICT(domain) DO UPDATE SET file_hash = excluded.file_hash",
+                        (domain, _hash_text(exports[self._domain_file(domain)])))
+                for domain, cursor in self._pending_cursors.items():
+                    self._conn.execute(
+                        "INSERT INTO domain_state (domain, cursor) VALUES (?, ?)"
+                        " ON CONFLICT(domain) DO UPDATE SET cursor = excluded.cursor",
+                        (domain, json.dumps(cursor) if cursor is not None else None))
+                self._conn.execute("DELETE FROM stop_urls")
+                self._conn.executemany("INSERT INTO stop_urls (domain, pos, urls) VALUES (?, ?, ?)",
+                                       [(d, pos, json.dumps(urls)) for pos, (d, urls) in enumerate(stop_urls.items())])
+                self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('stop_urls_hash', ?)",
+                                   (_hash_text(stop_urls_text),))
+            self._pending_cursors = {}
+            for state in self._domains.values(): state['dirty'] = False
+
+        # Export: chỉ ghi các file có thay đổi
+        for path, text in exports.items():
+            if _read_raw(path) != text: _write_atomic(path, text)
+        if stop_urls_changed: _write_atomic(self.stop_urls_file, stop_urls_text)
+        return sorted(dirty_domains)
+
+    def record_run(self, started_at, duration, summary):
+        """Lưu lịch sử lần chạy: summary là dict domain -> {'new_count', 'total_count'}."""
+        new_images = sum(counts['new_count'] for counts in summary.values())
+        with self._lock, self._conn:
+            self._conn.execute("INSERT INTO runs (started_at, duration, new_images, summary) VALUES (?, ?, ?, ?)",
+                               (started_at, duration, new_images, json.dumps(summary)))
+
+    def export_all(self):
+        """Sinh lại toàn bộ domain/*.txt và stop_urls.txt từ DB."""
+        with self._lock:
+            domains = [d for (d,) in self._conn.execute("SELECT DISTINCT domain FROM image_urls")]
+            rows = self._conn.execute("SELECT domain, urls FROM stop_urls ORDER BY pos").fetchall()
+            texts = {}
+            for domain in domains:
+                texts[self._domain_file(domain)] = "\n".join(url for (url,) in self._conn.execute(
+                    "SELECT url FROM image_urls WHERE domain = ? ORDER BY pos", (domain,)))
+        for path, text in texts.items(): _write_atomic(path, text)
+        if rows: _write_atomic(self.stop_urls_file, json.dumps({d: json.loads(u) for d, u in rows}, indent=2))
+        return len(texts)
+
+    def close(self):
+        with self._lock:
+            if self._conn is None: return
+            self._conn.close()
+            self._conn = None
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_state_store():
+    """Trả về StateStore nếu STATE_BACKEND=sqlite và mở được DB, ngược lại None (dùng file như cũ)."""
+    global _store
+    if STATE_BACKEND != 'sqlite': return None
+    with _store_lock:
+        if _store is None:
+            try:
+                _store = StateStore()
+            except (sqlite3.Error, OSError) as e:
+                print(f"CẢNH BÁO: Không mở được state DB tại {STATE_DB}: {e}. Dùng file như cũ.")
+                _store = False
+        return _store or None
+
+def record_run(started_at, duration, summary):
+    state_store = get_state_store()
+    if state_store: state_store.record_run(started_at, duration, summary)
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Export state DB ra domain/*.txt và stop_urls.txt")
+    arg_parser.add_argument('--export-all', action='store_true', help='ghi lại toàn bộ file từ DB')
+    args = arg_parser.parse_args()
+    if args.export_all:
+        print(f"Đã export {StateStore().export_all()} domain từ {STATE_DB}")
+    else:
+        arg_parser.print_help()
@@ -1,35 +1,96 @@
 # utils/url_processor.py
 import requests
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse, urljoin
 from datetime import datetime, timedelta, timezone
-from dateutil import parser
-from bs4 import BeautifulSoup
 
 # Import cache và hằng số từ constants.py
-from .constants import HEADERS, URL_METADATA_CACHE
+from .constants import (URL_METADATA_CACHE, URL_METADATA_POSITIVE_TTL, URL_METADATA_NEGATIVE_TTL,
+                        RECENCY_CHECK_CONCURRENCY, RECENCY_CHECK_PER_HOST, REPLACEMENT_PROBE_WORKERS)
+from .http_client import http_head
+from .metadata_cache import get_metadata_cache
+from .replacement_stats import get_replacement_stats
+from .profiler import count
+from .single_flight import SingleFlight
+from .config_plan import as_plan
+
+_probe_executor = None
+_probe_executor_lock = threading.Lock()
+_metadata_flight = SingleFlight('metadata')
+_FALLBACK_PREFIX_RE = re.compile(r'^[a-zA-Z0-9_-]+$')
+
+def _fetch_metadata_entry(url):
+    """Gửi HEAD và trả về dữ liệu thô: status, Last-Modified, ETag, thời điểm fetch."""
+    entry = {'status': 0, 'last_modified': None, 'etag': None, 'fetched_at': time.time()}
+    try:
+        with http_head(url, timeout=10, allow_redirects=True) as r:
+            entry['status'] = r.status_code
+            if r.status_code == 200:
+                entry['last_modified'] = r.headers.get('Last-Modified')
+                entry['etag'] = r.headers.get('ETag')
+    except requests.exceptions.RequestException:
+        pass
+    return entry
+
+def _metadata_from_entry(entry):
+    """Tính is_recent tại thời điểm đọc (ảnh được coi là mới nếu Last-Modified trong vòng 1 ngày)."""
+    default_response = {'status': 0, 'is_recent': False}
+    if entry['status'] != 200: return default_response
+    from dateutil import parser  # import khi cần: dateutil chậm và chỉ dùng cho Last-Modified
+    is_recent = True
+    last_modified_str = entry.get('last_modified')
+    if last_modified_str:
+        try:
+            last_modified_date = parser.parse(last_modified_str)
+        except (parser.ParserError, ValueError, OverflowError):
+            return default_response
+        if last_modified_date.tzinfo is None:
+            last_modified_date = last_modified_date.replace(tzinfo=timezone.utc)
+        now_utc = datetime.now(timezone.utc)
+        if (now_utc - last_modified_date) > timedelta(days=1):
+            is_recent = False
+    return {'status': entry['status'], 'is_recent': is_recent}
+
+def _load_metadata_entry(url):
+    # Kiểm tra lại cache trong bộ nhớ: lời gọi trước có thể vừa xong ngay trước khi lời gọi này được chạy
+    entry = URL_METADATA_CACHE.get(url)
+    if entry is not None:
+        count('metadata.memory_hit')
+        return entry
+    disk_cache = get_metadata_cache()
+    entry = disk_cache.get(url) if disk_cache else None
+    if entry is not None:
+        count('metadata.disk_hit')
+    else:
+        count('metadata.miss')
+        entry = _fetch_metadata_entry(url)
+        # Lỗi mạng (status 0) chỉ cache trong lần chạy hiện tại
+        if disk_cache and entry['status'] != 0: disk_cache.put(url, entry)
+    URL_METADATA_CACHE[url] = entry
+    return entry
 
 def get_url_metadata(url):
     if not url or not url.startswith('http'): return {'status': 0, 'is_recent': False}
-    if url in URL_METADATA_CACHE: return URL_METADATA_CACHE[url]
-    default_response = {'status': 0, 'is_recent': False}
-    try:
-        with requests.head(url, headers=HEADERS, timeout=10, allow_redirects=True) as r:
-            if r.status_code != 200:
-                URL_METADATA_CACHE[url] = default_response; return default_response
-            is_recent = True
-            last_modified_str = r.headers.get('Last-Modified')
-            if last_modified_str:
-                last_modified_date = parser.parse(last_modified_str)
-                if last_modified_date.tzinfo is None:
-                    last_modified_date = last_modified_date.replace(tzinfo=timezone.utc)
-                now_utc = datetime.now(timezone.utc)
-                if (now_utc - last_modified_date) > timedelta(days=1):
-                    is_recent = False
-            metadata = {'status': r.status_code, 'is_recent': is_recent}
-            URL_METADATA_CACHE[url] = metadata; return metadata
-    except (requests.exceptions.RequestException, parser.ParserError, ValueError):
-        URL_METADATA_CACHE[url] = default_response; return default_response
+    entry = URL_METADATA_CACHE.get(url)
+    if entry is not None:
+        count('metadata.memory_hit')
+    else:
+        # Các lời gọi đồng thời cho cùng URL (fallback, replacement, kiểm tra độ mới) dùng chung một HEAD
+        entry = _metadata_flight.do(url, lambda: _load_metadata_entry(url))
+    return _metadata_from_entry(entry)
+
+def prune_metadata_memory_cache(now=None):
+    """
+    Bỏ khỏi cache trong bộ nhớ các entry quá TTL (như cache trên đĩa) và các entry lỗi mạng.
+    Dùng giữa các chu kỳ của chế độ daemon, khi process sống lâu hơn một lần chạy.
+    """
+    now = time.time() if now is None else now
+    for url, entry in list(URL_METADATA_CACHE.items()):
+        ttl = URL_METADATA_POSITIVE_TTL if entry['status'] == 200 else URL_METADATA_NEGATIVE_TTL
+        if entry['status'] == 0 or now - entry['fetched_at'] > ttl: URL_METADATA_CACHE.pop(url, None)
 
 def check_url_exists(url):
     return get_url_metadata(url)['status'] == 200
@@ -38,32 +99,110 @@ def is_image_recent(url):
     metadata = get_url_metadata(url)
     return metadata['status'] == 200 and metadata['is_recent']
 
-def apply_replacements(image_url, replacements, always_replace=False):
+def filter_recent(items, concurrency=RECENCY_CHECK_CONCURRENCY, per_host=RECENCY_CHECK_PER_HOST):
+    """
+    Kiểm tra độ mới của nhiều ảnh cùng lúc (HEAD song song, giới hạn tổng và theo từng host).
+    items: list of dicts có key 'image_url'. Trả về (kept, discarded), giữ nguyên thứ tự đầu vào.
+    """
+    if not items: return [], []
+    host_slots = {}
+    for item in items:
+        host = urlparse(item['image_url'] or '').netloc
+        if host not in host_slots: host_slots[host] = threading.BoundedSemaphore(max(1, per_host))
+
+    def check(item):
+        with host_slots[urlparse(item['image_url'] or '').netloc]:
+            return is_image_recent(item['image_url'])
+
+    if concurrency <= 1:
+        flags = [check(item) for item in items]
+    else:
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(items))) as executor:
+            flags = list(executor.map(check, items))
+    kept = [item for item, is_recent in zip(items, flags) if is_recent]
+    discarded = [item for item, is_recent in zip(items, flags) if not is_recent]
+    return kept, discarded
+
+def _get_probe_executor():
+    global _probe_executor
+    with _probe_executor_lock:
+        if _probe_executor is None:
+            _probe_executor = ThreadPoolExecutor(max_workers=REPLACEMENT_PROBE_WORKERS, thread_name_prefix='probe')
+        return _probe_executor
+
+def _first_valid_index(urls, batch_size=REPLACEMENT_PROBE_WORKERS):
+    """
+    HEAD các URL ứng viên song song theo từng đợt batch_size (theo thứ tự ưu tiên); trả về index của URL hợp lệ
+    đầu tiên, hoặc None. Chỉ sang đợt sau khi cả đợt trước không có URL hợp lệ, nên một host chậm không chiếm
+    hết luồng probe bằng các ứng viên ưu tiên thấp.
+    """
+    if len(urls) == 1: return 0 if check_url_exists(urls[0]) else None
+    batch_size = max(1, batch_size)
+    for start in range(0, len(urls), batch_size):
+        futures = [_get_probe_executor().submit(check_url_exists, url) for url in urls[start:start + batch_size]]
+        try:
+            for offset, future in enumerate(futures):
+                if future.result(): return start + offset
+        finally:
+            # cancel() chỉ bỏ các probe chưa bắt đầu; HEAD đang chạy vẫn chạy hết và vẫn ghi vào metadata cache
+            for future in futures: future.cancel()
+    return None
+
+def apply_replacements(image_url, replacements, always_replace=False, domain=None):
+    """
+    Thử các replacement theo thứ tự ưu tiên (thứ tự key, rồi thứ tự trong replacement_list); ứng viên hợp lệ
+    đầu tiên thắng. Các ứng viên được kiểm tra song song. Nếu có domain, replacement thường thắng của domain
+    (xem utils/replacement_stats.py) được kiểm tra một mình trước.
+    """
     if not image_url: return image_url
-    if replacements and isinstance(replacements, dict):
-        for original, replacement_list in replacements.items():
-            if original in image_url:
-                for replacement in replacement_list:
-                    new_url = image_url.replace(original, replacement)
-                    print(f"    -> Checking replacement: {new_url}")
-                    if always_replace or check_url_exists(new_url):
-                        print(f"    => ✅ Replacement found: {new_url}")
-                        return new_url
-                print(f"    => ❌ No valid replacement found for '{original}'.")
+    if not replacements or not isinstance(replacements, dict): return image_url
+    candidates = [(original, replacement, image_url.replace(original, replacement))
+                  for original, replacement_list in replacements.items() if original in image_url
+                  for replacement in replacement_list]
+    if not candidates:
+        return image_url
+    if always_replace:
+        print(f"    -> Checking replacement: {candidates[0][2]}")
+        print(f"    => ✅ Replacement found: {candidates[0][2]}")
+        return candidates[0][2]
+
+    stats = get_replacement_stats() if domain else None
+    keys = [f"{original} -> {replacement}" for original, replacement, _ in candidates]
+    learned_key = stats.preferred(domain, keys) if stats else None
+    if learned_key:
+        new_url = candidates[keys.index(learned_key)][2]
+        print(f"    -> Checking learned replacement: {new_url}")
+        if check_url_exists(new_url):
+            count('replacement.learned_hit')
+            stats.record(domain, learned_key)
+            print(f"    => ✅ Replacement found: {new_url}")
+            return new_url
+
+    winner = _first_valid_index([new_url for _, _, new_url in candidates])
+    if stats: stats.record(domain, keys[winner] if winner is not None else None)
+    # In log theo đúng trình tự như khi kiểm tra lần lượt từng ứng viên
+    tried = candidates if winner is None else candidates[:winner + 1]
+    for index, (original, _, new_url) in enumerate(tried):
+        print(f"    -> Checking replacement: {new_url}")
+        if index == winner:
+            print(f"    => ✅ Replacement found: {new_url}")
+            return new_url
+        if index + 1 == len(candidates) or candidates[index + 1][0] != original:
+            print(f"    => ❌ No valid replacement found for '{original}'.")
     return image_url
 
 def apply_fallback_logic(image_url, url_data):
     if not image_url: return image_url
-    fallback_rules = url_data.get('fallback_rules', {})
-    if not fallback_rules or fallback_rules.get('type') != 'cut_filename_prefix': return image_url
+    plan = as_plan(url_data)
+    if not plan.fallback_prefix_length: return image_url
     print(f"    -> Applying fallback for: {image_url}")
     parsed_url = urlparse(image_url)
-    if parsed_url.netloc != fallback_rules.get('domain'): return image_url
+    if parsed_url.netloc != plan.fallback_domain: return image_url
     path_parts = parsed_url.path.split('/')
     filename = path_parts[-1]
-    prefix_length = fallback_rules.get('prefix_length', 0)
+    prefix_length = plan.fallback_prefix_length
     if len(filename) > prefix_length and filename[prefix_length - 1] == '-':
-        if re.match(r'^[a-zA-Z0-9_-]+$', filename[:prefix_length-1]):
+        if _FALLBACK_PREFIX_RE.match(filename[:prefix_length-1]):
             new_filename = filename[prefix_length:]
             new_path = '/'.join(path_parts[:-1] + [new_filename])
             modified_url = parsed_url._replace(path=new_path).geturl()
@@ -75,31 +214,48 @@ def apply_fallback_logic(image_url, url_data):
 
 def process_and_finalize_url(image_url, url_data):
     if not image_url: return None
-    clean_url = apply_fallback_logic(image_url, url_data)
-    final_url = apply_replacements(clean_url, url_data.get('replacements', {}), url_data.get('always_replace', False))
+    plan = as_plan(url_data)
+    clean_url = apply_fallback_logic(image_url, plan)
+    final_url = apply_replacements(clean_url, plan.replacement_map, plan.always_replace, domain=plan.domain)
     return final_url
 
-def find_best_image_url(soup, url_data):
-    base_url = url_data['url']
-    replacements, selector = url_data.get('replacements', {}), url_data.get('selector')
-    image_tags = soup.select(selector) if selector else soup.find_all('img')
-    if isinstance(replacements, list):
-        for suffix in replacements:
-            for img_tag in image_tags:
-                img_url = img_tag.get('src') or img_tag.get('data-src') or img_tag.get('data-lazy-src')
-                if img_url and img_url.endswith(suffix):
-                    print(f"    -> Found prioritized image by suffix '{suffix}'")
-                    return urljoin(base_url, img_url)
-    og_image_tag = soup.find('meta', property='og:image')
+def _image_tag_url(img_tag):
+    return img_tag.get('src') or img_tag.get('data-src') or img_tag.get('data-lazy-src')
+
+def choose_best_image_url(image_tags, get_og_image_tag, url_data):
+    """
+    Chọn ảnh tốt nhất từ các thẻ ảnh khớp selector và thẻ og:image (lấy qua get_og_image_tag khi cần).
+    Các thẻ chỉ cần hỗ trợ .get(attr), nên dùng được cho cả Tag của BeautifulSoup lẫn dict thuộc tính.
+    """
+    plan = as_plan(url_data)
+    base_url, suffixes = plan.url, plan.suffixes
+    if suffixes:
+        # Một lượt qua các thẻ: thẻ khớp suffix có độ ưu tiên cao nhất thắng, cùng độ ưu tiên thì thẻ đứng trước thắng
+        best_rank, best_url = len(suffixes), None
+        for img_tag in image_tags:
+            img_url = _image_tag_url(img_tag)
+            if not img_url or not img_url.endswith(suffixes[:best_rank]): continue
+            best_rank = next(i for i, suffix in enumerate(suffixes) if img_url.endswith(suffix))
+            best_url = img_url
+            if best_rank == 0: break
+        if best_url is not None:
+            print(f"    -> Found prioritized image by suffix '{suffixes[best_rank]}'")
+            return urljoin(base_url, best_url)
+    og_image_tag = get_og_image_tag()
     if og_image_tag and og_image_tag.get('content'):
         img_url = urljoin(base_url, og_image_tag.get('content'))
         print(f"    -> Found og:image: {img_url}")
         return img_url
-    if not selector and not replacements:
+    if plan.first_img_rule:
         for img_tag in image_tags:
-            img_url = img_tag.get('src') or img_tag.get('data-src') or img_tag.get('data-lazy-src')
+            img_url = _image_tag_url(img_tag)
             if img_url:
                 img_url = urljoin(base_url, img_url)
                 print(f"    -> Found first available image tag: {img_url}")
                 return img_url
-    return None
\ No newline at end of file
+    return None
+
+def find_best_image_url(soup, url_data):
+    plan = as_plan(url_data)
+    image_tags = soup.select(plan.selector) if plan.selector else soup.find_all('img')
+    return choose_best_image_url(image_tags, lambda: soup.find('meta', property='og:image'), plan)
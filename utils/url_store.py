@@ -0,0 +1,71 @@
+# utils/url_store.py
+import os
+import threading
+
+def split_url_lines(raw):
+    """Tách nội dung file .txt giống cách đọc cũ (for line in f): strip từng dòng, không bỏ dòng trống."""
+    lines = raw.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    if lines[-1] == '': lines.pop()
+    return [line.strip() for line in lines]
+
+class DomainUrlFile:
+    """
+    File domain/<domain>.txt (mỗi dòng một URL ảnh, mới nhất ở đầu) kèm index dạng set để kiểm tra trùng O(1).
+    Nội dung được giữ trong bộ nhớ và chỉ đọc lại khi file trên đĩa thay đổi (mtime/size); file chỉ được
+    ghi lại khi có URL mới hoặc nội dung cần chuẩn hóa, nên định dạng .txt vẫn y hệt cách ghi cũ.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.urls, self.index = [], set()
+        self._signature, self._clean = None, False
+
+    def _stat_signature(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _load(self):
+        signature = self._stat_signature()
+        if signature is not None and signature == self._signature: return
+        try:
+            with open(self.path, 'r', encoding='utf-8', newline='') as f: raw = f.read()
+        except FileNotFoundError:
+            self.urls, self.index, self._signature, self._clean = [], set(), None, False
+            return
+        self._signature = signature
+        self._set_content(raw)
+
+    def _set_content(self, raw):
+        self.urls = split_url_lines(raw)
+        self.index = set(self.urls)
+        # File "sạch" nếu ghi lại đúng như cách cũ sẽ ra cùng nội dung
+        self._clean = raw == "\n".join(self.urls)
+
+    def prepend(self, new_urls, max_urls):
+        """Thêm các URL chưa có lên đầu danh sách, giữ tối đa max_urls. Trả về (unique_new_urls, all_urls)."""
+        self._load()
+        unique_new_urls = [u for u in new_urls if u not in self.index]
+        if not unique_new_urls and self._clean and len(self.urls) <= max_urls:
+            return unique_new_urls, self.urls
+        all_urls = (unique_new_urls + self.urls)[:max_urls]
+        self._write(all_urls)
+        return unique_new_urls, all_urls
+
+    def _write(self, urls):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        content = "\n".join(urls)
+        with open(tmp_path, 'w', encoding='utf-8') as f: f.write(content)
+        os.replace(tmp_path, self.path)
+        self._signature = self._stat_signature()
+        self._set_content(content)
+
+_files = {}
+_files_lock = threading.Lock()
+
+def get_domain_url_file(path):
+    with _files_lock:
+        if path not in _files: _files[path] = DomainUrlFile(path)
+        return _files[path]
@@ -0,0 +1,74 @@
+# utils/validator_store.py
+import json
+import os
+import threading
+from .constants import VALIDATORS_FILE
+from .http_client import http_get
+from .profiler import count
+
+class ValidatorStore:
+    """
+    Lưu ETag / Last-Modified của sitemap, trang API và file product-list để gửi conditional GET.
+    Validator mới chỉ được ghi xuống file khi gọi save() ở cuối lần chạy, để một lần crawl lỗi giữa chừng
+    không khiến lần sau nhận 304 và bỏ qua dữ liệu chưa xử lý.
+    """
+    def __init__(self, path=VALIDATORS_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pending = {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f: self._validators = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError): self._validators = {}
+
+    def conditional_headers(self, url):
+        with self._lock:
+            validator = self._validators.get(url) or {}
+        headers = {}
+        if validator.get('etag'): headers['If-None-Match'] = validator['etag']
+        if validator.get('last_modified'): headers['If-Modified-Since'] = validator['last_modified']
+        return headers
+
+    def remember(self, url, response):
+        """Ghi nhận validator của một response 200 đã được xử lý xong."""
+        etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+        with self._lock:
+            self._pending[url] = {'etag': etag, 'last_modified': last_modified} if (etag or last_modified) else None
+
+    def save(self):
+        with self._lock:
+            if not self._pending: return
+            for url, validator in self._pending.items():
+                if validator: self._validators[url] = validator
+                else: self._validators.pop(url, None)
+            self._pending = {}
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f: json.dump(self._validators, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_validator_store():
+    global _store
+    with _store_lock:
+        if _store is None: _store = ValidatorStore()
+        return _store
+
+def conditional_get(url, **kwargs):
+    """GET kèm If-None-Match / If-Modified-Since nếu đã có validator. Response 304 nghĩa là nội dung không đổi."""
+    headers = dict(kwargs.pop('headers', None) or {})
+    validator_headers = get_validator_store().conditional_headers(url)
+    headers.update(validator_headers)
+    response = http_get(url, headers=headers, **kwargs)
+    if validator_headers:
+        count('conditional_get.sent')
+        if response.status_code == 304: count('conditional_get.not_modified')
+    return response
+
+def remember_validators(url, response):
+    if response is not None and response.status_code == 200:
+        get_validator_store().remember(url, response)
+
+def save_validators():
+    get_validator_store().save()